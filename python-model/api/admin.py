@@ -0,0 +1,97 @@
+# api/admin.py
+from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi.responses import JSONResponse, Response
+from middleware.security import verify_api_key, verify_admin_key
+from modelstore import load_model, registry_stats
+import profiling
+import resources
+from typing import Dict, Any, Optional
+
+router = APIRouter(dependencies=[Depends(verify_api_key), Depends(verify_admin_key)])
+
+# Namen die met @profiled(...) gemarkeerd zijn; "train" profileert resources.run_training
+PROFILE_TARGETS = ("recommend", "recommend-explain", "batch", "precomputed", "train", "search")
+
+
+@router.post("/profile")
+def start_profile(payload: Dict[str, Any]):
+    """Profile the next N calls of a target.
+    Payload: {"target": "recommend-explain", "requests": 10, "mode": "cprofile" | "sampling"}
+    """
+    target = payload.get("target")
+    if target not in PROFILE_TARGETS:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"target must be one of {list(PROFILE_TARGETS)}")
+    try:
+        return profiling.start_session(target, int(payload.get("requests", 10)), payload.get("mode", "cprofile"))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.get("/profile")
+def profile_result(format: str = "text", limit: int = 60, sort: str = "cumulative", partial: bool = False):
+    """Session output once the N calls are captured (or now with partial=true).
+    format: "text" / "pstats" for cProfile sessions, "collapsed" for sampling sessions.
+    """
+    session = profiling.session_status()
+    if session is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No profiling session")
+    if not session["finished"] and not partial:
+        return JSONResponse(content=session, status_code=status.HTTP_202_ACCEPTED)
+    try:
+        body, media_type = profiling.session_result(format, limit, sort)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return Response(content=body, media_type=media_type)
+
+
+@router.delete("/profile")
+def cancel_profile():
+    profiling.cancel_session()
+    return {"status": "cancelled"}
+
+
+@router.post("/tracemalloc/start")
+def tracemalloc_start(payload: Optional[Dict[str, Any]] = Body(default=None)):
+    profiling.tracemalloc_start(int((payload or {}).get("frames", 10)))
+    return {"tracing": True}
+
+
+@router.post("/tracemalloc/stop")
+def tracemalloc_stop():
+    profiling.tracemalloc_stop()
+    return {"tracing": False}
+
+
+@router.get("/tracemalloc/snapshot")
+def tracemalloc_snapshot(limit: int = 20, group_by: str = "lineno"):
+    try:
+        return profiling.tracemalloc_top(limit, group_by)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
+@router.get("/model/sizes")
+def model_sizes():
+    try:
+        model = load_model()
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    return profiling.bundle_sizes(model)
+
+
+@router.get("/tenants")
+def tenant_registry():
+    """Resident tenant models, the memory budget, load misses and evictions."""
+    return registry_stats()
+
+
+@router.get("/resources")
+def resource_budgets():
+    """CPU budgets in effect and the current BLAS/OpenMP thread pools of this process."""
+    return resources.resource_status()
@@ -1,5 +1,7 @@
-from fastapi import APIRouter
-from modelstore import load_model
+from fastapi import APIRouter, Depends, status
+from fastapi.responses import JSONResponse
+from middleware.tenant import resolve_tenant
+from modelstore import load_model, readiness, list_tenants
 
 router = APIRouter()
 
@@ -7,10 +9,20 @@ router = APIRouter()
 def health():
     return {"status": "ok"}
 
+@router.get("/ready")
+def ready():
+    """200 once the active model is loaded and warmed up, 503 before that."""
+    state = readiness()
+    if not state["ready"]:
+        return JSONResponse(content={"status": "warming_up", **state}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "ready", **state}
+
 @router.get("/model/status")
-def model_status():
+def model_status(tenant: str = Depends(resolve_tenant)):
+    """Model of the tenant in X-Tenant-Id (default tenant without the header)."""
     try:
-        m = load_model()
-        return {"model": "loaded", "version": m.get("version")}
+        m = load_model(tenant)
+        return {"model": "loaded", "tenant": tenant, "version": m.get("version"),
+                "warmup_seconds": readiness(tenant)["warmup_seconds"], "tenants": list_tenants()}
     except Exception as e:
-        return {"model": "none", "error": str(e)}
+        return {"model": "none", "tenant": tenant, "error": str(e)}
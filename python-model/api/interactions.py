@@ -0,0 +1,31 @@
+# api/interactions.py
+from fastapi import APIRouter, Depends, HTTPException, status
+from middleware.security import verify_api_key
+from modelstore import load_model
+from online_cf import update_user_favourites, compact_cf_updates
+from typing import Dict, Any
+
+router = APIRouter()
+
+
+@router.post("/", dependencies=[Depends(verify_api_key)])
+def update_favourites(payload: Dict[str, Any]):
+    """Online CF update for one user.
+    Payload: {"user_id": ..., "add": [module_id, ...], "remove": [module_id, ...]}
+    """
+    user_id = payload.get("user_id")
+    if user_id is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="user_id required")
+    model = load_model()
+    try:
+        result = update_user_favourites(model, user_id, payload.get("add", []), payload.get("remove", []))
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"version": model.get("version"), **result}
+
+
+@router.post("/compact", dependencies=[Depends(verify_api_key)])
+def compact():
+    """Fold pending online updates into a new saved model version."""
+    version = compact_cf_updates(load_model())
+    return {"status": "compacted" if version else "nothing_to_compact", "version": version}
@@ -0,0 +1,27 @@
+# api/modules.py
+from fastapi import APIRouter, Depends, HTTPException, status
+from middleware.security import verify_api_key
+from modelstore import load_model
+from module_upsert import upsert_modules
+from typing import Dict, Any
+
+router = APIRouter()
+
+
+@router.post("/upsert", dependencies=[Depends(verify_api_key)])
+def upsert(payload: Dict[str, Any]):
+    """Add or replace modules in the resident model without retraining.
+    Payload: {"modules": [{"_id": ..., "name": ..., "description": ..., ...}, ...]}
+    """
+    modules = payload.get("modules")
+    if not isinstance(modules, list):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="modules must be a list")
+    try:
+        model = load_model()
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    try:
+        result = upsert_modules(model, modules)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {"version": model.get("version"), **result}
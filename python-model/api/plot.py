@@ -1,23 +1,97 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
 from middleware.security import verify_api_key
 from modelstore import load_model
-import matplotlib.pyplot as plt
+from recommender import recommend_from_model, pca_overlay_from_model
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from concurrent.futures import ThreadPoolExecutor
+from threading import BoundedSemaphore
+from typing import Dict, Any
+import asyncio
 import io
+import os
 
 router = APIRouter()
 
-@router.post("/pca", dependencies=[Depends(verify_api_key)])
-def plot_pca(payload: dict):
-    model = load_model()
+# Rendering draait in een eigen, begrensde pool zodat plots nooit de
+# threadpool van de recommendation-requests opsouperen.
+PLOT_WORKERS = int(os.getenv("PLOT_WORKERS", "2"))
+PLOT_QUEUE = int(os.getenv("PLOT_QUEUE", str(PLOT_WORKERS * 4)))
+
+_render_pool = ThreadPoolExecutor(max_workers=PLOT_WORKERS, thread_name_prefix="plot")
+_render_slots = BoundedSemaphore(PLOT_QUEUE)
+
+
+def _render_png(overlay: Dict[str, Any], title: str) -> bytes:
+    """Render with the object-oriented Agg API; no pyplot global state, so thread-safe."""
+    layout = overlay["layout"]
+    fig = Figure(figsize=(8, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
 
-    fig = plt.figure(figsize=(8,6))
-    plt.scatter([0,1], [0,1])
-    plt.title("PCA placeholder")
+    points = ax.scatter(layout[:, 0], layout[:, 1], c=overlay["popularity"], cmap="viridis", alpha=0.4, label="All modules")
+    fig.colorbar(points, ax=ax, label="popularity_score")
+
+    favs = overlay["favorites"]
+    if favs:
+        ax.scatter([p["x"] for p in favs], [p["y"] for p in favs], c="red", s=100, marker="*", label="Favorites")
+    recs = overlay["recommendations"]
+    if recs:
+        ax.scatter([p["x"] for p in recs], [p["y"] for p in recs], c="blue", s=100, marker="o", edgecolor="k", label="Top Recommendations")
+
+    ax.set_title(title)
+    ax.set_xlabel("PC1")
+    ax.set_ylabel("PC2")
+    ax.grid(True)
+    ax.legend()
 
     buf = io.BytesIO()
     fig.savefig(buf, format="png")
-    buf.seek(0)
-    plt.close(fig)
+    return buf.getvalue()
+
+
+def _render_done(_future):
+    _render_slots.release()
+
+
+@router.post("/pca", dependencies=[Depends(verify_api_key)])
+async def plot_pca(payload: Dict[str, Any]):
+    """Favourites and recommendations on the cached 2D PCA layout.
+    Payload: {"user": {...}, "top_n": N, "format": "json" | "png", "include_modules": bool}
+    """
+    user = payload.get("user", {})
+    top_n = payload.get("top_n", 5)
+    fmt = payload.get("format", "png")
+
+    def _overlay():
+        model = load_model()
+        fav_table, rec_df = recommend_from_model(model, user, top_n=top_n)
+        rec_ids = rec_df["_id"].tolist() if len(rec_df) else []
+        return model.get("version"), pca_overlay_from_model(model, fav_table["_id"].tolist(), rec_ids)
+
+    version, overlay = await run_in_threadpool(_overlay)
+
+    if fmt == "json":
+        body = {
+            "version": version,
+            "favorites": overlay["favorites"],
+            "recommendations": overlay["recommendations"],
+        }
+        if payload.get("include_modules", False):
+            body["modules"] = [
+                {"_id": mid, "x": float(x), "y": float(y)}
+                for mid, (x, y) in zip(overlay["ids"].tolist(), overlay["layout"])
+            ]
+        return body
 
-    return StreamingResponse(buf, media_type="image/png")
+    if not _render_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Plot renderer busy"
+        )
+    future = _render_pool.submit(_render_png, overlay, f"PCA 2D: favorites & recommendations (model {version})")
+    future.add_done_callback(_render_done)
+    png = await asyncio.wrap_future(future)
+    return Response(content=png, media_type="image/png")
@@ -1,38 +1,78 @@
 # api_recommend.py
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, status
 from middleware.security import verify_api_key
-from recommender import recommend_from_model, build_explanation
-from modelstore import load_model
+from middleware.tenant import resolve_tenant
+from middleware.validation import RecommendRequest, BatchRecommendRequest, RecommendResponse, BatchRecommendResponse
+from serialization import negotiate, encode_recommendations
+from recommender import recommend_from_model, build_explanations, weight_kwargs
+from modelstore import load_model, DEFAULT_TENANT
+from precompute import load_precomputed, user_signature
+from pagination import first_page, next_page
+import shadow
+from profiling import profiled
+import time
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 
 router = APIRouter()
 
+
+def _tenant_model(tenant: str):
+    try:
+        return load_model(tenant)
+    except RuntimeError as e:
+        # Onbekende tenant: 404; default-tenant zonder model (nog aan het trainen): 503
+        code = status.HTTP_503_SERVICE_UNAVAILABLE if tenant == DEFAULT_TENANT else status.HTTP_404_NOT_FOUND
+        raise HTTPException(status_code=code, detail=str(e))
+
+
+def _recommend(model, payload: Dict[str, Any], top_n: int):
+    try:
+        return recommend_from_model(
+            model, payload.get("user", {}), top_n=top_n,
+            filters=payload.get("filters"), **weight_kwargs(payload.get("weights"))
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+def _recommend_page(model, payload: Dict[str, Any], top_n: int):
+    """(fav_table, rec_df, next_cursor). With a "cursor" the page is sliced from the
+    cached ranking of the first request (user, filters and weights are then ignored).
+    """
+    try:
+        if payload.get("cursor"):
+            rec_df, cursor = next_page(model, payload["cursor"], top_n)
+            return None, rec_df, cursor
+        return first_page(
+            model, payload.get("user", {}), top_n,
+            filters=payload.get("filters"), **weight_kwargs(payload.get("weights"))
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail=str(e))
+
 # api_recommend.py
 
 @router.post("/recommend-explain", dependencies=[Depends(verify_api_key)])
-def recommend_explain(payload: Dict[str, Any]):
-    model = load_model()
+@profiled("recommend-explain")
+def recommend_explain(payload: Dict[str, Any], tenant: str = Depends(resolve_tenant)):
+    model = _tenant_model(tenant)
     user = payload.get("user", {})
     top_n = payload.get("top_n", 5)
 
-    favs, rec_df = recommend_from_model(model, user, top_n=top_n)
-
-    weights = {
-        "content": 0.45,
-        "profile": 0.50,
-        "popularity": 0.05,
-        "collaborative": 0.0
-    }
+    favs, rec_df, cursor = _recommend_page(model, payload, top_n)
 
-    recommendations = []
-    for _, row in rec_df.iterrows():
-        explanation = build_explanation(row, weights)
+    explanations = build_explanations(rec_df, rec_df.attrs.get("weights_used", {}))
+    ids = rec_df["_id"].tolist() if len(rec_df) else []
+    names = rec_df["name"].tolist() if len(rec_df) else []
 
-        recommendations.append({
-            "_id": row._id,
-            "name": row.get("name", ""),
+    recommendations = [
+        {
+            "_id": mid,
+            "name": name,
             "score": explanation["final_score"],
             "explanation": explanation["summary"],
             "details": {
@@ -40,22 +80,68 @@ def recommend_explain(payload: Dict[str, Any]):
                 "weights": explanation["weights_used"],
                 "score_breakdown": explanation["score_breakdown"]
             }
-        })
+        }
+        for mid, name, explanation in zip(ids, names, explanations)
+    ]
 
     return {
         "user_context": {
             "favorite_ids": user.get("favorite_id", []),
             "used_profile": bool(user.get("profile_text"))
         },
-        "recommendations": recommendations
+        "recommendations": recommendations,
+        "next_cursor": cursor
     }
 
-@router.post("/recommend", dependencies=[Depends(verify_api_key)])
-def recommend(payload: Dict[str, Any]):
-    model = load_model()
-    user = payload.get("user", {})
-    top_n = payload.get("top_n", 5)
+@router.post("/recommend", dependencies=[Depends(verify_api_key)], response_model=RecommendResponse)
+@profiled("recommend")
+def recommend(request: RecommendRequest, accept: Optional[str] = Header(default=None), tenant: str = Depends(resolve_tenant)):
+    """Ranked module ids. Accept: application/msgpack or application/vnd.apache.arrow.stream
+    for a binary body; JSON otherwise. Send the returned next_cursor back for the next page.
+    X-Tenant-Id selects the institute's model.
+    """
+    fmt = negotiate(accept)
+    model = _tenant_model(tenant)
+    payload = request.model_dump()
+    top_n = request.top_n
+
+    start = time.perf_counter()
+    fav_table, rec_df, cursor = _recommend_page(model, payload, top_n)
+    if not request.cursor and tenant == DEFAULT_TENANT:
+        shadow.observe(payload, top_n, rec_df["_id"].tolist() if len(rec_df) else [], (time.perf_counter() - start) * 1000)
+    return encode_recommendations([rec_df], fmt, model.get("version"), next_cursor=cursor)
+
+@router.post("/batch", dependencies=[Depends(verify_api_key)], response_model=BatchRecommendResponse)
+@profiled("batch")
+def recommend_batch(request: BatchRecommendRequest, accept: Optional[str] = Header(default=None), tenant: str = Depends(resolve_tenant)):
+    """Several /recommend requests against one model version, for bulk callers."""
+    fmt = negotiate(accept)
+    if any(r.cursor for r in request.requests):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Cursors are not supported in /batch")
+    model = _tenant_model(tenant)
+    rec_dfs = [_recommend(model, r.model_dump(), r.top_n)[1] for r in request.requests]
+    return encode_recommendations(rec_dfs, fmt, model.get("version"), batch=True)
+
+@router.api_route("/precomputed/{user_id}", methods=["GET", "POST"], dependencies=[Depends(verify_api_key)])
+@profiled("precomputed")
+def recommend_precomputed(user_id: str, payload: Optional[Dict[str, Any]] = Body(default=None), tenant: str = Depends(resolve_tenant)):
+    """Serve the offline top-N for a known user. If the caller sends the current
+    user and its favourites/profile differ from the export, score live instead.
+    """
+    model = _tenant_model(tenant)
+    top_n = (payload or {}).get("top_n", 5)
+    user = (payload or {}).get("user")
 
-    fav_table, rec_df = recommend_from_model(model, user, top_n)
-    # return simple list
-    return {"recommendations": rec_df[["_id","final_score"]].rename(columns={"final_score":"score"}).to_dict(orient="records")}
+    entry = load_precomputed(model.get("version")).get(str(user_id))
+    if entry is not None and (user is None or entry["signature"] == user_signature(user)):
+        return {"source": "precomputed", "version": model.get("version"), "recommendations": entry["recommendations"][:top_n]}
+
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No precomputed recommendations for this user")
+
+    fav_table, rec_df = _recommend(model, payload, top_n)
+    return {
+        "source": "live",
+        "version": model.get("version"),
+        "recommendations": rec_df[["_id","final_score"]].rename(columns={"final_score":"score"}).to_dict(orient="records")
+    }
@@ -0,0 +1,43 @@
+# api/search.py
+from fastapi import APIRouter, Depends, HTTPException, status
+from middleware.security import verify_api_key
+from middleware.tenant import resolve_tenant
+from middleware.validation import SearchRequest
+from modelstore import load_model, DEFAULT_TENANT
+from recommender import search_from_model, weight_kwargs
+from profiling import profiled
+
+router = APIRouter()
+
+
+@router.post("", dependencies=[Depends(verify_api_key)])
+@profiled("search")
+def search(request: SearchRequest, tenant: str = Depends(resolve_tenant)):
+    """Free-text module search on the inverted TF-IDF index.
+    Payload: {"query": "data visualisatie", "top_n": 10, "filters": {...},
+              "user": {...}, "blend": 0.3, "weights": {...}}
+    """
+    try:
+        model = load_model(tenant)
+    except RuntimeError as e:
+        code = status.HTTP_503_SERVICE_UNAVAILABLE if tenant == DEFAULT_TENANT else status.HTTP_404_NOT_FOUND
+        raise HTTPException(status_code=code, detail=str(e))
+    try:
+        user = request.user.model_dump() if request.user is not None else None
+        results = search_from_model(
+            model, request.query, top_n=request.top_n, filters=request.filters,
+            user_row=user, blend=request.blend, **weight_kwargs(request.weights)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    return {
+        "version": model.get("version"),
+        "query": request.query,
+        "results": [
+            {"_id": mid, "name": name, "score": score, "text_score": text, "hybrid_score": hybrid}
+            for mid, name, score, text, hybrid in zip(
+                results["_id"].tolist(), results["name"].tolist(), results["final_score"].tolist(),
+                results["text_score"].tolist(), results["hybrid_score"].tolist(),
+            )
+        ],
+    }
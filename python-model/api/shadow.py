@@ -0,0 +1,42 @@
+# api/shadow.py
+from fastapi import APIRouter, Body, Depends, HTTPException, status
+from middleware.security import verify_api_key
+import shadow
+from typing import Dict, Any, Optional
+
+router = APIRouter()
+
+
+@router.post("/candidate", dependencies=[Depends(verify_api_key)])
+def set_candidate(payload: Dict[str, Any]):
+    """Payload: {"version": "<saved model version>"}"""
+    version = payload.get("version")
+    if not version:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="version required")
+    try:
+        shadow.set_candidate(version)
+    except RuntimeError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    return {"candidate": version}
+
+
+@router.delete("/candidate", dependencies=[Depends(verify_api_key)])
+def clear_candidate():
+    shadow.clear_candidate()
+    return {"candidate": None}
+
+
+@router.get("/stats", dependencies=[Depends(verify_api_key)])
+def stats():
+    return shadow.promotion_check()
+
+
+@router.post("/promote", dependencies=[Depends(verify_api_key)])
+def promote(payload: Optional[Dict[str, Any]] = Body(default=None)):
+    """Payload (optional): {"force": bool, "min_requests": N, "min_overlap": x, "max_latency_ratio": x}"""
+    payload = payload or {}
+    thresholds = {k: payload[k] for k in ("min_requests", "min_overlap", "max_latency_ratio") if k in payload}
+    try:
+        return shadow.promote(force=bool(payload.get("force", False)), **thresholds)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
@@ -1,6 +1,8 @@
 # api/startup.py
 from recommender import fetch_remote_modules_users, build_model_from_dataframe
-from modelstore import save_model
+from modelstore import save_model, load_model
+from precompute import export_precomputed, PRECOMPUTE_TOP_N
+from resources import run_training
 import logging
 
 logger = logging.getLogger(__name__)
@@ -9,8 +11,20 @@ def retrain_on_startup():
     try:
         modules, users = fetch_remote_modules_users()
         print(f"Fetched {len(modules)} modules and {len(users)} users for retraining.")
-        model = build_model_from_dataframe(modules, users_demo=users)
+        model = run_training(build_model_from_dataframe, modules, users_demo=users)
         save_model(model)
         logger.info("Model retrained successfully on startup")
     except Exception as e:
         logger.exception("Startup retraining failed")
+        # Vorig model (indien aanwezig) alsnog laden en opwarmen
+        try:
+            load_model()
+        except RuntimeError:
+            pass
+        return
+
+    if PRECOMPUTE_TOP_N > 0:
+        try:
+            export_precomputed(model)
+        except Exception:
+            logger.exception("Precomputing recommendations failed")
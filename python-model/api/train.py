@@ -1,8 +1,13 @@
 # api/train.py
-from fastapi import APIRouter, BackgroundTasks, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from middleware.security import verify_api_key
+from middleware.tenant import resolve_tenant
 from middleware.validation import TrainRequest
-from modelstore import save_model
+from modelstore import save_model, load_version, activate_version, DEFAULT_TENANT
+from precompute import export_precomputed, PRECOMPUTE_TOP_N
+import shadow
+from resources import run_training
+import logging
 
 import pandas as pd
 import numpy as np
@@ -13,6 +18,7 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 # Note: training pipeline moved to `recommender.build_model_from_dataframe`.
 # This file only exposes the background task that orchestrates fetching data and saving the model.
@@ -21,30 +27,84 @@ router = APIRouter()
 # Training pipeline
 # ---------------------------------------------
 
-def train_model(payload: TrainRequest):
+def train_model(payload: TrainRequest, tenant: str = DEFAULT_TENANT):
     """Runs full cleanup + training pipeline.
     Safe to run in background. If the payload contains modules we use them,
-    otherwise we attempt to fetch modules/users from configured external APIs.
+    otherwise we attempt to fetch modules/users from configured external APIs
+    (default tenant only).
     """
+    if payload.streaming:
+        model_bundle = _train_streaming(payload, tenant)
+    else:
+        model_bundle = _train_in_memory(payload, tenant)
+
+    # Offline top-N voor alle bekende gebruikers; een fout hier laat het model staan
+    if PRECOMPUTE_TOP_N > 0:
+        try:
+            export_precomputed(model_bundle)
+        except Exception:
+            logger.exception("Precomputing recommendations failed")
+
+
+def _has_modules(payload: TrainRequest) -> bool:
+    return bool(payload.modules and isinstance(payload.modules, list) and len(payload.modules))
+
+
+def _train_in_memory(payload: TrainRequest, tenant: str):
     from recommender import fetch_remote_modules_users, build_model_from_dataframe
 
     # Load modules/users from payload or remote
-    if payload.modules and isinstance(payload.modules, list) and len(payload.modules):
+    if _has_modules(payload):
         modules_df = pd.DataFrame(payload.modules)
         users_df = pd.DataFrame(payload.users) if payload.users else pd.DataFrame()
     else:
         modules_df, users_df = fetch_remote_modules_users()
 
-    # build model bundle using the shared pipeline
-    model_bundle = build_model_from_dataframe(modules_df, users_demo=users_df, num_dummy_users=payload.num_dummy_users or 50)
+    # build model bundle using the shared pipeline (own process, training CPU budget)
+    model_bundle = run_training(build_model_from_dataframe, modules_df, users_demo=users_df, num_dummy_users=payload.num_dummy_users or 50)
+
+    if payload.shadow:
+        save_model(model_bundle, activate=False)
+        shadow.set_candidate(model_bundle["version"], model_bundle)
+    else:
+        save_model(model_bundle, tenant=tenant)
+    return model_bundle
+
 
-    save_model(model_bundle)
+def _train_streaming(payload: TrainRequest, tenant: str):
+    """Out-of-core build; the training process saves the model itself, so only the
+    version comes back and the bundle is loaded once from disk."""
+    from recommender import fetch_remote_users
+    from streaming_train import train_streaming_and_save, STREAMING_CHUNK_SIZE
+
+    params = {"num_dummy_users": payload.num_dummy_users or 50, "tenant": tenant}
+    if _has_modules(payload):
+        modules_df = pd.DataFrame(payload.modules)
+        params["chunks"] = [modules_df.iloc[i:i + STREAMING_CHUNK_SIZE] for i in range(0, len(modules_df), STREAMING_CHUNK_SIZE)]
+    if payload.users:
+        users_df = pd.DataFrame(payload.users)
+    else:
+        users_df = fetch_remote_users() if tenant == DEFAULT_TENANT else pd.DataFrame()
+
+    version = run_training(train_streaming_and_save, users_demo=users_df, **params)
+    model_bundle = load_version(version, tenant)
+    if payload.shadow:
+        shadow.set_candidate(version, model_bundle)
+    else:
+        activate_version(version, model_bundle, tenant)
+    return model_bundle
 
 # ---------------------------------------------
 # API endpoint
 # ---------------------------------------------
 
 @router.post("/", dependencies=[Depends(verify_api_key)])
-def train(request: TrainRequest, bg: BackgroundTasks):
-    bg.add_task(train_model, request)
+def train(request: TrainRequest, bg: BackgroundTasks, tenant: str = Depends(resolve_tenant)):
+    if tenant != DEFAULT_TENANT:
+        # De externe module-API en de shadow-evaluatie horen bij de default-tenant
+        if not _has_modules(request):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Training another tenant needs its modules in the payload")
+        if request.shadow:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Shadow training is only available for the default tenant")
+    bg.add_task(train_model, request, tenant)
     return {"status": "training_started"}
@@ -0,0 +1,63 @@
+"""Recall-vs-latency benchmark: IVF candidate retrieval against the exact cosine scan.
+
+Run from python-model/:
+    python -m benchmarks.ann_recall --modules 100000 --candidates 300
+
+Uses the PCA vectors of the current model (tiled with noise up to --modules) when
+one is saved, otherwise a synthetic clustered catalogue.
+"""
+import argparse
+import time
+import numpy as np
+from sklearn.preprocessing import normalize
+from retrieval import IVFIndex
+
+
+def _catalogue(n_modules: int, dim: int, rng: np.random.Generator) -> np.ndarray:
+    try:
+        from modelstore import load_model
+        base = load_model()["module_vectors_pca"]
+    except Exception:
+        centers = rng.normal(size=(64, dim))
+        base = centers[rng.integers(0, 64, size=1000)] + 0.3 * rng.normal(size=(1000, dim))
+    reps = int(np.ceil(n_modules / len(base)))
+    tiled = np.tile(base, (reps, 1))[:n_modules]
+    return tiled + 0.05 * base.std() * rng.normal(size=tiled.shape)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=50)
+    parser.add_argument("--candidates", type=int, default=300)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    vectors = _catalogue(args.modules, args.dim, rng)
+    normed = normalize(vectors)
+    queries = vectors[rng.integers(0, len(vectors), size=args.queries)]
+
+    t0 = time.perf_counter()
+    index = IVFIndex().fit(vectors)
+    print(f"modules={len(vectors)} lists={index.n_lists} build={time.perf_counter() - t0:.2f}s")
+
+    t0 = time.perf_counter()
+    truth = []
+    for q in queries:
+        scores = normed @ (q / np.linalg.norm(q))
+        truth.append(set(np.argpartition(-scores, args.top_n)[:args.top_n]))
+    exact_ms = (time.perf_counter() - t0) * 1000 / len(queries)
+    print(f"exact        {exact_ms:8.3f} ms/query  recall@{args.top_n}=1.000")
+
+    for n_probe in (1, 2, 4, 8, 16, 32):
+        t0 = time.perf_counter()
+        found = [set(index.search(q, args.candidates, n_probe=n_probe)) for q in queries]
+        ms = (time.perf_counter() - t0) * 1000 / len(queries)
+        recall = np.mean([len(t & f) / len(t) for t, f in zip(truth, found)])
+        print(f"ivf nprobe={n_probe:<3}{ms:8.3f} ms/query  recall@{args.top_n}={recall:.3f}")
+
+
+if __name__ == "__main__":
+    main()
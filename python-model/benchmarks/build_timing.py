@@ -0,0 +1,46 @@
+"""Timing of build_model_from_dataframe and its tag stages, with the memoization caches.
+
+Run from python-model/:
+    python -m benchmarks.build_timing
+
+"row-wise" is the old per-row df.apply(parse_tags) / apply(preprocess_tags) path with
+cold caches; "bulk" is parse_tags_column / preprocess_tags_column. The full build is
+timed with cold caches and again with warm caches (e.g. a retrain in the same process).
+"""
+import time
+from recommender import (
+    fetch_remote_modules_users, build_model_from_dataframe, parse_tags, preprocess_tags,
+    parse_tags_column, preprocess_tags_column, clear_memo, memo_stats,
+)
+
+
+def _timed(label, fn):
+    t0 = time.perf_counter()
+    result = fn()
+    print(f"{label:28s} {time.perf_counter() - t0:8.3f}s")
+    return result
+
+
+def main():
+    modules, users = fetch_remote_modules_users()
+    if "_id" not in modules.columns:
+        modules["_id"] = modules["id"].astype(str)
+    tag_col = next((c for c in ["tags_list", "module_tags_str", "tags"] if c in modules.columns), None)
+
+    if tag_col:
+        clear_memo()
+        tags = _timed("tags row-wise (parse)", lambda: modules[tag_col].apply(parse_tags))
+        _timed("tags row-wise (normalise)", lambda: tags.apply(preprocess_tags))
+        clear_memo()
+        tags = _timed("tags bulk (parse)", lambda: parse_tags_column(modules[tag_col]))
+        _timed("tags bulk (normalise)", lambda: preprocess_tags_column(tags))
+
+    clear_memo()
+    _timed("build (cold caches)", lambda: build_model_from_dataframe(modules, users_demo=users))
+    _timed("build (warm caches)", lambda: build_model_from_dataframe(modules, users_demo=users))
+    for name, stats in memo_stats().items():
+        print(f"{name:12s} hit_rate={stats['hit_rate']:.3f} size={stats['size']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""Top-N agreement of the float32 and int8+rerank scoring paths with float64.
+
+Run from python-model/:
+    python -m benchmarks.dtype_agreement --users 200 --top-n 10
+
+Builds the three bundles from the configured module source and scores the same
+random favourites/profile users against each. tests/test_dtype_agreement.py asserts
+the float32 and int8+rerank agreement on a synthetic catalogue.
+"""
+import argparse
+import contextlib
+import io
+import numpy as np
+from recommender import fetch_remote_modules_users, build_model_from_dataframe, recommend_from_model
+
+PROFILES = ["", "data analyse en visualisatie", "zorg en psychologie", "software engineering", "marketing"]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--top-n", type=int, default=10)
+    args = parser.parse_args()
+
+    modules, _ = fetch_remote_modules_users()
+    if "_id" not in modules.columns:
+        modules["_id"] = modules["id"].astype(str)
+
+    bundles = {
+        "float64": build_model_from_dataframe(modules, compute_dtype="float64"),
+        "float32": build_model_from_dataframe(modules),
+        "int8+rerank": build_model_from_dataframe(modules, quantize_pca=True),
+    }
+
+    rng = np.random.default_rng(42)
+    ids = modules["_id"].tolist()
+    overlap = {name: [] for name in bundles if name != "float64"}
+    for i in range(args.users):
+        user = {
+            "user_id": -1,
+            "favorite_id": list(rng.choice(ids, size=rng.integers(1, 4), replace=False)),
+            "profile_text": PROFILES[i % len(PROFILES)],
+        }
+        with contextlib.redirect_stdout(io.StringIO()):
+            ranked = {name: recommend_from_model(b, user, args.top_n)[1]["_id"].tolist() for name, b in bundles.items()}
+        for name in overlap:
+            overlap[name].append(len(set(ranked["float64"]) & set(ranked[name])) / args.top_n)
+
+    for name, values in overlap.items():
+        print(f"{name:12s} top-{args.top_n} overlap with float64: mean={np.mean(values):.3f} min={np.min(values):.3f}")
+        nbytes = sum(v.nbytes for v in bundles[name].values() if isinstance(v, np.ndarray))
+        print(f"{'':12s} array bytes: {nbytes} (float64: {sum(v.nbytes for v in bundles['float64'].values() if isinstance(v, np.ndarray))})")
+
+
+if __name__ == "__main__":
+    main()
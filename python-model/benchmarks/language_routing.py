@@ -0,0 +1,51 @@
+"""Language routing in preprocess_text: detect-first vs. the Dutch-then-English fallback.
+
+Run from python-model/:
+    python -m benchmarks.language_routing
+
+Reports how often the stopword detector picks the same pipeline as the fallback on
+the VKM module texts, and the preprocessing time of both modes.
+"""
+import re
+import time
+from recommender import (
+    fetch_remote_modules_users, parse_tags, preprocess_text, detect_language,
+    _get_spacy_models, _stemmed_lemmas,
+)
+
+
+def _fallback_language(text, nlp_nl) -> str:
+    tokens = re.sub(r"[^a-zA-Z0-9\s]", " ", str(text).lower()).split()
+    tokens_nl = _stemmed_lemmas(nlp_nl, "nl", " ".join(tokens))
+    return "en" if len(tokens_nl) < max(1, len(tokens) // 2) else "nl"
+
+
+def main():
+    modules, _ = fetch_remote_modules_users()
+    tag_col = next((c for c in ["tags_list", "module_tags_str", "tags"] if c in modules.columns), None)
+    tags = modules[tag_col].apply(parse_tags) if tag_col else [[] for _ in range(len(modules))]
+    texts = [
+        " ".join([str(r.get("shortdescription", "")), str(r.get("description", "")), " ".join(t)]).strip()
+        for r, t in zip(modules.to_dict(orient="records"), tags)
+    ]
+    nlp_nl, nlp_en = _get_spacy_models()
+
+    agree = 0
+    counts = {"nl": 0, "en": 0}
+    for text in texts:
+        tokens = re.sub(r"[^a-zA-Z0-9\s]", " ", text.lower()).split()
+        detected = detect_language(tokens)
+        counts[detected] += 1
+        agree += detected == _fallback_language(text, nlp_nl)
+    print(f"texts={len(texts)} detected={counts} agreement with fallback={agree / max(1, len(texts)):.3f}")
+
+    for routing in ("fallback", "detect"):
+        t0 = time.perf_counter()
+        for text in texts:
+            preprocess_text(text, nlp_nl, nlp_en, routing=routing)
+        elapsed = time.perf_counter() - t0
+        print(f"{routing:8s} total={elapsed:.2f}s per text={elapsed * 1000 / max(1, len(texts)):.2f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Free-text search latency: dense TF-IDF scan against the inverted index
+(`search_index.py`) on catalogues enlarged to --modules rows.
+
+Run from python-model/:
+    python -m benchmarks.search_latency --modules 10000 50000 200000 --top-n 10
+
+The TF-IDF rows of the trained model are tiled (each copy scaled by a random factor,
+so scores do not tie) and both paths answer the same preprocessed queries. The
+dense path is what the profile signal does today: matrix-vector product + top-k.
+"""
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+import recommender
+from recommender import fetch_remote_modules_users, build_model_from_dataframe, preprocess_text, _get_spacy_models
+from search_index import InvertedIndex
+
+QUERIES = [
+    "data analyse", "marketing", "zorg en psychologie", "software engineering en ai",
+    "duurzaamheid", "business management", "onderzoek", "design", "forensisch laboratorium", "leiderschap",
+]
+
+
+def _dense_top_k(matrix, q_dense, k):
+    scores = matrix @ q_dense
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return top, scores[top]
+
+
+def _time(fn, queries, repeat):
+    times = []
+    for _ in range(repeat):
+        for q in queries:
+            start = time.perf_counter()
+            fn(q)
+            times.append(time.perf_counter() - start)
+    return np.array(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, nargs="+", default=[10000, 50000, 200000])
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    recommender.DEBUG_SCORES = False
+
+    modules, users = fetch_remote_modules_users()
+    if "_id" not in modules.columns:
+        modules["_id"] = modules["id"].astype(str)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bundle = build_model_from_dataframe(modules, users_demo=users)
+    base = np.asarray(bundle["module_tfidf_dense"], dtype=np.float32)
+    nlp_nl, nlp_en = _get_spacy_models()
+    queries = [bundle["vectorizer"].transform([preprocess_text(q, nlp_nl, nlp_en)]) for q in QUERIES]
+    queries = [q for q in queries if q.nnz]
+    rng = np.random.default_rng(42)
+
+    print(f"{len(queries)} queries, top {args.top_n}")
+    print(f"{'modules':>8s} {'postings':>9s} {'build s':>8s} {'dense p50':>10s} {'index p50':>10s} {'dense p95':>10s} {'index p95':>10s} {'agree':>6s}")
+    for n in args.modules:
+        reps = -(-n // len(base))
+        matrix = np.vstack([base * rng.uniform(0.5, 1.0, (len(base), 1)).astype(np.float32) for _ in range(reps)])[:n]
+        start = time.perf_counter()
+        index = InvertedIndex().fit(matrix)
+        build_s = time.perf_counter() - start
+
+        dense_ms = _time(lambda q: _dense_top_k(matrix, q.toarray()[0].astype(np.float32), args.top_n), queries, args.repeat)
+        index_ms = _time(lambda q: index.search(q.indices, q.data, args.top_n), queries, args.repeat)
+        agree = np.mean([
+            np.allclose(_dense_top_k(matrix, q.toarray()[0].astype(np.float32), args.top_n)[1][:len(s)], s, atol=1e-5)
+            for q in queries for s in [index.search(q.indices, q.data, args.top_n)[1]]
+        ])
+        print(f"{n:8d} {len(index.docs):9d} {build_s:8.2f} {np.percentile(dense_ms, 50):10.2f} {np.percentile(index_ms, 50):10.2f} "
+              f"{np.percentile(dense_ms, 95):10.2f} {np.percentile(index_ms, 95):10.2f} {agree:6.2f}")
+        del matrix, index
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Response encoding cost: the old to_dict + stdlib JSON path against orjson,
+MessagePack (if installed) and Arrow IPC, for single and batch responses.
+
+Run from python-model/:
+    python -m benchmarks.serialization --batch 1 100 1000 --top-n 20
+
+Only the encoding step is timed; the ranked frames are scored once up front.
+"""
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from recommender import fetch_remote_modules_users, build_model_from_dataframe, recommend_from_model
+import serialization
+from serialization import encode_recommendations
+
+
+def _old_path(rec_dfs):
+    # Zoals /recommend het deed: to_dict(orient="records") door de standaard encoder
+    body = {"results": [
+        {"recommendations": df[["_id", "final_score"]].rename(columns={"final_score": "score"}).to_dict(orient="records")}
+        for df in rec_dfs
+    ]}
+    return JSONResponse(content=jsonable_encoder(body)).body
+
+
+def _timed(fn, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, len(out)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 100, 1000])
+    parser.add_argument("--top-n", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    modules, _ = fetch_remote_modules_users()
+    if "_id" not in modules.columns:
+        modules["_id"] = modules["id"].astype(str)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bundle = build_model_from_dataframe(modules)
+
+    rng = np.random.default_rng(42)
+    ids = modules["_id"].tolist()
+    pool = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(50):
+            user = {"user_id": -1, "favorite_id": list(rng.choice(ids, size=3, replace=False)), "profile_text": ""}
+            pool.append(recommend_from_model(bundle, user, top_n=args.top_n, use_cache=False)[1])
+
+    formats = ["json", "arrow"] + (["msgpack"] if serialization.msgpack is not None else [])
+    print(f"{'batch':>6s} {'format':>14s} {'ms':>9s} {'bytes':>10s}")
+    for size in args.batch:
+        rec_dfs = [pool[i % len(pool)] for i in range(size)]
+        ms, nbytes = _timed(lambda: _old_path(rec_dfs), args.repeat)
+        print(f"{size:6d} {'old to_dict':>14s} {ms:9.2f} {nbytes:10d}")
+        for fmt in formats:
+            ms, nbytes = _timed(lambda: encode_recommendations(rec_dfs, fmt, bundle.get("version"), batch=True).body, args.repeat)
+            print(f"{size:6d} {fmt:>14s} {ms:9.2f} {nbytes:10d}")
+
+
+if __name__ == "__main__":
+    main()
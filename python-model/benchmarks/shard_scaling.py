@@ -0,0 +1,97 @@
+"""Latency of scatter-gather scoring over 1, 2, 4 and 8 shards against the
+in-process exact scan, on a catalogue enlarged to --modules rows.
+
+Run from python-model/:
+    python -m benchmarks.shard_scaling --modules 200000 --users 50
+
+The source catalogue is tiled (with a little noise on the PCA vectors) so the
+matrices have production-like size without rerunning the text pipeline.
+"""
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+import pandas as pd
+import recommender
+from recommender import fetch_remote_modules_users, build_model_from_dataframe, recommend_from_model
+from filters import build_attribute_index
+from sharding import ShardedScorer
+
+PROFILES = ["", "data analyse en visualisatie", "zorg en psychologie", "software engineering", "marketing"]
+
+
+def enlarge(bundle, n_modules, rng):
+    reps = int(np.ceil(n_modules / len(bundle["df"])))
+    big = dict(bundle)
+    df = pd.concat([bundle["df"]] * reps, ignore_index=True).iloc[:n_modules]
+    df["_id"] = [f"{mid}-{i // len(bundle['df'])}" for i, mid in enumerate(df["_id"])]
+    big["df"] = df
+    pca = np.tile(bundle["module_vectors_pca"], (reps, 1))[:n_modules]
+    pca = (pca + rng.normal(0, 0.01, pca.shape)).astype(pca.dtype)
+    big["module_vectors_pca"] = pca
+    big["module_pca_inv_norm"] = recommender._inv_norms(pca)
+    big["module_tfidf_dense"] = np.tile(bundle["module_tfidf_dense"], (reps, 1))[:n_modules]
+    big["popularity_norm"] = np.tile(bundle["popularity_norm"], reps)[:n_modules]
+    raw = pd.concat([bundle["df_raw"]] * reps, ignore_index=True).iloc[:n_modules]
+    big["attribute_index"] = build_attribute_index(raw)
+    big["popularity_ranking"] = recommender.build_popularity_ranking(raw, big["popularity_norm"])
+    big["ann_index"] = None
+    big.pop("module_item_index", None)
+    big["version"] = f"bench-{n_modules}"
+    return big
+
+
+def _run(bundle, users, top_n):
+    times, results = [], []
+    for user in users:
+        start = time.perf_counter()
+        results.append(recommend_from_model(bundle, user, top_n=top_n, use_cache=False)[1])
+        times.append(time.perf_counter() - start)
+    return np.array(times) * 1000, results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, default=200000)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+    recommender.DEBUG_SCORES = False
+
+    modules, _ = fetch_remote_modules_users()
+    if "_id" not in modules.columns:
+        modules["_id"] = modules["id"].astype(str)
+    rng = np.random.default_rng(42)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bundle = enlarge(build_model_from_dataframe(modules, retrieval_index="exact"), args.modules, rng)
+
+    ids = bundle["df"]["_id"].to_numpy()
+    users = [
+        {"user_id": -1, "favorite_id": list(rng.choice(ids, size=3, replace=False)), "profile_text": PROFILES[i % len(PROFILES)]}
+        for i in range(args.users)
+    ]
+
+    base_ms, base = _run(bundle, users, args.top_n)
+    print(f"{bundle['module_vectors_pca'].shape[0]} modules, tfidf {bundle['module_tfidf_dense'].shape[1]} cols")
+    print(f"{'mode':>12s} {'p50 ms':>9s} {'p95 ms':>9s} {'speedup':>8s} {'same scores':>12s}")
+    print(f"{'in-process':>12s} {np.percentile(base_ms, 50):9.2f} {np.percentile(base_ms, 95):9.2f} {1.0:8.2f} {'-':>12s}")
+    for n_shards in args.shards:
+        scorer = ShardedScorer(bundle, n_shards)
+        recommender.set_sharded_scorer(scorer)
+        try:
+            _run(bundle, users[:3], args.top_n)
+            ms, results = _run(bundle, users, args.top_n)
+        finally:
+            recommender.set_sharded_scorer(None)
+            scorer.close()
+        same = np.mean([
+            np.allclose(np.sort(a["final_score"]), np.sort(b["final_score"]), atol=1e-6) for a, b in zip(results, base)
+        ])
+        speedup = np.percentile(base_ms, 50) / np.percentile(ms, 50)
+        print(f"{str(n_shards) + ' shards':>12s} {np.percentile(ms, 50):9.2f} {np.percentile(ms, 95):9.2f} {speedup:8.2f} {same:12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""Peak RSS and build time of the in-memory training path against the out-of-core
+path (`streaming_train.py`) on a catalogue enlarged to --modules rows.
+
+Run from python-model/:
+    python -m benchmarks.streaming_memory --modules 20000 50000 --chunk-size 2000
+
+The local catalogue is tiled into a temporary CSV (ids made unique); every build
+runs in a fresh process that reports its own ru_maxrss and the peak of its anonymous
+memory (RssAnon, sampled from /proc). ru_maxrss also counts resident pages of the
+memory-mapped arrays, which the kernel can drop; RssAnon is what has to fit in RAM.
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing as mp
+import resource
+import tempfile
+import threading
+import time
+from pathlib import Path
+import pandas as pd
+import recommender
+from recommender import fetch_remote_modules_users, build_model_from_dataframe
+from streaming_train import build_model_streaming
+
+
+def _rss_anon_mb() -> float:
+    try:
+        for line in open("/proc/self/status"):
+            if line.startswith("RssAnon:"):
+                return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def _run(mode, csv_path, chunk_size, work_dir, conn):
+    recommender.DEBUG_SCORES = False
+    peak, done = [_rss_anon_mb()], threading.Event()
+
+    def _sample():
+        while not done.wait(0.02):
+            peak[0] = max(peak[0], _rss_anon_mb())
+
+    threading.Thread(target=_sample, daemon=True).start()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == "in-memory":
+            bundle = build_model_from_dataframe(pd.read_csv(csv_path))
+        else:
+            bundle = build_model_streaming(pd.read_csv(csv_path, chunksize=chunk_size), chunk_size=chunk_size, work_dir=work_dir)
+    seconds = time.perf_counter() - start
+    done.set()
+    conn.send((seconds, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, max(peak[0], _rss_anon_mb())))
+
+
+def _measure(ctx, mode, csv_path, chunk_size, work_dir):
+    parent, child = ctx.Pipe()
+    proc = ctx.Process(target=_run, args=(mode, csv_path, chunk_size, work_dir, child))
+    proc.start()
+    result = parent.recv()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--modules", type=int, nargs="+", default=[20000, 50000])
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--start-method", default="spawn", help="spawn gives every build a clean process")
+    args = parser.parse_args()
+    ctx = mp.get_context(args.start_method)
+
+    modules, _ = fetch_remote_modules_users()
+    if "_id" not in modules.columns:
+        modules["_id"] = modules["id"].astype(str)
+
+    print(f"{'modules':>8s} {'mode':>10s} {'seconds':>8s} {'peak RSS MB':>12s} {'peak anon MB':>13s}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.modules:
+            reps = -(-n // len(modules))
+            big = pd.concat([modules] * reps, ignore_index=True).iloc[:n]
+            big["_id"] = [f"{mid}-{i // len(modules)}" for i, mid in enumerate(big["_id"])]
+            csv_path = Path(tmp) / f"modules_{n}.csv"
+            big.to_csv(csv_path, index=False)
+            del big
+            for mode in ("in-memory", "streaming"):
+                seconds, peak_mb, anon_mb = _measure(ctx, mode, str(csv_path), args.chunk_size, Path(tmp) / f"work_{n}")
+                print(f"{n:8d} {mode:>10s} {seconds:8.1f} {peak_mb:12.0f} {anon_mb:13.0f}")
+
+
+if __name__ == "__main__":
+    main()
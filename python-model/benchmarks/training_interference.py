@@ -0,0 +1,97 @@
+"""Serving latency while a training job runs, with and without the CPU governor
+(`resources.py`).
+
+Run from python-model/:
+    python -m benchmarks.training_interference --seconds 20
+
+Modes:
+  idle       no training, the baseline
+  unmanaged  training in a thread of the serving process with every library on its
+             default thread count (the old /train behaviour)
+  governed   resources.run_training: own process, TRAIN_NICE, TRAIN_THREADS
+Training is restarted in a loop for the whole measuring window.
+"""
+from threading import Event, Thread
+import argparse
+import contextlib
+import io
+import time
+import numpy as np
+from threadpoolctl import threadpool_limits
+import recommender
+import resources
+from recommender import fetch_remote_modules_users, build_model_from_dataframe, recommend_from_model
+
+PROFILES = ["", "data analyse en visualisatie", "zorg en psychologie", "software engineering", "marketing"]
+
+
+def _train_unmanaged(modules, users, stop, runs):
+    # Zoals voorheen: alle cores voor BLAS en ALS
+    with threadpool_limits(resources.CPU_COUNT), contextlib.redirect_stdout(io.StringIO()):
+        while not stop.is_set():
+            build_model_from_dataframe(modules, users_demo=users, als_params={"num_threads": 0})
+            runs.append(1)
+
+
+def _train_governed(modules, users, stop, runs):
+    while not stop.is_set():
+        resources.run_training(build_model_from_dataframe, modules, users_demo=users)
+        runs.append(1)
+
+
+def _serve(bundle, queries, seconds, top_n):
+    times = []
+    deadline = time.perf_counter() + seconds
+    i = 0
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        recommend_from_model(bundle, queries[i % len(queries)], top_n=top_n, use_cache=False)
+        times.append(time.perf_counter() - start)
+        i += 1
+    return np.array(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3, help="seconds training runs before measuring")
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--modes", nargs="+", default=["idle", "unmanaged", "governed"])
+    args = parser.parse_args()
+    recommender.DEBUG_SCORES = False
+
+    modules, users = fetch_remote_modules_users()
+    if "_id" not in modules.columns:
+        modules["_id"] = modules["id"].astype(str)
+    with contextlib.redirect_stdout(io.StringIO()):
+        bundle = build_model_from_dataframe(modules, users_demo=users)
+    resources.apply_serving_limits()
+
+    rng = np.random.default_rng(42)
+    ids = bundle["df"]["_id"].to_numpy()
+    queries = [
+        {"favorite_id": list(rng.choice(ids, size=3, replace=False)), "profile_text": PROFILES[i % len(PROFILES)]}
+        for i in range(50)
+    ]
+    _serve(bundle, queries, 1, args.top_n)
+
+    print(f"{resources.CPU_COUNT} cpus, serving BLAS threads {resources.SERVING_BLAS_THREADS}, "
+          f"train threads {resources.TRAIN_THREADS}, train nice {resources.TRAIN_NICE}")
+    print(f"{'mode':>10s} {'requests':>9s} {'p50 ms':>8s} {'p95 ms':>8s} {'p99 ms':>8s} {'max ms':>8s} {'trainings':>10s}")
+    for mode in args.modes:
+        stop, runs, worker = Event(), [], None
+        if mode != "idle":
+            target = _train_unmanaged if mode == "unmanaged" else _train_governed
+            worker = Thread(target=target, args=(modules, users, stop, runs), daemon=True)
+            worker.start()
+            time.sleep(args.warmup)
+        ms = _serve(bundle, queries, args.seconds, args.top_n)
+        stop.set()
+        if worker is not None:
+            worker.join()
+        print(f"{mode:>10s} {len(ms):9d} {np.percentile(ms, 50):8.2f} {np.percentile(ms, 95):8.2f} "
+              f"{np.percentile(ms, 99):8.2f} {ms.max():8.2f} {len(runs):10d}")
+
+
+if __name__ == "__main__":
+    main()
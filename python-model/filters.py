@@ -0,0 +1,120 @@
+"""Query-time attribute filters.
+`build_attribute_index` runs at train time: one packed bitmap per categorical value
+and a sorted copy of every numeric column. `filter_mask` turns a filter expression
+into a boolean mask over the module rows using only those indexes.
+
+Filter expression (all conditions are AND-ed):
+    {"studycredit": 15,                      # equality (a list means any of them)
+     "location": ["Breda", "Tilburg"],       # any of these values
+     "level": "NLQF5",
+     "available_spots": {"gt": 0}}           # range: gt / gte / lt / lte / eq
+"""
+from typing import Dict, Any, Optional
+import numpy as np
+import pandas as pd
+
+CATEGORICAL_FILTER_COLUMNS = ["location", "level"]
+NUMERIC_FILTER_COLUMNS = ["studycredit", "available_spots", "estimated_difficulty", "popularity_score", "interests_match_score"]
+
+_RANGE_OPS = {"gt", "gte", "lt", "lte", "eq"}
+
+
+def build_attribute_index(df: pd.DataFrame) -> Dict[str, Any]:
+    n = len(df)
+    categorical = {}
+    for col in CATEGORICAL_FILTER_COLUMNS:
+        if col not in df.columns:
+            continue
+        values = df[col].fillna("").astype(str).str.strip().to_numpy()
+        categorical[col] = {
+            value: np.packbits(values == value)
+            for value in pd.unique(values) if value
+        }
+
+    numeric = {}
+    for col in NUMERIC_FILTER_COLUMNS:
+        if col not in df.columns:
+            continue
+        values = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=float)
+        order = np.argsort(values, kind="stable")
+        # NaN sorteert achteraan en telt nooit mee in een bereik
+        valid = int((~np.isnan(values)).sum())
+        numeric[col] = {"sorted": values[order][:valid], "order": order[:valid]}
+
+    return {"n": n, "categorical": categorical, "numeric": numeric}
+
+
+def _unpack(bits: np.ndarray, n: int) -> np.ndarray:
+    return np.unpackbits(bits, count=n).astype(bool)
+
+
+def _bound(op: str, value) -> float:
+    """Filter bound as float; "15" is accepted, anything non-numeric is a ValueError."""
+    if isinstance(value, bool) or value is None:
+        raise ValueError(f"Filter bound '{op}' must be a number, got {value!r}")
+    try:
+        bound = float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Filter bound '{op}' must be a number, got {value!r}")
+    if np.isnan(bound):
+        raise ValueError(f"Filter bound '{op}' must be a number, got {value!r}")
+    return bound
+
+
+def _numeric_mask(entry: Dict[str, np.ndarray], condition, n: int) -> np.ndarray:
+    if not isinstance(condition, dict):
+        condition = {"eq": condition}
+    unknown = set(condition) - _RANGE_OPS
+    if unknown:
+        raise ValueError(f"Unknown filter operator(s): {sorted(unknown)}")
+    condition = {op: _bound(op, value) for op, value in condition.items()}
+
+    sorted_values = entry["sorted"]
+    lo, hi = 0, len(sorted_values)
+    if "eq" in condition:
+        lo = max(lo, np.searchsorted(sorted_values, condition["eq"], side="left"))
+        hi = min(hi, np.searchsorted(sorted_values, condition["eq"], side="right"))
+    if "gt" in condition:
+        lo = max(lo, np.searchsorted(sorted_values, condition["gt"], side="right"))
+    if "gte" in condition:
+        lo = max(lo, np.searchsorted(sorted_values, condition["gte"], side="left"))
+    if "lt" in condition:
+        hi = min(hi, np.searchsorted(sorted_values, condition["lt"], side="left"))
+    if "lte" in condition:
+        hi = min(hi, np.searchsorted(sorted_values, condition["lte"], side="right"))
+
+    mask = np.zeros(n, dtype=bool)
+    if lo < hi:
+        mask[entry["order"][lo:hi]] = True
+    return mask
+
+
+def filter_mask(attribute_index: Optional[Dict[str, Any]], filters: Optional[Dict[str, Any]], n: int) -> Optional[np.ndarray]:
+    """Boolean mask of modules matching every condition, or None when there are no filters."""
+    if not filters:
+        return None
+    if attribute_index is None:
+        raise ValueError("This model has no attribute index; retrain to enable filters")
+
+    mask = np.ones(n, dtype=bool)
+    for col, condition in filters.items():
+        if col in attribute_index["categorical"]:
+            bitmaps = attribute_index["categorical"][col]
+            wanted = condition if isinstance(condition, list) else [condition]
+            col_mask = np.zeros(n, dtype=bool)
+            for value in wanted:
+                bits = bitmaps.get(str(value).strip())
+                if bits is not None:
+                    col_mask |= _unpack(bits, n)
+        elif col in attribute_index["numeric"]:
+            entry = attribute_index["numeric"][col]
+            if isinstance(condition, list):
+                col_mask = np.zeros(n, dtype=bool)
+                for value in condition:
+                    col_mask |= _numeric_mask(entry, value, n)
+            else:
+                col_mask = _numeric_mask(entry, condition, n)
+        else:
+            raise ValueError(f"Cannot filter on '{col}'")
+        mask &= col_mask
+    return mask
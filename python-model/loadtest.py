@@ -0,0 +1,352 @@
+"""Open-loop traffic replay against the model API.
+
+Requests have the shape the react-server sends (react-server/src/infrastructure/ai/ai.client.ts):
+{"user": {"favorite_id": [<string id>, ...], "profile_text": "..."}, "top_n": N} with the
+x-api-key header, and every request walks the same fallback paths as that client
+(/recommend/recommend-explain, /recommend-explain, /recommend/recommend, /recommend),
+moving to the next path on any non-2xx answer or connection error.
+
+Requests are fired on a fixed schedule (--rps, or the recorded offsets with --speed),
+independent of how fast the server answers; latency is measured from the scheduled
+send time, so queueing in the client counts as server slowness instead of hiding it.
+
+Examples (run from python-model/):
+    python loadtest.py --start-app --synthesize 5000 --rps 20 --duration 120
+    python loadtest.py --url http://localhost:8000 --log requests.jsonl --speed 2 --pid 1234
+
+--log reads JSON lines: either a payload, or {"t": <seconds since start>, "payload": {...}}.
+CPU/RSS of the server (and its child processes) are sampled from /proc when the
+process is known (--start-app or --pid).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock, Event, Thread, local
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+import numpy as np
+import pandas as pd
+import requests
+
+CLIENT_PATHS = ["/recommend/recommend-explain", "/recommend-explain", "/recommend/recommend", "/recommend"]
+PROFILE_TEXTS = [
+    "", "", "",
+    "Ik hou van data analyse en visualisatie",
+    "Interesse in zorg, psychologie en welzijn",
+    "software engineering en webontwikkeling",
+    "marketing, ondernemen en communicatie",
+    "I would like to learn more about artificial intelligence",
+]
+
+_tls = local()
+
+
+def _session() -> requests.Session:
+    if not hasattr(_tls, "session"):
+        _tls.session = requests.Session()
+    return _tls.session
+
+
+# --- Workload ---
+
+def load_log(path: str) -> List[Tuple[Optional[float], Dict[str, Any]]]:
+    entries = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if "payload" in entry:
+                entries.append((entry.get("t"), entry["payload"]))
+            else:
+                entries.append((None, entry))
+    return entries
+
+
+def synthesize(n: int, seed: int = 42, top_n: int = 5) -> List[Tuple[Optional[float], Dict[str, Any]]]:
+    """Payloads like the website sends: 0-6 favourites (popular modules more often,
+    known users' favourite lists when available) and mostly empty profile text.
+    """
+    from recommender import fetch_remote_modules_users
+
+    modules, users = fetch_remote_modules_users()
+    ids = (modules["_id"] if "_id" in modules.columns else modules["id"]).astype(str).to_numpy()
+    popularity = pd.to_numeric(modules.get("popularity_score", pd.Series(1.0, index=modules.index)), errors="coerce")
+    p = popularity.fillna(0).clip(lower=0).to_numpy() + 1.0
+    p = p / p.sum()
+    known = []
+    if "favorite_id" in getattr(users, "columns", []):
+        known = [[str(x) for x in favs] for favs in users["favorite_id"] if isinstance(favs, list) and favs]
+
+    rng = np.random.default_rng(seed)
+    entries = []
+    for _ in range(n):
+        if known and rng.random() < 0.3:
+            favorites = known[rng.integers(len(known))]
+        else:
+            favorites = rng.choice(ids, size=min(int(rng.integers(0, 7)), len(ids)), replace=False, p=p).tolist()
+        user = {"favorite_id": favorites}
+        profile = PROFILE_TEXTS[rng.integers(len(PROFILE_TEXTS))]
+        if profile:
+            user["profile_text"] = profile
+        entries.append((None, {"user": user, "top_n": top_n}))
+    return entries
+
+
+def schedule(entries, rps: Optional[float], speed: float, poisson: bool, duration: Optional[float], seed: int):
+    """(send offset in seconds, payload) pairs; the workload is cycled when --duration asks for more."""
+    rng = random.Random(seed)
+    recorded = rps is None and all(t is not None for t, _ in entries)
+    if not recorded and not rps:
+        raise ValueError("--rps is required unless every log entry has a 't' offset")
+    out = []
+    if recorded:
+        base = min(t for t, _ in entries)
+        span = max(t for t, _ in entries) - base
+        loop = 0
+        while True:
+            for t, payload in entries:
+                offset = ((t - base) + loop * (span + 1.0)) / speed
+                if duration is not None and offset >= duration:
+                    return out
+                out.append((offset, payload))
+            loop += 1
+            if duration is None:
+                return out
+
+    offset, i = 0.0, 0
+    while (duration is None and i < len(entries)) or (duration is not None and offset < duration):
+        out.append((offset, entries[i % len(entries)][1]))
+        offset += rng.expovariate(rps) if poisson else 1.0 / rps
+        i += 1
+    return out
+
+
+# --- Server process ---
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_app(port: int, workers: int, ready_timeout: float) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    proc = subprocess.Popen(cmd, cwd=Path(__file__).resolve().parent)
+    deadline = time.time() + ready_timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"App exited with code {proc.returncode}")
+        try:
+            if requests.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                return proc
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f"App not ready after {ready_timeout}s")
+
+
+def _process_tree(pid: int) -> List[int]:
+    pids, todo = [], [pid]
+    while todo:
+        p = todo.pop()
+        pids.append(p)
+        for task in Path(f"/proc/{p}/task").glob("*"):
+            try:
+                todo.extend(int(c) for c in (task / "children").read_text().split())
+            except OSError:
+                pass
+    return pids
+
+
+def _cpu_rss(pid: int) -> Tuple[float, int]:
+    """(CPU seconds, RSS bytes) summed over the process and its children."""
+    ticks, rss = 0, 0
+    page = os.sysconf("SC_PAGE_SIZE")
+    for p in _process_tree(pid):
+        try:
+            fields = Path(f"/proc/{p}/stat").read_text().rsplit(")", 1)[1].split()
+            ticks += int(fields[11]) + int(fields[12])
+            rss += int(Path(f"/proc/{p}/statm").read_text().split()[1]) * page
+        except (OSError, IndexError, ValueError):
+            pass
+    return ticks / os.sysconf("SC_CLK_TCK"), rss
+
+
+# --- Run ---
+
+class Recorder:
+    def __init__(self):
+        self._lock = Lock()
+        self.results: List[Dict[str, Any]] = []
+
+    def add(self, result: Dict[str, Any]):
+        with self._lock:
+            self.results.append(result)
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self.results)
+
+
+def send(base_url: str, api_key: str, payload: Dict[str, Any], timeout: float) -> Dict[str, Any]:
+    """One client call with the ai.client.ts fallback: next path on any failure."""
+    attempts, status, error = 0, None, None
+    for path in CLIENT_PATHS:
+        attempts += 1
+        try:
+            res = _session().post(
+                base_url.rstrip("/") + path, json=payload, timeout=timeout,
+                headers={"Content-Type": "application/json", "x-api-key": api_key},
+            )
+        except requests.RequestException as e:
+            if error is None or status == 404:
+                status, error = None, type(e).__name__
+            continue
+        if res.ok:
+            return {"status": res.status_code, "path": path, "attempts": attempts, "error": None}
+        # Een 404 betekent alleen "volgend pad"; een andere status is de echte fout
+        if error is None or (status == 404 and res.status_code != 404):
+            status, error = res.status_code, f"HTTP {res.status_code}"
+    return {"status": status, "path": None, "attempts": attempts, "error": error}
+
+
+def run(base_url: str, api_key: str, plan, concurrency: int, timeout: float, pid: Optional[int], interval: float):
+    recorder = Recorder()
+    pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="loadtest")
+    samples = []
+    done = Event()
+
+    def _job(scheduled: float, payload: Dict[str, Any]):
+        result = send(base_url, api_key, payload, timeout)
+        end = time.perf_counter()
+        result.update(scheduled=scheduled - t0, latency_ms=(end - scheduled) * 1000, end=end - t0)
+        recorder.add(result)
+
+    def _monitor():
+        while True:
+            cpu, rss = _cpu_rss(pid) if pid else (None, None)
+            samples.append({"t": time.perf_counter() - t0, "cpu_seconds": cpu, "rss_bytes": rss})
+            if done.wait(interval):
+                break
+
+    t0 = time.perf_counter()
+    monitor = Thread(target=_monitor, daemon=True)
+    monitor.start()
+    for offset, payload in plan:
+        scheduled = t0 + offset
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        pool.submit(_job, scheduled, payload)
+    pool.shutdown(wait=True)
+    done.set()
+    monitor.join()
+    return recorder.snapshot(), samples, time.perf_counter() - t0
+
+
+def timeline(results: List[Dict[str, Any]], samples: List[Dict[str, Any]], interval: float) -> pd.DataFrame:
+    """Per-interval completions, error rate, latency percentiles and server CPU/RSS."""
+    frame = pd.DataFrame(results)
+    frame["bucket"] = (frame["end"] // interval).astype(int)
+    frame["failed"] = frame["error"].notna()
+    rows = []
+    for bucket, group in frame.groupby("bucket"):
+        lat = group["latency_ms"].to_numpy()
+        rows.append({
+            "t": (bucket + 1) * interval,
+            "completed": len(group),
+            "throughput_rps": len(group) / interval,
+            "error_rate": float(group["failed"].mean()),
+            "p50_ms": float(np.percentile(lat, 50)),
+            "p95_ms": float(np.percentile(lat, 95)),
+            "p99_ms": float(np.percentile(lat, 99)),
+        })
+    out = pd.DataFrame(rows)
+    if samples and samples[0]["cpu_seconds"] is not None:
+        # Eerste sample (t=0) is alleen de basislijn voor het CPU-verschil
+        res = pd.DataFrame(samples)
+        res["cpu_percent"] = res["cpu_seconds"].diff() / res["t"].diff() * 100
+        res["rss_mb"] = res["rss_bytes"] / 2**20
+        res["t"] = np.maximum(1, np.round(res["t"] / interval)) * interval
+        res = res.iloc[1:].groupby("t", as_index=False)[["cpu_percent", "rss_mb"]].mean()
+        out = out.merge(res, on="t", how="outer").sort_values("t")
+    return out.reset_index(drop=True)
+
+
+def summary(results: List[Dict[str, Any]], elapsed: float, offered_rps: float) -> Dict[str, Any]:
+    frame = pd.DataFrame(results)
+    ok = frame[frame["error"].isna()]
+    lat = frame["latency_ms"].to_numpy()
+    return {
+        "requests": len(frame),
+        "elapsed_seconds": round(elapsed, 2),
+        "offered_rps": round(offered_rps, 2),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "error_rate": round(1 - len(ok) / len(frame), 4) if len(frame) else 0.0,
+        "errors": frame.loc[frame["error"].notna(), "error"].value_counts().to_dict(),
+        "served_by": ok["path"].value_counts().to_dict(),
+        "mean_attempts": round(float(frame["attempts"].mean()), 2),
+        "latency_ms": {f"p{q}": round(float(np.percentile(lat, q)), 2) for q in (50, 90, 95, 99)}
+                      | {"max": round(float(lat.max()), 2)},
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open-loop traffic replay in the react-server request shape")
+    parser.add_argument("--url", default=os.getenv("MODEL_API_URL") or f"http://localhost:{os.getenv('MODEL_API_PORT', '8000')}")
+    parser.add_argument("--api-key", default=os.getenv("PYTHON_API_KEY"))
+    parser.add_argument("--start-app", action="store_true", help="start uvicorn main:app locally on a free port")
+    parser.add_argument("--app-workers", type=int, default=1)
+    parser.add_argument("--ready-timeout", type=float, default=600)
+    parser.add_argument("--pid", type=int, help="server process to sample CPU/RSS from")
+    parser.add_argument("--log", help="JSON lines with recorded payloads")
+    parser.add_argument("--synthesize", type=int, default=1000, help="number of synthetic payloads when no --log is given")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--rps", type=float, help="fixed request rate (ignores recorded offsets)")
+    parser.add_argument("--poisson", action="store_true", help="exponential inter-arrival times at --rps")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up for recorded offsets")
+    parser.add_argument("--duration", type=float, help="seconds to run; the workload is repeated as needed")
+    parser.add_argument("--concurrency", type=int, default=256, help="max requests in flight")
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--interval", type=float, default=1.0, help="timeline resolution in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="CSV path for the timeline; the summary is written next to it as .json")
+    args = parser.parse_args()
+    if not args.api_key:
+        parser.error("PYTHON_API_KEY (or --api-key) is required")
+
+    entries = load_log(args.log) if args.log else synthesize(args.synthesize, seed=args.seed, top_n=args.top_n)
+    plan = schedule(entries, args.rps, args.speed, args.poisson, args.duration, args.seed)
+    planned = plan[-1][0] if plan else 0.0
+
+    proc, base_url, pid = None, args.url, args.pid
+    if args.start_app:
+        port = _free_port()
+        os.environ["PYTHON_API_KEY"] = args.api_key
+        proc = start_app(port, args.app_workers, args.ready_timeout)
+        base_url, pid = f"http://127.0.0.1:{port}", proc.pid
+
+    print(f"[LOADTEST] {len(plan)} requests over {planned:.1f}s against {base_url}")
+    try:
+        results, samples, elapsed = run(base_url, args.api_key, plan, args.concurrency, args.timeout, pid, args.interval)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=30)
+
+    report = summary(results, elapsed, len(plan) / max(planned, 1e-9))
+    series = timeline(results, samples, args.interval)
+    print(series.to_string(index=False, float_format=lambda v: f"{v:.1f}"))
+    print(json.dumps(report, indent=2))
+    if args.out:
+        series.to_csv(args.out, index=False)
+        Path(args.out).with_suffix(".json").write_text(json.dumps(report, indent=2))
+        print(f"[LOADTEST] timeline -> {args.out}")
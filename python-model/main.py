@@ -1,9 +1,14 @@
+import resources  # eerst: zet de BLAS-threadlimieten voordat numpy laadt
 from fastapi import FastAPI
-from api import train, recommend, evaluate, plot, health, startup
+from api import train, recommend, evaluate, plot, health, startup, interactions, shadow, admin, modules, search
+from online_cf import start_compaction_thread
+from module_upsert import start_refit_thread
+from serialization import FastJSONResponse
 
 app = FastAPI(
     title="Hybrid Recommender Model API",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
     
@@ -12,6 +17,18 @@ app.include_router(train.router, prefix="/train")
 app.include_router(recommend.router, prefix="/recommend")
 app.include_router(evaluate.router, prefix="/evaluate")
 app.include_router(plot.router, prefix="/plot")
+app.include_router(interactions.router, prefix="/interactions")
+app.include_router(shadow.router, prefix="/shadow")
+app.include_router(admin.router, prefix="/admin")
+app.include_router(modules.router, prefix="/modules")
+app.include_router(search.router, prefix="/search")
+@app.on_event("startup")
+async def configure_resources():
+    resources.apply_serving_limits()
+    await resources.limit_request_threads()
+
 @app.on_event("startup")
 def startup_event():
-    startup.retrain_on_startup()
\ No newline at end of file
+    startup.retrain_on_startup()
+    start_compaction_thread()
+    start_refit_thread(startup.retrain_on_startup)
\ No newline at end of file
@@ -18,3 +18,19 @@ def verify_api_key(x_api_key: str | None = Header(None)):
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Invalid API key"
         )
+
+def verify_admin_key(x_admin_key: str | None = Header(None)):
+    # Admin-endpoints (profiling) staan uit zolang ADMIN_API_KEY niet gezet is
+    expected = os.getenv("ADMIN_API_KEY")
+
+    if not expected:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Not Found"
+        )
+
+    if not x_admin_key or x_admin_key != expected:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid admin key"
+        )
@@ -0,0 +1,12 @@
+from fastapi import Header, HTTPException, status
+from modelstore import tenant_name
+
+def resolve_tenant(x_tenant_id: str | None = Header(None)) -> str:
+    # Zonder header: DEFAULT_TENANT (één-instituut-installaties)
+    try:
+        return tenant_name(x_tenant_id)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
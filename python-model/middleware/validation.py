@@ -1,17 +1,58 @@
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, field_validator
+from typing import Any, Dict, List, Optional, Union
 
 class UserInput(BaseModel):
-    user_id: int
-    favorite_id: List[int] = Field(default_factory=list)
+    user_id: Optional[Union[int, str]] = None
+    # Module-ids houden hun type (string uit de API, int uit de CSV)
+    favorite_id: List[Union[str, int]] = Field(default_factory=list)
     profile_text: Optional[str] = ""
 
+    @field_validator("profile_text", mode="before")
+    @classmethod
+    def _none_is_empty(cls, v):
+        return "" if v is None else v
+
 class RecommendRequest(BaseModel):
-    user: UserInput
+    user: UserInput = Field(default_factory=UserInput)
     top_n: int = Field(ge=1, le=50, default=5)
+    filters: Optional[Dict[str, Any]] = None
+    weights: Optional[Dict[str, float]] = None
+    # Opaque cursor uit een eerder antwoord; top_n is dan de paginagrootte
+    cursor: Optional[str] = None
+
+class SearchRequest(BaseModel):
+    query: str = Field(min_length=1, max_length=500)
+    top_n: int = Field(ge=1, le=50, default=10)
+    filters: Optional[Dict[str, Any]] = None
+    # Optioneel: mengen met de hybride score van deze gebruiker (0 = alleen tekst)
+    user: Optional[UserInput] = None
+    blend: float = Field(ge=0.0, le=1.0, default=0.0)
+    weights: Optional[Dict[str, float]] = None
+
+class BatchRecommendRequest(BaseModel):
+    requests: List[RecommendRequest] = Field(min_length=1, max_length=1000)
+
+class Recommendation(BaseModel):
+    id: Union[str, int] = Field(alias="_id")
+    score: float
+
+class RecommendResponse(BaseModel):
+    recommendations: List[Recommendation]
+    next_cursor: Optional[str] = None
+
+class BatchRecommendResult(BaseModel):
+    recommendations: List[Recommendation]
+
+class BatchRecommendResponse(BaseModel):
+    version: Optional[str] = None
+    results: List[BatchRecommendResult]
 
 class TrainRequest(BaseModel):
     # Training should fetch modules/users from external API. Optional fields kept for backward compatibility.
     modules: Optional[list] = None
     users: Optional[list] = None
     num_dummy_users: Optional[int] = 50
+    # Save as shadow candidate instead of replacing the active model
+    shadow: Optional[bool] = False
+    # Out-of-core training in chunks (streaming_train.py) for very large catalogues
+    streaming: Optional[bool] = False
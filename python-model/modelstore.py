@@ -1,48 +1,336 @@
 # modelstore.py
 import joblib
+import pandas as pd
+import os
+import re
+import shutil
+import time
+import uuid
+from collections import OrderedDict
 from pathlib import Path
 from threading import Lock
 from datetime import datetime
+from typing import Optional
+from recommender import warm_up_model
+from sharding import activate_sharding, SERVING_SHARDS
+from profiling import bundle_sizes
 
 MODELS_DIR = Path("./models")
 MODELS_DIR.mkdir(exist_ok=True)
 
-_current_model_path = MODELS_DIR / "current.joblib"
+# Elke tenant (instituut) heeft een eigen catalogus, versiegeschiedenis en current.joblib.
+# De default-tenant gebruikt MODELS_DIR zelf, zodat bestaande installaties ongewijzigd werken.
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+MODEL_MEMORY_BUDGET_MB = float(os.getenv("MODEL_MEMORY_BUDGET_MB", "0"))
+MAX_RESIDENT_TENANTS = int(os.getenv("MAX_RESIDENT_TENANTS", "0"))
+_TENANT_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{0,63}$")
+
 _lock = Lock()
+_load_locks = {}
+
+# Actieve modellen per tenant, minst recent gebruikt eerst: {tenant: {"bundle", "mtime", "bytes"}}.
+# Alleen opnieuw laden als de current.joblib van die tenant wijzigt.
+_resident = OrderedDict()
+# Versie per tenant die klaar is met opwarmen; /ready meldt pas daarna gereed
+_warm = {}
+_metrics = {"hits": 0, "misses": 0, "evictions": 0, "evicted_bytes": 0, "reloads_after_eviction": 0}
+_tenant_metrics = {}
+_evicted = set()
+
+def _read_bundle(path: Path) -> dict:
+    # Elke geladen kopie krijgt een eigen token: caches van een andere kopie gelden niet
+    model_bundle = joblib.load(path)
+    model_bundle["bundle_token"] = uuid.uuid4().hex
+    return model_bundle
+
+def tenant_name(tenant: Optional[str] = None) -> str:
+    """Validated tenant id; None means DEFAULT_TENANT."""
+    if tenant is None or tenant == "":
+        return DEFAULT_TENANT
+    if not isinstance(tenant, str) or not _TENANT_RE.match(tenant):
+        raise ValueError("Tenant id must be 1-64 letters, digits, '-' or '_'")
+    return tenant
+
+def tenant_dir(tenant: Optional[str] = None) -> Path:
+    tenant = tenant_name(tenant)
+    return MODELS_DIR if tenant == DEFAULT_TENANT else MODELS_DIR / "tenants" / tenant
+
+def _current_path(tenant: str) -> Path:
+    return tenant_dir(tenant) / "current.joblib"
+
+def version_path(version: str, tenant: Optional[str] = None) -> Path:
+    """Path of the versioned bundle file written by save_model()."""
+    return tenant_dir(tenant) / f"model_{version}.joblib"
+
+def list_tenants() -> list:
+    """Tenants with a trained model on disk."""
+    tenants = [DEFAULT_TENANT] if _current_path(DEFAULT_TENANT).exists() else []
+    root = MODELS_DIR / "tenants"
+    if root.exists():
+        tenants += sorted(p.name for p in root.iterdir() if (p / "current.joblib").exists() and p.name != DEFAULT_TENANT)
+    return tenants
+
+def _tenant_counter(tenant: str) -> dict:
+    return _tenant_metrics.setdefault(tenant, {"hits": 0, "misses": 0, "evictions": 0, "load_seconds": None})
+
+def _over_budget() -> bool:
+    if MAX_RESIDENT_TENANTS > 0 and len(_resident) > MAX_RESIDENT_TENANTS:
+        return True
+    budget = MODEL_MEMORY_BUDGET_MB * 1024 * 1024
+    return budget > 0 and sum(e["bytes"] for e in _resident.values()) > budget
+
+def _evict(keep: str):
+    """Drop least recently used tenants until the budget fits (caller holds _lock).
+    `keep` and bundles with unsaved upserts (`dirty`) stay resident; requests that
+    already hold an evicted bundle finish with it.
+    """
+    while _over_budget():
+        victim = next((t for t, e in _resident.items() if t != keep and not e["bundle"].get("dirty")), None)
+        if victim is None:
+            print("[MODELSTORE] Model memory budget exceeded, but no idle tenant can be evicted")
+            return
+        entry = _resident.pop(victim)
+        _evicted.add(victim)
+        _metrics["evictions"] += 1
+        _metrics["evicted_bytes"] += entry["bytes"]
+        _tenant_counter(victim)["evictions"] += 1
+        print(f"[MODELSTORE] Evicted tenant {victim} (version {entry['bundle'].get('version')}, {entry['bytes'] / 1e6:.0f} MB)")
+
+def _admit(tenant: str, model_bundle: dict, mtime: int):
+    """Make `model_bundle` the resident model of `tenant` (caller holds _lock)."""
+    _resident[tenant] = {"bundle": model_bundle, "mtime": mtime, "bytes": bundle_sizes(model_bundle)["total_bytes"]}
+    _resident.move_to_end(tenant)
+    _evict(keep=tenant)
+
+def _warm_up(model_bundle: dict):
+    """Prepare a bundle that is about to become active: split it over the serving
+    shards (SERVING_SHARDS > 1), run the warm-up and record it.
+    """
+    version = model_bundle.get("version")
+    tenant = model_bundle.get("tenant", DEFAULT_TENANT)
+    # Er is één set shard-processen; andere tenants scoren in-process
+    if SERVING_SHARDS > 1 and tenant == DEFAULT_TENANT:
+        activate_sharding(model_bundle)
+    try:
+        result = warm_up_model(model_bundle)
+        seconds = result["seconds"]
+        print(f"[MODELSTORE] Warm-up of version {version} took {seconds:.2f}s ({result['queries']} queries)")
+    except Exception as e:
+        seconds = None
+        print(f"[MODELSTORE] Warm-up of version {version} failed: {e}")
+    _warm[tenant] = {"version": version, "seconds": seconds}
+
+def readiness(tenant: Optional[str] = None) -> dict:
+    """Whether the resident model of a tenant finished its warm-up."""
+    tenant = tenant_name(tenant)
+    entry = _resident.get(tenant)
+    version = entry["bundle"].get("version") if entry is not None else None
+    warm = _warm.get(tenant, {})
+    return {
+        "ready": version is not None and warm.get("version") == version,
+        "version": version,
+        "warmup_seconds": warm.get("seconds") if warm.get("version") == version else None,
+    }
 
-def save_model(model_bundle: dict):
+def save_model(model_bundle: dict, activate: bool = True, tenant: Optional[str] = None):
     """
     Save the hybrid model bundle with a versioned file and overwrite current.joblib.
+    The saved bundle is warmed up (see recommender.warm_up_model) and then becomes
+    the resident model returned by load_model().
+    With activate=False only the versioned file is written (shadow candidate);
+    promote it later with activate_version().
+    The full training frame (`df_raw`) is written to a separate
+    model_<version>.raw.joblib so serving processes do not unpickle it; it is removed
+    from `model_bundle` (use load_raw_frame) so the resident bundle does not hold it.
+    Out-of-core builds pass it as chunk files (`raw_df_parts`) instead; those are
+    moved into a model_<version>.raw/ directory without loading them.
+    Files go to the tenant's directory (`tenant`, else the bundle's "tenant", else
+    DEFAULT_TENANT); versions of other tenants are prefixed with the tenant id, so
+    caches keyed on the version never mix tenants.
     Expected keys in model_bundle:
-    - df: pd.DataFrame with modules
+    - df: compact serving table (see recommender.build_serving_table)
+    - df_raw: full training pd.DataFrame with modules (optional)
+    - raw_df_parts: paths of joblib'd chunks of that frame, in order (optional, streaming)
     - module_vectors_pca: np.ndarray PCA-reduced module vectors
+    - module_vectors_2d: np.ndarray 2D layout used by /plot/pca
+    - dtype: compute dtype of the model arrays (float32 by default)
     - vectorizer: fitted TfidfVectorizer
     - pca: fitted PCA object
     - scaler: fitted StandardScaler for numeric features
     - als_model: trained implicit.als.AlternatingLeastSquares model
     - user_map / item_map / item_map_inv: mapping dicts for ALS
     """
+    tenant = tenant_name(tenant or model_bundle.get("tenant"))
     version = datetime.utcnow().isoformat(timespec="seconds").replace(":", "-")
+    if tenant != DEFAULT_TENANT:
+        version = f"{tenant}_{version}"
     model_bundle["version"] = version
+    model_bundle["tenant"] = tenant
 
-    version_path = MODELS_DIR / f"model_{version}.joblib"
+    directory = tenant_dir(tenant)
+    directory.mkdir(parents=True, exist_ok=True)
+    model_path = version_path(version, tenant)
+    raw_df = model_bundle.pop("df_raw", None)
+    raw_parts = model_bundle.pop("raw_df_parts", None)
+    if raw_df is not None:
+        raw_path = directory / f"model_{version}.raw.joblib"
+        model_bundle["raw_df_path"] = str(raw_path)
+    elif raw_parts:
+        raw_path = directory / f"model_{version}.raw"
+        model_bundle["raw_df_path"] = str(raw_path)
+
+    if activate:
+        _warm_up(model_bundle)
 
     with _lock:
+        if raw_df is not None:
+            joblib.dump(raw_df, raw_path)
+        elif raw_parts:
+            raw_path.mkdir(exist_ok=True)
+            for i, part in enumerate(raw_parts):
+                shutil.move(str(part), str(raw_path / f"part_{i:06d}.joblib"))
         # Save versioned model
-        joblib.dump(model_bundle, version_path)
-        # Overwrite current model
-        joblib.dump(model_bundle, _current_model_path)
-    print(f"[MODELSTORE] Model saved as {version_path}")
+        joblib.dump(model_bundle, model_path)
+        if activate:
+            # Overwrite current model
+            current_path = _current_path(tenant)
+            joblib.dump(model_bundle, current_path)
+            _admit(tenant, model_bundle, current_path.stat().st_mtime_ns)
+    # df_raw blijft van de bundle af; load_raw_frame haalt hem lazy terug
+    print(f"[MODELSTORE] Model saved as {model_path}")
 
-def load_model() -> dict:
+def load_model(tenant: Optional[str] = None) -> dict:
     """
-    Load the current model bundle.
+    Load the current model bundle of a tenant (DEFAULT_TENANT when omitted).
+    The bundle is kept resident and only read from disk again when the tenant's
+    current.joblib changed (another process trained) or after it was evicted to stay
+    within MODEL_MEMORY_BUDGET_MB / MAX_RESIDENT_TENANTS. Online updates
+    (online_cf.py) mutate it in place.
     Returns:
         dict with keys as stored in save_model()
     """
-    if not _current_model_path.exists():
-        raise RuntimeError("No trained model available")
+    tenant = tenant_name(tenant)
+    current_path = _current_path(tenant)
+    if not current_path.exists():
+        raise RuntimeError("No trained model available" if tenant == DEFAULT_TENANT else f"No trained model available for tenant {tenant}")
+    mtime = current_path.stat().st_mtime_ns
+    with _lock:
+        entry = _resident.get(tenant)
+        if entry is not None and entry["mtime"] == mtime:
+            _resident.move_to_end(tenant)
+            _metrics["hits"] += 1
+            _tenant_counter(tenant)["hits"] += 1
+            return entry["bundle"]
+        load_lock = _load_locks.setdefault(tenant, Lock())
+
+    # Per tenant één lader; andere tenants blijven intussen bediend
+    with load_lock:
+        with _lock:
+            entry = _resident.get(tenant)
+            if entry is not None and entry["mtime"] == mtime:
+                _resident.move_to_end(tenant)
+                return entry["bundle"]
+        start = time.perf_counter()
+        model_bundle = _read_bundle(current_path)
+        model_bundle.setdefault("tenant", tenant)
+        _warm_up(model_bundle)
+        seconds = time.perf_counter() - start
+        with _lock:
+            _metrics["misses"] += 1
+            if tenant in _evicted:
+                _metrics["reloads_after_eviction"] += 1
+                _evicted.discard(tenant)
+            counter = _tenant_counter(tenant)
+            counter["misses"] += 1
+            counter["load_seconds"] = round(seconds, 3)
+            _admit(tenant, model_bundle, mtime)
+    print(f"[MODELSTORE] Model loaded (tenant {tenant}, version {model_bundle.get('version','unknown')}, {seconds:.2f}s)")
+    return model_bundle
+
+def registry_stats() -> dict:
+    """Resident tenants (least recently used first), the budget and load/eviction counters."""
     with _lock:
-        model_bundle = joblib.load(_current_model_path)
-    print(f"[MODELSTORE] Model loaded (version {model_bundle.get('version','unknown')})")
+        resident = [
+            {"tenant": t, "version": e["bundle"].get("version"), "bytes": e["bytes"], "dirty": bool(e["bundle"].get("dirty"))}
+            for t, e in _resident.items()
+        ]
+        metrics = dict(_metrics)
+        tenants = {t: dict(c) for t, c in _tenant_metrics.items()}
+    lookups = metrics["hits"] + metrics["misses"]
+    return {
+        "default_tenant": DEFAULT_TENANT,
+        "memory_budget_mb": MODEL_MEMORY_BUDGET_MB or None,
+        "max_resident_tenants": MAX_RESIDENT_TENANTS or None,
+        "resident_bytes": sum(r["bytes"] for r in resident),
+        "resident": resident,
+        "miss_ratio": metrics["misses"] / lookups if lookups else None,
+        **metrics,
+        "tenants": tenants,
+    }
+
+def load_version(version: str, tenant: Optional[str] = None) -> dict:
+    """Load a specific saved version without activating it."""
+    tenant = tenant_name(tenant)
+    path = version_path(version, tenant)
+    if not path.exists():
+        raise RuntimeError(f"Model version {version} not found")
+    model_bundle = _read_bundle(path)
+    model_bundle.setdefault("tenant", tenant)
     return model_bundle
+
+def activate_version(version: str, model_bundle: dict = None, tenant: Optional[str] = None):
+    """
+    Make a saved version the current model of its tenant. Pass the already loaded
+    bundle to keep it resident without reading it from disk again.
+    """
+    tenant = tenant_name(tenant or (model_bundle or {}).get("tenant"))
+    path = version_path(version, tenant)
+    if not path.exists():
+        raise RuntimeError(f"Model version {version} not found")
+    if model_bundle is None:
+        model_bundle = _read_bundle(path)
+    model_bundle.setdefault("tenant", tenant)
+    _warm_up(model_bundle)
+    with _lock:
+        current_path = _current_path(tenant)
+        shutil.copyfile(path, current_path)
+        _admit(tenant, model_bundle, current_path.stat().st_mtime_ns)
+    print(f"[MODELSTORE] Model version {version} activated")
+
+def load_raw_frame(model_bundle: dict):
+    """
+    Full training frame of a bundle (descriptions, module_text, raw API columns).
+    Read from its own artifact on every call and not kept on the bundle, so the
+    resident model stays the size recorded at admission; callers drop it when done.
+    Bundles that were never saved still carry it as "df_raw".
+    """
+    raw_df = model_bundle.get("df_raw")
+    if raw_df is not None:
+        return raw_df
+    raw_path = model_bundle.get("raw_df_path")
+    parts = model_bundle.get("raw_df_parts")
+    if raw_path and Path(raw_path).is_dir():
+        parts = sorted(Path(raw_path).glob("part_*.joblib"))
+    elif raw_path and Path(raw_path).exists():
+        return joblib.load(raw_path)
+    if not parts:
+        raise RuntimeError("Raw module frame not available for this model")
+    # Streaming-build: het frame staat in chunks
+    return pd.concat([joblib.load(p) for p in parts], ignore_index=True)
+
+def save_raw_frame(model_bundle: dict, raw_df, revision: int) -> str:
+    """
+    Write an updated training frame (module upserts) to a new artifact next to the
+    bundle's files and return its path. The versioned model_<version>.raw.joblib is
+    left as trained; an earlier upsert artifact of the same version is replaced.
+    """
+    directory = tenant_dir(model_bundle.get("tenant"))
+    directory.mkdir(parents=True, exist_ok=True)
+    stem = f"model_{model_bundle.get('version', 'unsaved')}.raw.r"
+    path = directory / f"{stem}{revision}.joblib"
+    joblib.dump(raw_df, path)
+    # Alleen artefacten van deze versie opruimen; een opgeslagen versie verwijst er nog naar
+    previous = model_bundle.get("raw_df_path")
+    if previous and Path(previous).name.startswith(stem) and Path(previous) != path:
+        Path(previous).unlink(missing_ok=True)
+    return str(path)
@@ -0,0 +1,148 @@
+"""Add or update individual modules in the resident model without retraining.
+Only the changed modules go through spaCy; they are projected with the bundle's
+fitted vectorizer / scaler / PCA and their rows are appended or replaced in every
+per-module matrix and index. The bundle is marked dirty and a full refit runs on
+the next MODEL_REFIT_INTERVAL tick (see `start_refit_thread`).
+
+All new arrays and index copies are built first and swapped in with a single dict update.
+"""
+import copy
+from datetime import datetime
+from threading import Lock, Thread, Event
+from typing import Any, Callable, Dict, List, Optional
+import logging
+import os
+import numpy as np
+import pandas as pd
+import recommender
+from filters import build_attribute_index
+from modelstore import load_raw_frame, save_raw_frame, load_model
+from sharding import activate_sharding, SERVING_SHARDS
+
+MODEL_REFIT_INTERVAL = int(os.getenv("MODEL_REFIT_INTERVAL", "21600"))
+
+logger = logging.getLogger(__name__)
+_upsert_lock = Lock()
+
+
+def _replace_rows(matrix: np.ndarray, positions: np.ndarray, rows: np.ndarray, n_total: int) -> np.ndarray:
+    """Copy of `matrix` grown to n_total rows with `rows` written at `positions`."""
+    out = np.empty((n_total,) + matrix.shape[1:], dtype=matrix.dtype)
+    out[:len(matrix)] = matrix
+    out[positions] = rows
+    return out
+
+
+def upsert_modules(model_bundle: Dict[str, Any], modules: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Insert new modules / replace existing ones (matched on `_id`) in place."""
+    new = pd.DataFrame(modules)
+    if not len(new):
+        raise ValueError("No modules given")
+    if "_id" not in new.columns or new["_id"].isna().any():
+        raise ValueError("Every module needs an '_id'")
+    new = new.drop_duplicates("_id", keep="last").reset_index(drop=True)
+
+    processed = recommender.preprocess_modules(new)
+    tfidf_rows, pca_rows = recommender.project_modules(model_bundle, processed)
+
+    with _upsert_lock:
+        raw = load_raw_frame(model_bundle)
+        df = model_bundle["df"]
+        position_of = {mid: i for i, mid in enumerate(df["_id"].tolist())}
+
+        existing = np.array([position_of.get(mid, -1) for mid in processed["_id"]], dtype=np.int64)
+        is_new = existing < 0
+        existing[is_new] = len(df) + np.arange(int(is_new.sum()))
+        positions = existing
+        n_total = len(df) + int(is_new.sum())
+
+        # Serving-tabel en trainingsframe: vervangen op positie, nieuwe rijen achteraan
+        serving_rows = recommender.build_serving_table(processed)
+        serving_rows.index = positions
+        new_df = pd.concat([df, serving_rows[is_new]])
+        new_df.loc[positions[~is_new]] = serving_rows[~is_new]
+        new_df = new_df.reset_index(drop=True)
+
+        raw_rows = processed.reindex(columns=raw.columns.union(processed.columns, sort=False))
+        raw_rows.index = positions
+        new_raw = pd.concat([raw, raw_rows[is_new]])
+        new_raw.loc[positions[~is_new], raw_rows.columns] = raw_rows[~is_new]
+        new_raw = new_raw.reset_index(drop=True)
+
+        dtype = np.dtype(model_bundle.get("dtype", "float64"))
+        module_vectors_pca = _replace_rows(model_bundle["module_vectors_pca"], positions, pca_rows, n_total)
+        updates = {
+            "df": new_df,
+            "module_vectors_pca": module_vectors_pca,
+            "module_tfidf_dense": _replace_rows(model_bundle["module_tfidf_dense"], positions, tfidf_rows, n_total),
+            "module_pca_inv_norm": recommender._inv_norms(module_vectors_pca),
+            "module_vectors_2d": recommender._projection_2d(module_vectors_pca),
+            "attribute_index": build_attribute_index(new_raw),
+        }
+        popularity_norm = recommender._popularity_norm(new_raw, dtype)
+        updates["popularity_norm"] = popularity_norm
+        updates["popularity_ranking"] = recommender.build_popularity_ranking(new_raw, popularity_norm)
+
+        if model_bundle.get("module_vectors_pca_q") is not None:
+            scale = model_bundle["module_vectors_pca_scale"]
+            unit = pca_rows * recommender._inv_norms(pca_rows)[:, None]
+            q_rows = np.clip(np.round(unit / scale), -127, 127).astype(np.int8)
+            updates["module_vectors_pca_q"] = _replace_rows(model_bundle["module_vectors_pca_q"], positions, q_rows, n_total)
+
+        # Indexen op een kopie bijwerken en samen met de arrays wisselen: lopende requests
+        # zien anders posities die nog niet in df staan. IVF en de inverted index wijzen
+        # nieuwe arrays toe (kopie van het object volstaat); de hnswlib-graaf wijzigt in place
+        ann_index = model_bundle.get("ann_index")
+        if ann_index is not None:
+            clone = copy.deepcopy if getattr(ann_index, "kind", None) == "hnsw" else copy.copy
+            updates["ann_index"] = clone(ann_index).upsert(positions, pca_rows)
+        if model_bundle.get("search_index") is not None:
+            updates["search_index"] = copy.copy(model_bundle["search_index"]).upsert(positions, tfidf_rows)
+
+        dirty = dict(model_bundle.get("dirty") or {"since": datetime.utcnow().isoformat(timespec="seconds"), "modules": 0})
+        dirty["modules"] += len(positions)
+        updates["dirty"] = dirty
+        updates["catalog_revision"] = model_bundle.get("catalog_revision", 0) + 1
+
+        # Het trainingsframe gaat naar een eigen artefact, niet terug op de residente bundle
+        updates["raw_df_path"] = save_raw_frame(model_bundle, new_raw, updates["catalog_revision"])
+        del raw, new_raw
+
+        model_bundle.pop("module_item_index", None)
+        model_bundle.pop("df_raw", None)
+        model_bundle.update(updates)
+
+    # Shards bevatten nog de oude rijen; opnieuw verdelen
+    if SERVING_SHARDS > 1 and recommender.get_sharded_scorer() is not None:
+        activate_sharding(model_bundle)
+
+    print(f"[UPSERT] {int(is_new.sum())} added, {int((~is_new).sum())} replaced (catalogue {n_total})")
+    return {
+        "added": processed["_id"][is_new].tolist(),
+        "replaced": processed["_id"][~is_new].tolist(),
+        "modules": n_total,
+        "dirty": dirty,
+    }
+
+
+def start_refit_thread(refit: Callable[[], Any], interval: int = MODEL_REFIT_INTERVAL) -> Optional[Event]:
+    """Run `refit` (a full training run) every `interval` seconds while the resident
+    model has upserted modules; returns an Event that stops the thread.
+    """
+    if interval <= 0:
+        return None
+    stop = Event()
+
+    def _loop():
+        while not stop.wait(interval):
+            try:
+                if load_model().get("dirty"):
+                    refit()
+            except RuntimeError:
+                # nog geen model getraind
+                pass
+            except Exception:
+                logger.exception("Scheduled refit failed")
+
+    Thread(target=_loop, name="model-refit", daemon=True).start()
+    return stop
@@ -0,0 +1,142 @@
+"""Online collaborative-filtering updates on the resident model.
+A favourite added or removed by a student updates the interaction matrix and
+refits only that user's ALS factors. Item factors of the touched modules are
+refit every CF_ITEM_REFRESH_EVERY updates; compaction folds everything into a
+new saved model version (see `compact_cf_updates`).
+
+Updates live in the memory of this process until they are compacted.
+"""
+from threading import Lock, Thread, Event
+from typing import Dict, Any, Iterable, Optional
+import logging
+import os
+import numpy as np
+from modelstore import save_model, load_model
+
+CF_ITEM_REFRESH_EVERY = int(os.getenv("CF_ITEM_REFRESH_EVERY", "50"))
+CF_COMPACT_INTERVAL = int(os.getenv("CF_COMPACT_INTERVAL", "3600"))
+
+logger = logging.getLogger(__name__)
+_update_lock = Lock()
+
+
+def _als_fitted(als_model) -> bool:
+    return als_model is not None and getattr(als_model, "user_factors", None) is not None
+
+
+def _ensure_item(model_bundle: Dict[str, Any], module_id: str) -> int:
+    item_map = model_bundle["item_map"]
+    if module_id not in item_map:
+        idx = len(item_map)
+        item_map[module_id] = idx
+        model_bundle["item_map_inv"][idx] = module_id
+        # module -> item positie moet opnieuw berekend worden
+        model_bundle.pop("module_item_index", None)
+    return item_map[module_id]
+
+
+def update_user_favourites(model_bundle: Dict[str, Any], user_id, add: Iterable = (), remove: Iterable = ()) -> Dict[str, Any]:
+    """Apply favourite changes for one user and refit that user's CF factors in place."""
+    # Ids uit de API zijn strings; de catalogus (en item_map) kan ints bevatten
+    catalogue = {str(m): m for m in model_bundle["df"]["_id"].tolist()}
+    unknown = [m for m in (add or []) if str(m) not in catalogue]
+    if unknown:
+        raise ValueError(f"Unknown module id(s): {unknown}")
+    add = [catalogue[str(m)] for m in (add or [])]
+    remove = [catalogue.get(str(m), m) for m in (remove or [])]
+
+    with _update_lock:
+        user_map = model_bundle["user_map"]
+        matrix = model_bundle["interaction_matrix"].tolil()
+        n_items_before = len(model_bundle["item_map"])
+
+        if user_id not in user_map:
+            user_map[user_id] = len(user_map)
+        uidx = user_map[user_id]
+        add_idx = [_ensure_item(model_bundle, m) for m in add]
+        remove_idx = [model_bundle["item_map"][m] for m in remove if m in model_bundle["item_map"]]
+
+        matrix.resize((len(model_bundle["item_map"]), len(user_map)))
+        for i in add_idx:
+            matrix[i, uidx] = 1.0
+        for i in remove_idx:
+            matrix[i, uidx] = 0.0
+        matrix = matrix.tocsr()
+        matrix.eliminate_zeros()
+        model_bundle["interaction_matrix"] = matrix
+
+        als_model = model_bundle.get("als_model")
+        if _als_fitted(als_model):
+            user_row = matrix[:, uidx].T.tocsr()
+            # Eerst de gebruiker op de bestaande items, dan nieuwe items, dan de gebruiker opnieuw
+            als_model.partial_fit_users([uidx], user_row[:, :n_items_before])
+            new_items = list(range(n_items_before, matrix.shape[0]))
+            if new_items:
+                als_model.partial_fit_items(new_items, matrix[new_items])
+                als_model.partial_fit_users([uidx], user_row)
+
+            dirty = model_bundle.setdefault("cf_dirty_items", set())
+            dirty.update(add_idx + remove_idx)
+
+        revisions = model_bundle.setdefault("cf_user_revision", {})
+        revisions[str(user_id)] = revisions.get(str(user_id), 0) + 1
+        model_bundle["cf_updates"] = model_bundle.get("cf_updates", 0) + 1
+        refresh = CF_ITEM_REFRESH_EVERY > 0 and model_bundle["cf_updates"] % CF_ITEM_REFRESH_EVERY == 0
+
+    if refresh:
+        refresh_item_factors(model_bundle)
+
+    return {
+        "user_id": user_id,
+        "favorites": [model_bundle["item_map_inv"][i] for i in matrix[:, uidx].nonzero()[0]],
+        "pending_item_updates": len(model_bundle.get("cf_dirty_items", ())),
+    }
+
+
+def refresh_item_factors(model_bundle: Dict[str, Any]) -> int:
+    """Refit the item factors of every module touched since the last refresh."""
+    with _update_lock:
+        dirty = sorted(model_bundle.get("cf_dirty_items", ()))
+        als_model = model_bundle.get("als_model")
+        if not dirty or not _als_fitted(als_model):
+            return 0
+        als_model.partial_fit_items(dirty, model_bundle["interaction_matrix"][dirty])
+        model_bundle["cf_dirty_items"] = set()
+        model_bundle["cf_item_revision"] = model_bundle.get("cf_item_revision", 0) + 1
+    print(f"[ONLINE_CF] Refreshed {len(dirty)} item factors")
+    return len(dirty)
+
+
+def compact_cf_updates(model_bundle: Optional[Dict[str, Any]] = None) -> Optional[str]:
+    """Fold pending online updates into a new saved model version.
+    Returns the new version, or None when there was nothing to compact.
+    """
+    model_bundle = model_bundle if model_bundle is not None else load_model()
+    if not model_bundle.get("cf_updates"):
+        return None
+    refresh_item_factors(model_bundle)
+    with _update_lock:
+        model_bundle["cf_updates"] = 0
+        save_model(model_bundle)
+    print(f"[ONLINE_CF] Compacted online updates into version {model_bundle['version']}")
+    return model_bundle["version"]
+
+
+def start_compaction_thread(interval: int = CF_COMPACT_INTERVAL) -> Optional[Event]:
+    """Compact on a fixed interval in a daemon thread; returns an Event that stops it."""
+    if interval <= 0:
+        return None
+    stop = Event()
+
+    def _loop():
+        while not stop.wait(interval):
+            try:
+                compact_cf_updates()
+            except RuntimeError:
+                # nog geen model getraind
+                pass
+            except Exception:
+                logger.exception("Compacting online CF updates failed")
+
+    Thread(target=_loop, name="cf-compaction", daemon=True).start()
+    return stop
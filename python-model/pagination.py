@@ -0,0 +1,99 @@
+"""Cursor pagination for "show more recommendations".
+
+The first request ranks RANKING_DEPTH candidates once and keeps that order as compact
+arrays (module positions, the four scaled signals and the final score, float32) in a
+bounded TTL cache, tied to the model version and catalogue revision. The opaque
+cursor names that entry plus an offset; later pages are slices of the arrays, with
+no rescoring and no sorting.
+"""
+from typing import Any, Dict, Optional, Tuple
+import base64
+import os
+import secrets
+import numpy as np
+import pandas as pd
+from cache import TTLCache
+from recommender import recommend_from_model, bundle_token, _rec_frame
+
+RANKING_DEPTH = int(os.getenv("RANKING_DEPTH", "500"))
+
+_rankings = TTLCache(
+    maxsize=int(os.getenv("RANKING_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("RANKING_CACHE_TTL", "120")),
+)
+
+_SIGNAL_COLUMNS = ["content_sim_scaled", "profile_sim_scaled", "popularity_norm", "cf_score_scaled", "final_score"]
+
+
+def _model_key(model_bundle: Dict[str, Any]) -> tuple:
+    return bundle_token(model_bundle), model_bundle.get("catalog_revision", 0)
+
+
+def encode_cursor(token: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(f"{token}:{offset}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        token, offset = raw.rsplit(":", 1)
+        offset = int(offset)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Malformed cursor")
+    if offset < 0:
+        raise ValueError("Malformed cursor")
+    return token, offset
+
+
+def _page(model_bundle: Dict[str, Any], token: str, entry: Dict[str, Any], offset: int, page_size: int):
+    end = min(offset + page_size, len(entry["positions"]))
+    sel = entry["positions"][offset:end]
+    rec_df = _rec_frame(
+        model_bundle["df"], sel, *(entry[c][offset:end] for c in _SIGNAL_COLUMNS), entry["weights"],
+    )
+    next_cursor = encode_cursor(token, end) if end < len(entry["positions"]) else None
+    return rec_df, next_cursor
+
+
+def rank(model_bundle: Dict[str, Any], user_row: Dict[str, Any], page_size: int,
+         filters: Optional[Dict[str, Any]] = None, **weights) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """(fav_table, ranking) of RANKING_DEPTH candidates (at least page_size): the scoring
+    work of a first page. Only the first page sizes the ANN fallback, the int8 rerank
+    and the debug output.
+    """
+    depth = max(page_size, RANKING_DEPTH)
+    return recommend_from_model(
+        model_bundle, user_row, top_n=depth, filters=filters, head_n=page_size, **weights,
+    )
+
+
+def first_page(model_bundle: Dict[str, Any], user_row: Dict[str, Any], page_size: int,
+               filters: Optional[Dict[str, Any]] = None, **weights) -> Tuple[pd.DataFrame, pd.DataFrame, Optional[str]]:
+    """(fav_table, first page, next cursor); see `rank`."""
+    fav_table, ranked = rank(model_bundle, user_row, page_size, filters=filters, **weights)
+    if len(ranked) <= page_size:
+        return fav_table, ranked, None
+
+    entry = {
+        "model": _model_key(model_bundle),
+        "positions": ranked.index.to_numpy(dtype=np.int32),
+        "weights": ranked.attrs.get("weights_used", {}),
+        **{c: ranked[c].to_numpy(dtype=np.float32) for c in _SIGNAL_COLUMNS},
+    }
+    token = secrets.token_urlsafe(12)
+    _rankings.put(token, entry)
+    rec_df, next_cursor = _page(model_bundle, token, entry, 0, page_size)
+    return fav_table, rec_df, next_cursor
+
+
+def next_page(model_bundle: Dict[str, Any], cursor: str, page_size: int) -> Tuple[pd.DataFrame, Optional[str]]:
+    """The page after `cursor`. RuntimeError if the ranking expired or the model changed."""
+    token, offset = decode_cursor(cursor)
+    entry = _rankings.get(token)
+    if entry is None or entry["model"] != _model_key(model_bundle):
+        raise RuntimeError("Cursor expired; request the first page again")
+    return _page(model_bundle, token, entry, offset, page_size)
+
+
+def ranking_cache_stats() -> Dict[str, Any]:
+    return _rankings.stats()
@@ -0,0 +1,143 @@
+"""Offline top-N export for all known users (`users_demo` in the bundle).
+Runs after save_model (train pipeline, or by hand) and writes one Parquet file per
+model version; /recommend/precomputed/{user_id} serves it with a dict lookup.
+
+    python precompute.py --top-n 20 --processes 4
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import Dict, Any, List, Optional
+import argparse
+import hashlib
+import json
+import os
+import joblib
+import pyarrow as pa
+import pyarrow.parquet as pq
+import recommender
+from modelstore import MODELS_DIR, version_path, load_model
+from resources import init_batch_worker, worker_context, TRAIN_THREADS
+from serialization import _id_array
+
+PRECOMPUTE_TOP_N = int(os.getenv("PRECOMPUTE_TOP_N", "20"))
+PRECOMPUTE_PROCESSES = int(os.getenv("PRECOMPUTE_PROCESSES", "0")) or TRAIN_THREADS
+PRECOMPUTE_CHUNK = 64
+# Opgezochte versies in het geheugen (LRU): multi-tenant en rollbacks wisselen tussen versies
+PRECOMPUTE_CACHE_VERSIONS = int(os.getenv("PRECOMPUTE_CACHE_VERSIONS", "4"))
+
+_worker_model = None
+_worker_top_n = PRECOMPUTE_TOP_N
+_lookup_cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_lookup_lock = Lock()
+
+
+def user_signature(user: Dict[str, Any]) -> str:
+    """Hash of the inputs that drive a user's ranking (favourites + profile text)."""
+    favs = sorted(str(f) for f in (user.get("favorite_id") or []))
+    raw = json.dumps([favs, (user.get("profile_text") or "").strip()])
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def precomputed_path(version: str):
+    return MODELS_DIR / f"precomputed_{version}.parquet"
+
+
+def _init_worker(model_path: str, top_n: int):
+    global _worker_model, _worker_top_n
+    init_batch_worker()
+    _worker_model = joblib.load(model_path)
+    _worker_top_n = top_n
+    recommender.DEBUG_SCORES = False
+
+
+def _score_chunk(users: List[Dict[str, Any]]) -> List[tuple]:
+    rows = []
+    for user in users:
+        user = {
+            "user_id": user.get("user_id"),
+            "favorite_id": list(user.get("favorite_id") or []),
+            "profile_text": user.get("profile_text") or "",
+        }
+        _, rec_df = recommender.recommend_from_model(_worker_model, user, top_n=_worker_top_n)
+        if not len(rec_df):
+            continue
+        signature = user_signature(user)
+        for rank, (mid, score) in enumerate(zip(rec_df["_id"].tolist(), rec_df["final_score"].tolist())):
+            rows.append((str(user["user_id"]), signature, rank, mid, float(score)))
+    return rows
+
+
+def export_precomputed(model_bundle: Dict[str, Any], top_n: int = PRECOMPUTE_TOP_N, processes: Optional[int] = PRECOMPUTE_PROCESSES):
+    """Score every known user across a process pool and write the Parquet file.
+    `model_bundle` must already be saved (workers load it from its versioned file).
+    """
+    version = model_bundle.get("version")
+    if version is None:
+        raise RuntimeError("Save the model before precomputing recommendations")
+
+    users = model_bundle.get("users_demo")
+    records = users.to_dict(orient="records") if users is not None and len(users) else []
+    chunks = [records[i:i + PRECOMPUTE_CHUNK] for i in range(0, len(records), PRECOMPUTE_CHUNK)]
+
+    rows = []
+    initargs = (str(version_path(version, model_bundle.get("tenant"))), top_n)
+    with ProcessPoolExecutor(
+        max_workers=processes, mp_context=worker_context(), initializer=_init_worker, initargs=initargs,
+    ) as pool:
+        for chunk_rows in pool.map(_score_chunk, chunks):
+            rows.extend(chunk_rows)
+
+    # Module-ids houden hun type (int-catalogus blijft int64), net als /recommend
+    user_ids, signatures, ranks, ids, scores = (list(c) for c in zip(*rows)) if rows else ([], [], [], [], [])
+    table = pa.table({
+        "user_id": pa.array(user_ids, pa.string()),
+        "signature": pa.array(signatures, pa.string()),
+        "rank": pa.array(ranks, pa.int64()),
+        "_id": _id_array(ids),
+        "score": pa.array(scores, pa.float64()),
+    })
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), b"model_version": version.encode()})
+    path = precomputed_path(version)
+    pq.write_table(table, path)
+    with _lookup_lock:
+        _lookup_cache.pop(version, None)
+    print(f"[PRECOMPUTE] {len(records)} users, {len(rows)} rows -> {path}")
+    return path
+
+
+def load_precomputed(version: str) -> Dict[str, Any]:
+    """{user_id: {"signature", "recommendations"}} for a model version; built once per
+    version and kept for the PRECOMPUTE_CACHE_VERSIONS most recently used versions.
+    """
+    with _lookup_lock:
+        if version in _lookup_cache:
+            _lookup_cache.move_to_end(version)
+            return _lookup_cache[version]
+
+        path = precomputed_path(version)
+        # Export loopt nog (of staat uit): niet cachen, anders blijft de lege lookup hangen
+        if not path.exists():
+            return {}
+        lookup = {}
+        frame = pq.read_table(path).to_pandas().sort_values(["user_id", "rank"])
+        for user_id, group in frame.groupby("user_id", sort=False):
+            lookup[user_id] = {
+                "signature": group["signature"].iloc[0],
+                "recommendations": [
+                    {"_id": mid, "score": score}
+                    for mid, score in zip(group["_id"].tolist(), group["score"].tolist())
+                ],
+            }
+        _lookup_cache[version] = lookup
+        while len(_lookup_cache) > PRECOMPUTE_CACHE_VERSIONS:
+            _lookup_cache.popitem(last=False)
+        return lookup
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute top-N recommendations for all known users")
+    parser.add_argument("--top-n", type=int, default=PRECOMPUTE_TOP_N)
+    parser.add_argument("--processes", type=int, default=PRECOMPUTE_PROCESSES)
+    args = parser.parse_args()
+    export_precomputed(load_model(), top_n=args.top_n, processes=args.processes)
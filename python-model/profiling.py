@@ -0,0 +1,276 @@
+"""On-demand profiling for the admin endpoints (api/admin.py). Standard library only.
+
+A profiling session is armed for one target (an endpoint wrapped with `@profiled`,
+or the training run) and captures the next N calls, either with cProfile
+(pstats output) or with a sampling profiler that records the stack of the
+calling thread every PROFILE_SAMPLE_INTERVAL_MS (collapsed-stack output, for
+flamegraph.pl / speedscope).
+"""
+from collections import Counter
+from functools import wraps
+from threading import Lock, Thread, Event, get_ident
+from typing import Any, Dict, Optional
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+from scipy.sparse import issparse
+
+PROFILE_SAMPLE_INTERVAL_MS = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1"))
+PROFILE_MODES = ("cprofile", "sampling")
+
+_lock = Lock()
+_session: Optional[Dict[str, Any]] = None
+
+
+def start_session(target: str, requests: int = 10, mode: str = "cprofile") -> Dict[str, Any]:
+    global _session
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"mode must be one of {PROFILE_MODES}")
+    if requests < 1:
+        raise ValueError("requests must be at least 1")
+    with _lock:
+        if _session is not None and _session["captured"] < _session["requests"]:
+            raise RuntimeError(f"A profiling session for '{_session['target']}' is still running")
+        _session = {
+            "target": target, "mode": mode, "requests": requests, "captured": 0, "active": 0,
+            "stats": None, "stacks": Counter(), "seconds": 0.0,
+        }
+    return session_status()
+
+
+def cancel_session():
+    global _session
+    with _lock:
+        _session = None
+
+
+def session_status() -> Optional[Dict[str, Any]]:
+    with _lock:
+        if _session is None:
+            return None
+        return {k: _session[k] for k in ("target", "mode", "requests", "captured", "seconds")} | {
+            "finished": _session["captured"] >= _session["requests"] and not _session["active"],
+        }
+
+
+def _claim(target: str) -> Optional[Dict[str, Any]]:
+    with _lock:
+        s = _session
+        if s is None or s["target"] != target or s["captured"] + s["active"] >= s["requests"]:
+            return None
+        s["active"] += 1
+        return s
+
+
+def _release(session: Dict[str, Any], seconds: float, stats=None, stacks=None):
+    with _lock:
+        if stats is not None:
+            if session["stats"] is None:
+                session["stats"] = pstats.Stats(stats)
+            else:
+                session["stats"].add(stats)
+        if stacks:
+            session["stacks"].update(stacks)
+        session["seconds"] += seconds
+        session["active"] -= 1
+        session["captured"] += 1
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})"
+
+
+def _sample_thread(thread_id: int, stop: Event, stacks: Counter):
+    interval = PROFILE_SAMPLE_INTERVAL_MS / 1000
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        names = []
+        while frame is not None:
+            names.append(_frame_name(frame))
+            frame = frame.f_back
+        if names:
+            stacks[";".join(reversed(names))] += 1
+
+
+class _CapturedStats:
+    """pstats input for cProfile stats captured in another thread or process."""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+
+def capture(mode: str, fn, *args, **kwargs):
+    """Call fn in this thread under `mode`; returns (result, capture). The capture is
+    plain data (pstats dict or stack Counter), so it survives a return from a
+    training thread or process.
+    """
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        result = profiler.runcall(fn, *args, **kwargs)
+        profiler.create_stats()
+        return result, profiler.stats
+
+    stacks, stop = Counter(), Event()
+    sampler = Thread(target=_sample_thread, args=(get_ident(), stop, stacks), daemon=True)
+    sampler.start()
+    try:
+        result = fn(*args, **kwargs)
+    finally:
+        stop.set()
+        sampler.join()
+    return result, stacks
+
+
+def _call_here(fn, *args, **kwargs):
+    return fn(*args, **kwargs)
+
+
+def run_profiled_in(target: str, runner, fn, *args, **kwargs):
+    """`runner(fn, *args, **kwargs)`, profiled when a session for `target` still needs
+    samples. The runner may call fn on another thread or in another process
+    (resources.run_training): the profile is taken where fn runs, not around the wait.
+    """
+    session = _claim(target)
+    if session is None:
+        return runner(fn, *args, **kwargs)
+
+    start = time.perf_counter()
+    captured = None
+    try:
+        result, captured = runner(capture, session["mode"], fn, *args, **kwargs)
+        return result
+    finally:
+        seconds = time.perf_counter() - start
+        if session["mode"] == "cprofile":
+            _release(session, seconds, stats=_CapturedStats(captured) if captured is not None else None)
+        else:
+            _release(session, seconds, stacks=captured)
+
+
+def run_profiled(target: str, fn, *args, **kwargs):
+    """Call fn, profiling it when a session for `target` still needs samples."""
+    return run_profiled_in(target, _call_here, fn, *args, **kwargs)
+
+
+def profiled(target: str):
+    """Decorator for sync endpoints/tasks; runs in the calling thread, so it also
+    covers FastAPI's threadpool. The wrapped signature is kept for FastAPI.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            return run_profiled(target, fn, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def session_result(fmt: str = "text", limit: int = 60, sort: str = "cumulative"):
+    """(body, media_type) for the current session: pstats text, a marshalled
+    pstats dump (load with pstats.Stats(path)), or collapsed stacks.
+    """
+    with _lock:
+        if _session is None:
+            raise RuntimeError("No profiling session")
+        mode, stats, stacks = _session["mode"], _session["stats"], Counter(_session["stacks"])
+
+    if mode == "sampling":
+        if fmt not in ("text", "collapsed"):
+            raise ValueError("Sampling sessions only return collapsed stacks")
+        lines = [f"{stack} {count}" for stack, count in stacks.most_common()]
+        return "\n".join(lines) + "\n", "text/plain"
+
+    if stats is None:
+        raise RuntimeError("Nothing captured yet")
+    if fmt == "pstats":
+        return marshal.dumps(stats.stats), "application/octet-stream"
+    if fmt != "text":
+        raise ValueError("cProfile sessions return 'text' or 'pstats'")
+    out = io.StringIO()
+    view = pstats.Stats(stream=out)
+    view.add(stats)
+    view.sort_stats(sort).print_stats(limit)
+    return out.getvalue(), "text/plain"
+
+
+# --- Geheugen ---
+
+def tracemalloc_start(frames: int = 10):
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def tracemalloc_stop():
+    tracemalloc.stop()
+
+
+def tracemalloc_top(limit: int = 20, group_by: str = "lineno") -> Dict[str, Any]:
+    """Top allocations of a snapshot taken now (tracing must have been started)."""
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not tracing; start it first")
+    if group_by not in ("lineno", "filename", "traceback"):
+        raise ValueError("group_by must be 'lineno', 'filename' or 'traceback'")
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    top = snapshot.statistics(group_by)[:limit]
+    return {
+        "traced_current_bytes": current,
+        "traced_peak_bytes": peak,
+        "top": [
+            {"size_bytes": stat.size, "count": stat.count, "trace": [str(frame) for frame in stat.traceback]}
+            for stat in top
+        ],
+    }
+
+
+def _object_size(value, seen: Optional[set] = None) -> int:
+    """Approximate in-memory size without serialising anything: array buffers, pandas'
+    deep memory usage, and containers / object attributes walked recursively.
+    Objects reachable twice (same `seen` set) count once.
+    """
+    seen = set() if seen is None else seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if issparse(value):
+        return int(sum(getattr(value, a).nbytes for a in ("data", "indices", "indptr", "row", "col") if hasattr(value, a)))
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True, index=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True, index=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(_object_size(k, seen) + _object_size(v, seen) for k, v in value.items())
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(_object_size(v, seen) for v in value)
+    if hasattr(value, "get_max_elements") and hasattr(value, "dim"):
+        # hnswlib-graaf: vectoren plus ongeveer 2*M buren per element op laag 0
+        m = getattr(value, "M", 16)
+        return int(value.get_max_elements() * (value.dim * 4 + 2 * m * 4 + 16))
+    attrs = getattr(value, "__dict__", None)
+    if attrs is None or isinstance(value, type) or callable(value):
+        return sys.getsizeof(value)
+    # sklearn/implicit-objecten: de arrays zitten in hun attributen
+    return sys.getsizeof(value) + _object_size(attrs, seen)
+
+
+def bundle_sizes(model_bundle: Dict[str, Any]) -> Dict[str, Any]:
+    """Approximate in-memory size per key of a model bundle, largest first."""
+    seen: set = set()
+    sizes = {key: _object_size(value, seen) for key, value in model_bundle.items()}
+    ordered = dict(sorted(sizes.items(), key=lambda kv: kv[1], reverse=True))
+    return {"version": model_bundle.get("version"), "total_bytes": sum(sizes.values()), "keys": ordered}
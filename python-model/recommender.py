@@ -1,14 +1,19 @@
 """Lightweight recommender helpers used by FastAPI endpoints.
 These helpers are import-safe: they do not run heavy training on import.
 """
-from typing import Optional, Dict, Any, Tuple
+from typing import Optional, Dict, Any, List, Tuple
+from functools import lru_cache
 import os
+import sys
+import json
+import time
 import requests
 import pandas as pd
 import numpy as np
 import re
 import ast
 import random
+import uuid
 from spacy.util import is_package
 from spacy.cli import download
 import spacy
@@ -21,8 +26,18 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from implicit.als import AlternatingLeastSquares
 from scipy.sparse import csr_matrix
+from retrieval import build_retrieval_index, retrieve_candidates, ANN_CANDIDATES
+from search_index import build_search_index
+from filters import build_attribute_index, filter_mask
+from cache import TTLCache
+from resources import training_threads
+
+DEBUG_SCORES = os.getenv("RECOMMENDER_DEBUG", "1") == "1"
 
 STOPWORDS = NL_STOP.union(EN_STOP)
+NL_ONLY_STOP = NL_STOP - EN_STOP
+EN_ONLY_STOP = EN_STOP - NL_STOP
+LANGUAGE_ROUTING = os.getenv("LANGUAGE_ROUTING", "detect")
 stemmer_nl = SnowballStemmer("dutch")
 stemmer_en = SnowballStemmer("english")
 
@@ -44,85 +59,161 @@ def _get_spacy_models():
     return _nlp_nl, _nlp_en
 
 
-def parse_tags(val):
-    if isinstance(val, list):
-        return [str(x).strip() for x in val if str(x).strip()]
-    if pd.isna(val):
-        return []
-    s = str(val).strip()
+# Woordenschat in de VKM-catalogus is erg repetitief: stammen en tag-strings
+# worden één keer berekend en daarna uit een begrensde cache gehaald.
+NLP_MEMO_SIZE = int(os.getenv("NLP_MEMO_SIZE", "100000"))
+_STEMMERS = {"nl": stemmer_nl, "en": stemmer_en}
+
+
+@lru_cache(maxsize=NLP_MEMO_SIZE)
+def stem(word: str, language: str) -> str:
+    return _STEMMERS[language].stem(word)
+
+
+@lru_cache(maxsize=NLP_MEMO_SIZE)
+def _parse_tag_string(s: str) -> tuple:
     if not s:
-        return []
+        return ()
     try:
         parsed = ast.literal_eval(s)
         if isinstance(parsed, (list, tuple)):
-            return [str(x).strip() for x in parsed if str(x).strip()]
+            return tuple(str(x).strip() for x in parsed if str(x).strip())
     except Exception:
         pass
     if "," in s:
-        return [p.strip() for p in s.split(",") if p.strip()]
+        return tuple(p.strip() for p in s.split(",") if p.strip())
     if ";" in s:
-        return [p.strip() for p in s.split(";") if p.strip()]
-    return [s]
+        return tuple(p.strip() for p in s.split(";") if p.strip())
+    return (s,)
+
+
+@lru_cache(maxsize=NLP_MEMO_SIZE)
+def _normalize_tag(tag: str) -> Optional[str]:
+    t = tag.lower().strip()
+    if not t or t in STOPWORDS:
+        return None
+    return stem(t, "en" if t.isascii() else "nl")
+
+
+def memo_stats() -> Dict[str, Dict[str, Any]]:
+    """Hit-rate statistics of the stemming / tag memoization caches."""
+    stats = {}
+    for name, fn in (("stem", stem), ("tag_strings", _parse_tag_string), ("tags", _normalize_tag)):
+        info = fn.cache_info()
+        total = info.hits + info.misses
+        stats[name] = {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "maxsize": info.maxsize,
+            "hit_rate": info.hits / total if total else 0.0,
+        }
+    return stats
+
+
+def clear_memo():
+    for fn in (stem, _parse_tag_string, _normalize_tag):
+        fn.cache_clear()
+
+
+def parse_tags(val):
+    if isinstance(val, list):
+        return [str(x).strip() for x in val if str(x).strip()]
+    if pd.isna(val):
+        return []
+    return list(_parse_tag_string(str(val).strip()))
+
+
+def parse_tags_column(values: pd.Series) -> pd.Series:
+    """parse_tags over a whole column; every distinct tag string is parsed once."""
+    is_str = values.map(lambda v: isinstance(v, str)).to_numpy(dtype=bool)
+    result = np.empty(len(values), dtype=object)
+    if is_str.any():
+        codes, uniques = pd.factorize(values[is_str].astype(object).str.strip())
+        parsed = [_parse_tag_string(u) for u in uniques]
+        for pos, code in zip(np.flatnonzero(is_str), codes):
+            result[pos] = list(parsed[code])
+    for pos in np.flatnonzero(~is_str):
+        result[pos] = parse_tags(values.iat[pos])
+    return pd.Series(result, index=values.index, dtype=object)
 
 
 def preprocess_tags(tags):
-    processed = []
-    for t in tags:
-        t = t.lower().strip()
-        if t and t not in STOPWORDS:
-            if t.isascii():
-                processed.append(stemmer_en.stem(t))
-            else:
-                processed.append(stemmer_nl.stem(t))
-    return processed
-
-
-def preprocess_text(text, nlp_nl, nlp_en):
+    return [n for n in map(_normalize_tag, tags) if n is not None]
+
+
+def preprocess_tags_column(tag_lists) -> list:
+    """preprocess_tags over all rows; every distinct tag is normalised and stemmed once."""
+    normalized = {t: _normalize_tag(t) for t in {t for tags in tag_lists for t in tags}}
+    return [[normalized[t] for t in tags if normalized[t] is not None] for tags in tag_lists]
+
+
+def detect_language(tokens) -> str:
+    """Cheap language guess from stopwords that occur in only one of the two lists.
+    Ties (including no stopwords at all) go to Dutch, the catalogue's main language.
+    """
+    nl_hits = sum(1 for t in tokens if t in NL_ONLY_STOP)
+    en_hits = sum(1 for t in tokens if t in EN_ONLY_STOP)
+    return "en" if en_hits > nl_hits else "nl"
+
+
+def _stemmed_lemmas(nlp, language, text):
+    return [
+        stem(token.lemma_, language)
+        for token in nlp(text)
+        if token.lemma_ and token.lemma_ not in STOPWORDS
+    ]
+
+
+def preprocess_text(text, nlp_nl, nlp_en, routing: Optional[str] = None):
+    """Lowercase, lemmatise, drop stopwords and stem.
+    routing="detect" (default, LANGUAGE_ROUTING) runs only the pipeline of the detected
+    language; "fallback" runs Dutch first and redoes the text in English when fewer
+    than half of the tokens survive.
+    """
     text = str(text).lower()
     text = re.sub(r"[^a-zA-Z0-9\s]", " ", text)
     tokens = text.split()
+    joined = " ".join(tokens)
 
-    doc_nl = nlp_nl(" ".join(tokens))
-    tokens_nl = [
-        stemmer_nl.stem(token.lemma_)
-        for token in doc_nl
-        if token.lemma_ and token.lemma_ not in STOPWORDS
-    ]
+    if (routing or LANGUAGE_ROUTING) == "detect":
+        if detect_language(tokens) == "en":
+            return " ".join(_stemmed_lemmas(nlp_en, "en", joined))
+        return " ".join(_stemmed_lemmas(nlp_nl, "nl", joined))
 
+    tokens_nl = _stemmed_lemmas(nlp_nl, "nl", joined)
     if len(tokens_nl) < max(1, len(tokens)//2):
-        doc_en = nlp_en(" ".join(tokens))
-        tokens_en = [
-            stemmer_en.stem(token.lemma_)
-            for token in doc_en
-            if token.lemma_ and token.lemma_ not in STOPWORDS
-        ]
-        return " ".join(tokens_en)
+        return " ".join(_stemmed_lemmas(nlp_en, "en", joined))
     return " ".join(tokens_nl)
 
 
 from security.http import AuthenticatedSession
 
+def fetch_remote_users(session: Optional[AuthenticatedSession] = None) -> pd.DataFrame:
+    users_url = os.getenv("USERS_API_URL")
+    if not users_url:
+        return pd.DataFrame()
+    try:
+        r = (session or AuthenticatedSession()).get(users_url, timeout=15)
+        r.raise_for_status()
+        return pd.DataFrame(r.json())
+    except Exception:
+        return pd.DataFrame()
+
+
 def fetch_remote_modules_users() -> Tuple[pd.DataFrame, pd.DataFrame]:
     modules_url = os.getenv("MODULES_API_URL")
-    users_url = os.getenv("USERS_API_URL")
 
     session = AuthenticatedSession()
 
     modules = None
-    users = pd.DataFrame()
 
     if modules_url:
         r = session.get(modules_url, timeout=15)
         r.raise_for_status()
         modules = pd.DataFrame(r.json()["vkms"])
 
-    if users_url:
-        try:
-            r = session.get(users_url, timeout=15)
-            r.raise_for_status()
-            users = pd.DataFrame(r.json())
-        except Exception:
-            users = pd.DataFrame()
+    users = fetch_remote_users(session)
 
     if modules is None:
         local = os.path.join(
@@ -135,98 +226,144 @@ def fetch_remote_modules_users() -> Tuple[pd.DataFrame, pd.DataFrame]:
 
     return modules, users
 
-def build_explanation(row, weights):
-    reasons = []
-    signals = {}
-
-    # --- Content similarity (favorites) ---
-    if row.content_sim_scaled == 0.0:
-        content_text = "Je hebt (nog) geen of te weinig favorieten opgegeven om een sterke inhoudelijke vergelijking te maken."
-    elif row.content_sim_scaled >= 0.7:
-        content_text = "Deze module lijkt sterk op jouw favoriete modules."
-        signals["content_match"] = row.content_sim_scaled
-    elif row.content_sim_scaled >= 0.4:
-        content_text = "Deze module vertoont duidelijke overeenkomsten met jouw favoriete modules."
-        signals["content_match"] = row.content_sim_scaled
-    elif row.content_sim_scaled >= 0.01:
-        content_text = "Deze module heeft enkele inhoudelijke overeenkomsten met jouw favoriete modules."
-        signals["content_match"] = row.content_sim_scaled
-    else:
-        content_text = "Op basis van je favorieten is er weinig inhoudelijke overeenkomst."
-
-    if row.content_sim_scaled > 0:
-        reasons.append(content_text)
-
-    # --- Profile similarity ---
-    if row.profile_sim_scaled == 0.0:
-        profile_text = "Je profiel bevat weinig of geen interesses, waardoor de profielmatch beperkt is."
-    elif row.profile_sim_scaled >= 0.65:
-        profile_text = "Deze module sluit zeer goed aan bij de interesses die je in je profiel hebt opgegeven."
-        signals["profile_match"] = row.profile_sim_scaled
-    elif row.profile_sim_scaled >= 0.40:
-        profile_text = "Deze module sluit redelijk aan bij je profielinteresses."
-        signals["profile_match"] = row.profile_sim_scaled
-    elif row.profile_sim_scaled >= 0.01:
-        profile_text = "Deze module sluit beperkt aan bij je profielinteresses."
-        signals["profile_match"] = row.profile_sim_scaled
-
-    if row.profile_sim_scaled > 0:
-        reasons.append(profile_text)
-
-    # --- Popularity ---
-    if row.popularity_norm > 0.6:
-        pop_text = "Deze module wordt vaak gekozen door andere gebruikers."
-        signals["popularity"] = row.popularity_norm
-    elif row.popularity_norm > 0.3:
-        pop_text = "Deze module heeft een gemiddelde populariteit onder gebruikers."
-    else:
-        pop_text = "Deze module wordt minder vaak gekozen, maar kan inhoudelijk alsnog goed passen."
-
-    reasons.append(pop_text)
-
-    # # --- Collaborative filtering ---
-    # if row.cf_score_scaled > 0.7:
-    #     cf_text = "Gebruikers met vergelijkbare interesses waarderen deze module sterk."
-    #     signals["collaborative"] = row.cf_score_scaled
-    #     reasons.append(cf_text)
-    # elif row.cf_score_scaled > 0.4:
-    #     cf_text = "Gebruikers met vergelijkbare interesses vinden deze module doorgaans interessant."
-    #     signals["collaborative"] = row.cf_score_scaled
-    #     reasons.append(cf_text)
-    # elif row.cf_score_scaled > 0.01:
-    #     cf_text = "Gebruikers met vergelijkbare interesses kiezen deze module af en toe."
-    #     reasons.append(cf_text)
-    # elif row.cf_score_scaled == 0.0:
-    #     cf_text = "Er is onvoldoende gebruikersdata om een collaboratieve aanbeveling te maken."
-    #     reasons.append(cf_text)
-
-    # --- Fallback ---
-    if not reasons:
-        reasons.append("Deze aanbeveling is gebaseerd op een combinatie van algemene inhoudelijke kenmerken.")
+# Uitleg-zinnen worden één keer opgebouwd en ge-intern'd; per request kiezen we
+# alleen nog een index per score-kolom (np.select) in plaats van if/elif per rij.
+_CONTENT_TEMPLATES = np.array([sys.intern(t) for t in (
+    "",
+    "Deze module lijkt sterk op jouw favoriete modules. • ",
+    "Deze module vertoont duidelijke overeenkomsten met jouw favoriete modules. • ",
+    "Deze module heeft enkele inhoudelijke overeenkomsten met jouw favoriete modules. • ",
+    "Op basis van je favorieten is er weinig inhoudelijke overeenkomst. • ",
+)], dtype=object)
+
+_PROFILE_TEMPLATES = np.array([sys.intern(t) for t in (
+    "",
+    "Deze module sluit zeer goed aan bij de interesses die je in je profiel hebt opgegeven. • ",
+    "Deze module sluit redelijk aan bij je profielinteresses. • ",
+    "Deze module sluit beperkt aan bij je profielinteresses. • ",
+)], dtype=object)
+
+_POPULARITY_TEMPLATES = np.array([sys.intern(t) for t in (
+    "Deze module wordt minder vaak gekozen, maar kan inhoudelijk alsnog goed passen.",
+    "Deze module wordt vaak gekozen door andere gebruikers.",
+    "Deze module heeft een gemiddelde populariteit onder gebruikers.",
+)], dtype=object)
+
+
+def build_explanations(rec_df: pd.DataFrame, weights: Dict[str, float]) -> list:
+    """Explanation dicts for every row of `rec_df`, bucketed column-wise with np.select."""
+    if rec_df is None or len(rec_df) == 0:
+        return []
 
-    return {
-        "summary": " • ".join(reasons),
-        "signals": signals,
-        "weights_used": weights,
-        "final_score": float(row.final_score),
-        "score_breakdown": {
-            "content_similarity": float(row.content_sim_scaled),
-            "profile_similarity": float(row.profile_sim_scaled),
-            "popularity": float(row.popularity_norm),
-            "collaborative": float(row.cf_score_scaled),
-        }
-    }
+    content = rec_df["content_sim_scaled"].to_numpy(dtype=float)
+    profile = rec_df["profile_sim_scaled"].to_numpy(dtype=float)
+    popularity = rec_df["popularity_norm"].to_numpy(dtype=float)
+    cf = rec_df["cf_score_scaled"].to_numpy(dtype=float)
+    final = rec_df["final_score"].to_numpy(dtype=float)
+
+    # Bucket 4: 0 < content < 0.01 krijgt wel een zin, maar telt niet als content_match
+    content_bucket = np.select([content >= 0.7, content >= 0.4, content >= 0.01, content > 0], [1, 2, 3, 4], default=0)
+    profile_bucket = np.select([profile >= 0.65, profile >= 0.40, profile >= 0.01], [1, 2, 3], default=0)
+    pop_bucket = np.select([popularity > 0.6, popularity > 0.3], [1, 2], default=0)
+
+    # De populariteitszin staat altijd achteraan, dus de samenvatting is nooit leeg
+    summaries = (
+        _CONTENT_TEMPLATES[content_bucket]
+        + _PROFILE_TEMPLATES[profile_bucket]
+        + _POPULARITY_TEMPLATES[pop_bucket]
+    )
 
+    explanations = []
+    for i in range(len(final)):
+        signals = {}
+        if 0 < content_bucket[i] < 4:
+            signals["content_match"] = float(content[i])
+        if profile_bucket[i]:
+            signals["profile_match"] = float(profile[i])
+        if pop_bucket[i] == 1:
+            signals["popularity"] = float(popularity[i])
+
+        explanations.append({
+            "summary": summaries[i],
+            "signals": signals,
+            "weights_used": weights,
+            "final_score": float(final[i]),
+            "score_breakdown": {
+                "content_similarity": float(content[i]),
+                "profile_similarity": float(profile[i]),
+                "popularity": float(popularity[i]),
+                "collaborative": float(cf[i]),
+            }
+        })
+    return explanations
 
 
-def build_model_from_dataframe(
-    df: pd.DataFrame,
-    users_demo: Optional[pd.DataFrame] = None,
-    num_dummy_users: int = 50,
-    tfidf_max_features: int = 5000,
-    pca_components: int = 50,
-    als_params: Optional[Dict[str, Any]] = None,
-) -> Dict[str, Any]:
+def _projection_2d(module_vectors_pca: np.ndarray) -> np.ndarray:
+    """The first two PCA axes are already the 2D PCA layout, so no refit is needed."""
+    layout = np.zeros((module_vectors_pca.shape[0], 2))
+    n = min(2, module_vectors_pca.shape[1])
+    layout[:, :n] = module_vectors_pca[:, :n]
+    return layout
+
+
+def _inv_norms(vectors: np.ndarray) -> np.ndarray:
+    """1 / L2 norm per row (0 for zero rows), so cosine scores are a single mat-vec product."""
+    norms = np.linalg.norm(vectors, axis=1)
+    return np.divide(1.0, norms, out=np.zeros_like(norms), where=norms > 0)
+
+
+def quantize_int8(unit_vectors: np.ndarray):
+    """Symmetric per-dimension int8 quantization of L2-normalised vectors."""
+    scale = np.abs(unit_vectors).max(axis=0) / 127.0
+    scale[scale == 0] = 1.0
+    quantized = np.round(unit_vectors / scale).astype(np.int8)
+    return quantized, scale.astype(unit_vectors.dtype)
+
+
+def _int8_dot(quantized: np.ndarray, vec: np.ndarray, block: int = 65536) -> np.ndarray:
+    """`quantized @ vec`, dequantizing one block at a time to keep temporaries small."""
+    out = np.empty(len(quantized), dtype=vec.dtype)
+    for start in range(0, len(quantized), block):
+        out[start:start + block] = quantized[start:start + block].astype(vec.dtype) @ vec
+    return out
+
+
+SERVING_COLUMNS = ["_id", "name", "shortdescription", "popularity_score", "tags_list"]
+
+
+def build_serving_table(df: pd.DataFrame) -> pd.DataFrame:
+    """Compact module table for serving: only the columns the endpoints read.
+    Strings are interned so repeated names/tags share one object; the full training
+    frame is stored separately (see `modelstore.load_raw_frame`).
+    """
+    def _interned(values):
+        return np.array([sys.intern(str(v)) if isinstance(v, str) else "" for v in values], dtype=object)
+
+    table = pd.DataFrame(index=pd.RangeIndex(len(df)))
+    table["_id"] = df["_id"].to_numpy()
+    for col in ("name", "shortdescription"):
+        values = _interned(df[col]) if col in df.columns else np.full(len(df), "", dtype=object)
+        table[col] = pd.Series(values, index=table.index, dtype=object)
+    if "popularity_score" in df.columns:
+        table["popularity_score"] = df["popularity_score"].to_numpy(dtype=float)
+    tags = df["tags_list"] if "tags_list" in df.columns else [[] for _ in range(len(df))]
+    table["tags_list"] = pd.Series([[sys.intern(t) for t in ts] for ts in tags], index=table.index, dtype=object)
+    return table
+
+
+def _popularity_norm(df: pd.DataFrame, dtype=np.float64) -> np.ndarray:
+    if "popularity_score" not in df.columns:
+        return np.zeros(len(df), dtype=dtype)
+    # Ontbrekende populariteit (bijv. een geüpserte module zonder score) telt als 0
+    popularity = pd.to_numeric(df["popularity_score"], errors="coerce").fillna(0).to_numpy(dtype=dtype)
+    return popularity / (np.nanmax(popularity) + 1e-9)
+
+
+# De trainingspipeline bestaat uit losse stappen (tekst, vectoriseren, reduceren, CF)
+# zodat sweep.py ze per invoer + parameters kan cachen.
+
+def preprocess_modules(df: pd.DataFrame) -> pd.DataFrame:
+    """Text stage: parsed tags and the preprocessed `module_text` per module."""
     nlp_nl, nlp_en = _get_spacy_models()
 
     df = df.copy()
@@ -235,34 +372,69 @@ def build_model_from_dataframe(
 
     TAG_CANDIDATES = ["tags_list", "module_tags_str", "tags"]
     tag_col = next((c for c in TAG_CANDIDATES if c in df.columns), None)
-    df["tags_list"] = df[tag_col].apply(parse_tags) if tag_col else [[] for _ in range(len(df))]
-    df["tags_list_nlp"] = df["tags_list"].apply(preprocess_tags)
+    df["tags_list"] = parse_tags_column(df[tag_col]) if tag_col else [[] for _ in range(len(df))]
+    df["tags_list_nlp"] = preprocess_tags_column(df["tags_list"])
 
     def _build_text(r):
         combined = " ".join([str(r.get("shortdescription", "")), str(r.get("description", "")), " ".join(r.get("tags_list", []))]).strip()
         return preprocess_text(combined, nlp_nl, nlp_en)
 
     df["module_text"] = df.apply(_build_text, axis=1)
+    return df
 
-    vectorizer = TfidfVectorizer(max_features=tfidf_max_features, ngram_range=(1,2), min_df=2)
-    module_tfidf = vectorizer.fit_transform(df["module_text"])
-    module_tfidf_dense = module_tfidf.toarray()
 
-    if users_demo is None:
-        users_demo = pd.DataFrame({"user_id": [], "name": [], "favorite_id": [], "profile_text": []})
-    user_profile_tfidf = vectorizer.transform(users_demo["profile_text"].fillna("").tolist()).toarray() if len(users_demo) else np.zeros((0, module_tfidf.shape[1]))
+def vectorize_modules(module_text: pd.Series, profile_texts: List[str], tfidf_max_features: int = 5000, compute_dtype: str = "float32"):
+    """Vectorize stage: fitted TF-IDF, dense module matrix and the user profile rows."""
+    dtype = np.dtype(compute_dtype)
+    vectorizer = TfidfVectorizer(max_features=tfidf_max_features, ngram_range=(1,2), min_df=2, dtype=dtype)
+    module_tfidf_dense = vectorizer.fit_transform(module_text).toarray()
+    if len(profile_texts):
+        user_profile_tfidf = vectorizer.transform(profile_texts).toarray()
+    else:
+        user_profile_tfidf = np.zeros((0, module_tfidf_dense.shape[1]), dtype=dtype)
+    return vectorizer, module_tfidf_dense, user_profile_tfidf
+
 
+def reduce_modules(df: pd.DataFrame, module_tfidf_dense: np.ndarray, pca_components: int = 50, compute_dtype: str = "float32"):
+    """Reduce stage: scaled numeric features + TF-IDF, projected with PCA."""
+    dtype = np.dtype(compute_dtype)
     NUM_COLS = [c for c in ["studycredit","estimated_difficulty","interests_match_score","popularity_score"] if c in df.columns]
     scaler = StandardScaler()
     if NUM_COLS:
-        numeric_scaled = scaler.fit_transform(df[NUM_COLS])
+        numeric_scaled = scaler.fit_transform(df[NUM_COLS]).astype(dtype)
     else:
-        numeric_scaled = np.zeros((len(df),0))
+        numeric_scaled = np.zeros((len(df),0), dtype=dtype)
 
     module_vectors = np.hstack([module_tfidf_dense, numeric_scaled])
     pca = PCA(n_components=min(pca_components, module_vectors.shape[1]), random_state=42)
-    module_vectors_pca = pca.fit_transform(module_vectors)
+    module_vectors_pca = pca.fit_transform(module_vectors).astype(dtype, copy=False)
+    return scaler, pca, module_vectors_pca
+
+
+def project_modules(model_bundle: Dict[str, Any], df: pd.DataFrame):
+    """TF-IDF rows and PCA vectors of preprocessed modules with the bundle's fitted
+    vectorizer, scaler and PCA (no refit). Missing numeric columns count as the mean.
+    """
+    dtype = np.dtype(model_bundle.get("dtype", "float64"))
+    tfidf_dense = model_bundle["vectorizer"].transform(df["module_text"]).toarray().astype(dtype, copy=False)
+
+    scaler = model_bundle["scaler"]
+    num_cols = list(getattr(scaler, "feature_names_in_", []))
+    if num_cols:
+        numeric = pd.DataFrame({
+            c: pd.to_numeric(df[c], errors="coerce") if c in df.columns else np.nan for c in num_cols
+        }, index=df.index)
+        numeric = numeric.fillna(pd.Series(scaler.mean_, index=num_cols))
+        numeric_scaled = scaler.transform(numeric).astype(dtype)
+    else:
+        numeric_scaled = np.zeros((len(df), 0), dtype=dtype)
+
+    pca_rows = model_bundle["pca"].transform(np.hstack([tfidf_dense, numeric_scaled])).astype(dtype, copy=False)
+    return tfidf_dense, pca_rows
 
+
+def fit_collaborative(df: pd.DataFrame, num_dummy_users: int = 50, als_params: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """CF stage: synthetic interactions and the fitted ALS model."""
     # synthetic interactions
     all_ids = df["_id"].tolist()
     ratings = []
@@ -290,156 +462,699 @@ def build_model_from_dataframe(
         rows.append(item_map[m])
         cols.append(user_map[u])
         data.append(score)
-    interaction_matrix = csr_matrix((data, (rows, cols)), shape=(len(item_ids), len(user_ids)))
+    interaction_matrix = csr_matrix((data, (rows, cols)), shape=(len(item_ids), len(user_ids)), dtype=np.float32)
 
-    als_defaults = dict(factors=32, regularization=0.05, iterations=25, random_state=42)
+    als_defaults = dict(factors=32, regularization=0.05, iterations=25, random_state=42, num_threads=training_threads())
     if als_params:
         als_defaults.update(als_params)
     als_model = AlternatingLeastSquares(**als_defaults)
     if interaction_matrix.shape[0] > 0 and interaction_matrix.shape[1] > 0:
-        als_model.fit(interaction_matrix)
+        # implicit >= 0.5 verwacht users x items
+        als_model.fit(interaction_matrix.T.tocsr())
 
-    model_bundle = {
-        "df": df,
-        "module_vectors_pca": module_vectors_pca,
-        "vectorizer": vectorizer,
-        "pca": pca,
-        "scaler": scaler,
+    return {
         "als_model": als_model,
         "user_map": user_map,
         "item_map": item_map,
         "item_map_inv": item_map_inv,
         "interaction_matrix": interaction_matrix,
+    }
+
+
+def assemble_model_bundle(
+    df: pd.DataFrame,
+    users_demo: pd.DataFrame,
+    vectorized: tuple,
+    reduced: tuple,
+    collaborative: Dict[str, Any],
+    retrieval_index: Optional[str] = None,
+    compute_dtype: str = "float32",
+    quantize_pca: bool = False,
+) -> Dict[str, Any]:
+    """Combine the stage outputs into the model bundle stored by modelstore.save_model."""
+    dtype = np.dtype(compute_dtype)
+    vectorizer, module_tfidf_dense, user_profile_tfidf = vectorized
+    scaler, pca, module_vectors_pca = reduced
+
+    module_pca_inv_norm = _inv_norms(module_vectors_pca)
+    module_vectors_pca_q, module_vectors_pca_scale = quantize_int8(module_vectors_pca * module_pca_inv_norm[:, None]) if quantize_pca else (None, None)
+    module_vectors_2d = _projection_2d(module_vectors_pca)
+    ann_index = build_retrieval_index(module_vectors_pca, retrieval_index)
+    search_index = build_search_index(module_tfidf_dense)
+
+    popularity_norm = _popularity_norm(df, dtype)
+
+    model_bundle = {
+        "df": build_serving_table(df),
+        "df_raw": df,
+        "attribute_index": build_attribute_index(df),
+        "popularity_norm": popularity_norm,
+        "popularity_ranking": build_popularity_ranking(df, popularity_norm),
+        "module_vectors_pca": module_vectors_pca,
+        "module_vectors_2d": module_vectors_2d,
+        "module_pca_inv_norm": module_pca_inv_norm,
+        "module_vectors_pca_q": module_vectors_pca_q,
+        "module_vectors_pca_scale": module_vectors_pca_scale,
+        "dtype": dtype.name,
+        "vectorizer": vectorizer,
+        "pca": pca,
+        "scaler": scaler,
+        **collaborative,
         "module_tfidf_dense": module_tfidf_dense,
         "user_profile_tfidf": user_profile_tfidf,
         "users_demo": users_demo,
+        "ann_index": ann_index,
+        "ann_candidates": ANN_CANDIDATES,
+        "search_index": search_index,
+        "bundle_token": uuid.uuid4().hex,
     }
     return model_bundle
 
 
-def recommend_from_model(
+def _empty_users() -> pd.DataFrame:
+    return pd.DataFrame({"user_id": [], "name": [], "favorite_id": [], "profile_text": []})
+
+
+def build_model_from_dataframe(
+    df: pd.DataFrame,
+    users_demo: Optional[pd.DataFrame] = None,
+    num_dummy_users: int = 50,
+    tfidf_max_features: int = 5000,
+    pca_components: int = 50,
+    als_params: Optional[Dict[str, Any]] = None,
+    retrieval_index: Optional[str] = None,
+    compute_dtype: str = "float32",
+    quantize_pca: bool = False,
+) -> Dict[str, Any]:
+    compute_dtype = np.dtype(compute_dtype).name
+    if users_demo is None:
+        users_demo = _empty_users()
+
+    df = preprocess_modules(df)
+    vectorized = vectorize_modules(df["module_text"], users_demo["profile_text"].fillna("").tolist() if len(users_demo) else [], tfidf_max_features, compute_dtype)
+    reduced = reduce_modules(df, vectorized[1], pca_components, compute_dtype)
+    collaborative = fit_collaborative(df, num_dummy_users, als_params)
+    return assemble_model_bundle(df, users_demo, vectorized, reduced, collaborative, retrieval_index, compute_dtype, quantize_pca)
+
+
+RERANK_MIN = 50
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first (argpartition, then sort only those k)."""
+    if k <= 0 or len(scores) == 0:
+        return np.array([], dtype=np.int64)
+    if k < len(scores):
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(len(scores))
+    return part[np.argsort(-scores[part], kind="stable")]
+
+
+def _min_max(x: np.ndarray) -> np.ndarray:
+    if len(x) == 0:
+        return x
+    return (x - x.min()) / max(1e-9, x.max() - x.min())
+
+
+def _take(arr, positions):
+    """Rows of `arr` at `positions`; None means the full matrix (exact path, no copy)."""
+    return arr if positions is None else arr[positions]
+
+
+def _module_item_index(model_bundle: Dict[str, Any]) -> np.ndarray:
+    """ALS item index per module row (-1 if the module has no interactions), cached on the bundle."""
+    cached = model_bundle.get("module_item_index")
+    if cached is None:
+        item_map = model_bundle.get("item_map", {})
+        cached = np.array([item_map.get(mid, -1) for mid in model_bundle["df"]["_id"]], dtype=np.int64)
+        model_bundle["module_item_index"] = cached
+    return cached
+
+
+def _search_index(model_bundle: Dict[str, Any]):
+    """Inverted index over the TF-IDF rows; built on first use for bundles saved without one."""
+    index = model_bundle.get("search_index")
+    if index is None:
+        index = model_bundle["search_index"] = build_search_index(model_bundle["module_tfidf_dense"])
+    return index
+
+
+def _profile_query_pca(model_bundle: Dict[str, Any], profile_vec) -> np.ndarray:
+    """Project a profile TF-IDF vector into PCA space (numeric features at their mean)."""
+    pca = model_bundle["pca"]
+    n_numeric = pca.n_features_in_ - profile_vec.shape[1]
+    padded = np.hstack([profile_vec.toarray(), np.zeros((1, n_numeric))])
+    return pca.transform(padded)[0]
+
+
+POPULARITY_SEGMENT_COLUMNS = ["level", "location"]
+
+
+def build_popularity_ranking(df: pd.DataFrame, popularity_norm: np.ndarray) -> Dict[str, Any]:
+    """Module positions by descending popularity, overall and per level/location value."""
+    ranking = np.argsort(-popularity_norm, kind="stable")
+    segments = {}
+    for col in POPULARITY_SEGMENT_COLUMNS:
+        if col not in df.columns:
+            continue
+        values = df[col].fillna("").astype(str).str.strip().to_numpy()[ranking]
+        segments[col] = {v: ranking[values == v] for v in pd.unique(values) if v}
+    return {"all": ranking, "segments": segments}
+
+
+def _rec_frame(df, sel, content, profile, popularity, cf, final, weights) -> pd.DataFrame:
+    rec_df = pd.DataFrame({
+        "_id": df["_id"].to_numpy()[sel],
+        "name": df["name"].to_numpy()[sel] if "name" in df.columns else "",
+        "shortdescription": df["shortdescription"].to_numpy()[sel] if "shortdescription" in df.columns else "",
+        "content_sim_scaled": content,
+        "profile_sim_scaled": profile,
+        "popularity_norm": popularity,
+        "cf_score_scaled": cf,
+        "final_score": final,
+    }, index=sel)
+    rec_df.attrs["weights_used"] = weights
+    return rec_df
+
+
+def _cold_start(model_bundle: Dict[str, Any], top_n: int, filters, allowed) -> pd.DataFrame:
+    """Top-N by popularity only; no similarity matrices are touched."""
+    df = model_bundle["df"]
+    popularity_all = model_bundle.get("popularity_norm")
+    if popularity_all is None:
+        popularity_all = model_bundle["popularity_norm"] = _popularity_norm(df)
+    ranking = model_bundle.get("popularity_ranking")
+    if ranking is None:
+        ranking = model_bundle["popularity_ranking"] = build_popularity_ranking(df, popularity_all)
+
+    ranked = ranking["all"]
+    # Eén level/location-waarde als filter: het vooraf berekende segment direct gebruiken
+    if filters and len(filters) == 1:
+        (col, value), = filters.items()
+        if isinstance(value, list) and len(value) == 1:
+            value = value[0]
+        if col in ranking["segments"] and isinstance(value, str):
+            ranked = ranking["segments"][col].get(value.strip(), ranked[:0])
+            allowed = None
+    if allowed is not None:
+        ranked = ranked[allowed[ranked]]
+
+    sel = ranked[:top_n]
+    popularity = popularity_all[sel]
+    zeros = np.zeros(len(sel), dtype=popularity.dtype)
+    weights = {"content": 0, "profile": 0, "popularity": 1.0, "collaborative": 0}
+    return _rec_frame(df, sel, zeros, zeros, popularity, zeros, popularity, weights)
+
+
+WEIGHT_ARGS = {"content": "w_content", "profile": "w_profile", "popularity": "w_pop", "collaborative": "w_cf"}
+
+# Genormaliseerde signalen per gebruiker, zodat herwegen (UI-slider, A/B) alleen
+# nog een gewogen som + top-k is
+_signal_cache = TTLCache(
+    maxsize=int(os.getenv("SIGNAL_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("SIGNAL_CACHE_TTL", "300")),
+)
+
+
+def weight_kwargs(weights: Optional[Dict[str, Any]]) -> Dict[str, float]:
+    """Map an API weights dict ({"content": .., "profile": .., ...}) onto recommend_from_model kwargs."""
+    if not weights:
+        return {}
+    unknown = set(weights) - set(WEIGHT_ARGS)
+    if unknown:
+        raise ValueError(f"Unknown weight(s): {sorted(unknown)}")
+    kwargs = {}
+    for name, value in weights.items():
+        if not isinstance(value, (int, float)) or value < 0:
+            raise ValueError(f"Weight '{name}' must be a non-negative number")
+        kwargs[WEIGHT_ARGS[name]] = float(value)
+    return kwargs
+
+
+def bundle_token(model_bundle: Dict[str, Any]) -> str:
+    """Unique token of this bundle object for cache keys (set when built or loaded).
+    Unlike id(), it is never reused by another bundle after garbage collection.
+    """
+    token = model_bundle.get("bundle_token")
+    if token is None:
+        token = model_bundle.setdefault("bundle_token", uuid.uuid4().hex)
+    return token
+
+
+def _signal_key(model_bundle, user_row, candidate_k, filters, head_n):
+    favs = tuple(sorted(str(f) for f in user_row.get("favorite_id", [])))
+    filter_key = json.dumps(filters, sort_keys=True, default=str) if filters else None
+    # Alleen bij ANN + filters hangt de kandidatenset van head_n af
+    ann_top_n = head_n if filters and model_bundle.get("ann_index") is not None else None
+    user_id = str(user_row.get("user_id"))
+    return (
+        bundle_token(model_bundle),
+        # Incrementele CF- en module-updates maken oude signalen ongeldig
+        model_bundle.get("cf_item_revision", 0),
+        model_bundle.get("catalog_revision", 0),
+        model_bundle.get("cf_user_revision", {}).get(user_id, 0),
+        user_id,
+        favs,
+        user_row.get("profile_text", "").strip(),
+        candidate_k,
+        filter_key,
+        ann_top_n,
+    )
+
+
+def _profile_vector(model_bundle: Dict[str, Any], profile_text: str):
+    """TF-IDF row (sparse) of a preprocessed profile text."""
+    nlp_nl, nlp_en = _get_spacy_models()
+    return model_bundle["vectorizer"].transform([preprocess_text(profile_text, nlp_nl, nlp_en)])
+
+
+def _cf_raw(model_bundle: Dict[str, Any], user_row, fav_indices, candidates, n: int, dtype) -> np.ndarray:
+    """Raw ALS scores over the scored positions; zeros for unknown users or without favourites."""
+    als_model = model_bundle.get("als_model")
+    user_map = model_bundle.get("user_map", {})
+    item_map_inv = model_bundle.get("item_map_inv", {})
+    interaction_matrix = model_bundle.get("interaction_matrix")
+    if not (fav_indices and user_row.get("user_id") in user_map and als_model is not None and interaction_matrix is not None):
+        return np.zeros(n, dtype=dtype)
+    uidx = user_map[user_row["user_id"]]
+    rec_ids, rec_scores = als_model.recommend(
+        userid=uidx, user_items=interaction_matrix[:, uidx].T.tocsr(), N=len(item_map_inv), filter_already_liked_items=False
+    )
+    item_scores = np.zeros(len(item_map_inv) + 1, dtype=dtype)
+    item_scores[rec_ids] = rec_scores
+    # index -1 (module zonder interacties) valt op de extra 0-slot achteraan
+    return item_scores[_take(_module_item_index(model_bundle), candidates)]
+
+
+def active_weights(df: pd.DataFrame, fav_indices, has_profile: bool, w_content, w_pop, w_cf, w_profile):
+    """Weights of the signals that are present for this user, and their sum."""
+    weights = {
+        "content": float(w_content) if fav_indices else 0,
+        "profile": float(w_profile) if has_profile else 0,
+        "popularity": float(w_pop) if "popularity_score" in df.columns else 0,
+        "collaborative": float(w_cf) if fav_indices else 0
+    }
+    weight_sum = sum(weights.values())
+    if weight_sum == 0:  # edge-case safeguard
+        weight_sum = 1
+    return weights, weight_sum
+
+
+def combine_signals(weights: Dict[str, float], weight_sum: float, content, profile, popularity, cf):
+    return (
+        weights["content"] * content +
+        weights["profile"] * profile +
+        weights["popularity"] * popularity +
+        weights["collaborative"] * cf
+    ) / weight_sum
+
+
+def compute_signals(
     model_bundle: Dict[str, Any],
     user_row: Dict[str, Any],
     top_n: int = 5,
-    w_content: float = 0.45,
-    w_pop: float = 0.05,
-    w_cf: float = 0.0,
-    w_profile: float = 0.5,
-):
+    candidate_k: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+) -> Dict[str, Any]:
+    """The four normalised signal vectors (content, profile, popularity, CF) for one
+    user over the scored module positions, plus the masks needed to rank them.
+    `top_n` is the number of rows the caller shows (the ANN fallback needs that many).
+    """
     df = model_bundle["df"]
     module_vectors_pca = model_bundle["module_vectors_pca"]
     module_tfidf_dense = model_bundle["module_tfidf_dense"]
-    als_model = model_bundle.get("als_model")
-    user_map = model_bundle.get("user_map", {})
-    item_map_inv = model_bundle.get("item_map_inv", {})
-    interaction_matrix = model_bundle.get("interaction_matrix")
+    ann_index = model_bundle.get("ann_index")
+    quantized = model_bundle.get("module_vectors_pca_q")
+    dtype = np.dtype(model_bundle.get("dtype", "float64"))
 
-    fav_ids = [fid for fid in user_row.get("favorite_id", []) if fid in df["_id"].values]
-    fav_indices = df[df["_id"].isin(fav_ids)].index.tolist()
+    id_values = df["_id"].to_numpy()
+    fav_mask = np.isin(id_values, list(user_row.get("favorite_id", [])))
+    allowed = filter_mask(model_bundle.get("attribute_index"), filters, len(df))
+    fav_indices = np.flatnonzero(fav_mask).tolist()
 
     # Profile tekst
     has_profile = bool(user_row.get("profile_text", "").strip())
 
-    # Als geen favorites en geen profieltekst → return lege recommendations
+    signals = {
+        "fav_mask": fav_mask,
+        "fav_indices": fav_indices,
+        "has_profile": has_profile,
+        "allowed": allowed,
+        "user_unit": None,
+        "content_range": (0.0, 1.0),
+    }
     if not fav_indices and not has_profile:
-        return pd.DataFrame(columns=["id", "name", "shortdescription", "tags_list"]), pd.DataFrame()
+        return signals
+
+    user_vec = module_vectors_pca[fav_indices].mean(axis=0).reshape(1, -1) if fav_indices else None
+
+    profile_vec = _profile_vector(model_bundle, user_row["profile_text"]) if has_profile else None
+
+    # --- Kandidaten: exacte scan, of een ANN-index bij grote catalogi ---
+    candidates = None
+    if ann_index is not None:
+        queries = []
+        if user_vec is not None:
+            queries.append(user_vec[0])
+        if profile_vec is not None:
+            queries.append(_profile_query_pca(model_bundle, profile_vec))
+        k = candidate_k or model_bundle.get("ann_candidates", ANN_CANDIDATES)
+        candidates = retrieve_candidates(ann_index, queries, k)
+        if allowed is not None and np.count_nonzero(allowed[candidates]) < top_n:
+            # Te weinig kandidaten binnen de filters: terug naar de exacte scan
+            candidates = None
+    positions = np.arange(len(df)) if candidates is None else candidates
+    n = len(positions)
 
     # --- Content similarity (optioneel, alleen als favorites aanwezig zijn) ---
-    if fav_indices:
-        fav_vectors = module_vectors_pca[fav_indices]
-        user_vec = fav_vectors.mean(axis=0).reshape(1, -1)
-        sims = cosine_similarity(normalize(user_vec), normalize(module_vectors_pca))[0]
-        content_sim_scaled = (sims - sims.min()) / max(1e-9, sims.max() - sims.min())
+    if user_vec is not None:
+        user_unit = normalize(user_vec)[0].astype(dtype, copy=False)
+        if quantized is not None:
+            sims = _int8_dot(_take(quantized, candidates), user_unit * model_bundle["module_vectors_pca_scale"])
+        else:
+            inv_norm = model_bundle.get("module_pca_inv_norm")
+            if inv_norm is None:
+                inv_norm = model_bundle["module_pca_inv_norm"] = _inv_norms(module_vectors_pca)
+            sims = (_take(module_vectors_pca, candidates) @ user_unit) * _take(inv_norm, candidates)
+        content_sim_scaled = _min_max(sims)
+        signals["user_unit"] = user_unit
+        signals["content_range"] = (float(sims.min()), max(1e-9, float(sims.max() - sims.min())))
     else:
-        content_sim_scaled = np.zeros(len(df))
+        content_sim_scaled = np.zeros(n, dtype=dtype)
 
     # --- Profile similarity (optioneel, alleen als profieltekst aanwezig is) ---
-    profile_scaled = np.zeros(len(df))
-    if has_profile:
-        vectorizer = model_bundle["vectorizer"]
-        nlp_nl, nlp_en = _get_spacy_models()
-        profile_text_clean = preprocess_text(user_row["profile_text"], nlp_nl, nlp_en)
-        profile_vec = vectorizer.transform([profile_text_clean]).toarray()
-        profile_sims = cosine_similarity(profile_vec, module_tfidf_dense)[0]
-        profile_scaled = (profile_sims - profile_sims.min()) / max(1e-9, profile_sims.max() - profile_sims.min())
-
-    # --- Popularity ---
-    popularity_norm = df["popularity_score"] / (df["popularity_score"].max() + 1e-9) if "popularity_score" in df.columns else np.zeros(len(df))
+    # TF-IDF rijen zijn al L2-genormaliseerd, dus cosine = dot product
+    profile_scaled = np.zeros(n, dtype=dtype)
+    if profile_vec is not None:
+        profile_sims = _take(module_tfidf_dense, candidates) @ profile_vec.toarray()[0].astype(dtype, copy=False)
+        profile_scaled = _min_max(profile_sims)
+
+    # --- Popularity (vooraf berekend bij het trainen) ---
+    popularity_all = model_bundle.get("popularity_norm")
+    if popularity_all is None:
+        popularity_all = model_bundle["popularity_norm"] = _popularity_norm(df, dtype)
+    popularity_norm = _take(popularity_all, candidates)
 
     # --- Collaborative filtering (optioneel, alleen als favorites aanwezig zijn) ---
-    cf_raw = np.zeros(len(df))
-    if fav_indices and user_row.get("user_id") in user_map and als_model is not None and interaction_matrix is not None:
-        uidx = user_map[user_row["user_id"]]
-        rec_ids, rec_scores = als_model.recommend(
-            userid=uidx, user_items=interaction_matrix.T, N=len(item_map_inv), filter_already_liked_items=False
-        )
-        score_map = {item_map_inv[i]: s for i, s in zip(rec_ids, rec_scores)}
-        cf_raw = np.array([score_map.get(mid, 0.0) for mid in df["_id"]])
+    cf_raw = _cf_raw(model_bundle, user_row, fav_indices, candidates, n, dtype)
 
-    cf_scaled = (cf_raw - cf_raw.min()) / max(1e-9, cf_raw.max() - cf_raw.min())
+    signals.update({
+        "positions": positions,
+        "content": content_sim_scaled,
+        "profile": profile_scaled,
+        "popularity": popularity_norm,
+        "cf": _min_max(cf_raw),
+    })
+    return signals
+
+
+def rank_signals(
+    model_bundle: Dict[str, Any],
+    signals: Dict[str, Any],
+    top_n: int = 5,
+    w_content: float = 0.45,
+    w_pop: float = 0.05,
+    w_cf: float = 0.0,
+    w_profile: float = 0.5,
+    head_n: Optional[int] = None,
+) -> pd.DataFrame:
+    """Weighted sum of precomputed signals and top-N selection. Does not modify `signals`.
+    `head_n` (default `top_n`) is the part the caller shows first, e.g. one page of a
+    deeper ranking: it sizes the int8 rerank and the debug output.
+    """
+    head_n = min(head_n or top_n, top_n)
+    df = model_bundle["df"]
+    quantized = model_bundle.get("module_vectors_pca_q")
+    fav_indices = signals["fav_indices"]
+    has_profile = signals["has_profile"]
+    positions = signals["positions"]
+    content_sim_scaled = signals["content"]
+    profile_scaled = signals["profile"]
+    popularity_norm = signals["popularity"]
+    cf_scaled = signals["cf"]
 
     # --- Dynamische weging afhankelijk van aanwezige signalen ---
-    active_weights = {
-        "content": w_content if fav_indices else 0,
-        "profile": w_profile if has_profile else 0,
-        "popularity": w_pop if "popularity_score" in df.columns else 0,
-        "collaborative": w_cf if fav_indices else 0
-    }
-    weight_sum = sum(active_weights.values())
-    if weight_sum == 0:  # edge-case safeguard
-        weight_sum = 1
+    weights, weight_sum = active_weights(df, fav_indices, has_profile, w_content, w_pop, w_cf, w_profile)
+
+    def _combine(content, profile, popularity, cf):
+        return combine_signals(weights, weight_sum, content, profile, popularity, cf)
+
+    hybrid_final = _combine(content_sim_scaled, profile_scaled, popularity_norm, cf_scaled)
+
+    # --- Top-N zonder favorieten, binnen de filters ---
+    # Filters maskeren alleen de selectie; normalisatie blijft over alle modules
+    allowed, fav_mask = signals["allowed"], signals["fav_mask"]
+    selectable = ~fav_mask if allowed is None else allowed & ~fav_mask
+    keep = np.flatnonzero(selectable[positions])
+
+    # int8-scores zijn benaderingen: herbereken de kopgroep met de float-vectoren
+    if quantized is not None and signals["user_unit"] is not None and len(keep):
+        head = keep[_top_k(hybrid_final[keep], max(4 * head_n, RERANK_MIN))]
+        exact = normalize(model_bundle["module_vectors_pca"][positions[head]]) @ signals["user_unit"]
+        lo, span = signals["content_range"]
+        content_sim_scaled = content_sim_scaled.copy()
+        content_sim_scaled[head] = (exact - lo) / span
+        hybrid_final[head] = _combine(content_sim_scaled[head], profile_scaled[head], popularity_norm[head], cf_scaled[head])
+        # Diepere rankings (paginering) houden buiten de kopgroep de int8-benadering
+        if len(head) >= top_n:
+            keep = head
+    order = keep[_top_k(hybrid_final[keep], top_n)]
+    sel = positions[order]
+
+    rec_df = _rec_frame(
+        df, sel,
+        content_sim_scaled[order], profile_scaled[order], popularity_norm[order], cf_scaled[order], hybrid_final[order],
+        {k: v / weight_sum for k, v in weights.items()},
+    )
 
-    hybrid_final = (
-        active_weights["content"] * content_sim_scaled +
-        active_weights["profile"] * profile_scaled +
-        active_weights["popularity"] * popularity_norm +
-        active_weights["collaborative"] * cf_scaled
-    ) / weight_sum
+    # 🔹 DEBUG PER TOP-N RECOMMENDATION (uit te zetten met RECOMMENDER_DEBUG=0)
+    if DEBUG_SCORES:
+        print(
+            "PROFILE DEBUG:",
+            "has_profile_text=", has_profile,
+            "fav_present=", bool(fav_indices),
+            "profile_mean=", float(profile_scaled.mean()),
+            "profile_max=", float(profile_scaled.max()),
+            "final_mean=", float(hybrid_final.mean())
+        )
+        print("\nTOP RECOMMENDATIONS SCORES:")
+        for idx, row in rec_df.head(head_n).iterrows():
+            print(f"Module: {row['name']} | "
+                  f"fav_indices: {fav_indices} | "
+                  f"Content/Fav: {row['content_sim_scaled']:.3f} | "
+                  f"Profile: {row['profile_sim_scaled']:.3f} | "
+                  f"Pop: {row['popularity_norm']:.3f} | "
+                  f"CF: {row['cf_score_scaled']:.3f} | "
+                  f"Final: {row['final_score']:.3f}")
 
-    # --- Bouw recommendation rows ---
-    rows = []
-    for idx, row in df.iterrows():
-        if row["_id"] in fav_ids:
-            continue
-        rows.append({
-            "_id": row["_id"],
-            "name": row.get("name", ""),
-            "shortdescription": row.get("shortdescription", ""),
-            "content_sim_scaled": float(content_sim_scaled[idx]),
-            "profile_sim_scaled": float(profile_scaled[idx]),
-            "popularity_norm": float(popularity_norm[idx]) if hasattr(popularity_norm, "__len__") else float(popularity_norm[idx]),
-            "cf_score_scaled": float(cf_scaled[idx]),
-            "final_score": float(hybrid_final[idx])
-        })
+    return rec_df
+
+
+# Actieve scatter-gather scorer (sharding.py), alleen voor de bundle waarmee hij gestart is
+_sharded_scorer = None
+
+
+def set_sharded_scorer(scorer):
+    global _sharded_scorer
+    _sharded_scorer = scorer
+
+
+def get_sharded_scorer():
+    return _sharded_scorer
 
-    rec_df = pd.DataFrame(rows).sort_values("final_score", ascending=False).head(top_n)
-    fav_table = df.loc[fav_indices][["_id", "name", "shortdescription", "tags_list"]]
-
-    # 🔹 DEBUG PER TOP-N RECOMMENDATION
-    print(
-        "PROFILE DEBUG:",
-        "has_profile_text=", has_profile,
-        "fav_present=", bool(fav_indices),
-        "profile_mean=", float(profile_scaled.mean()),
-        "profile_max=", float(profile_scaled.max()),
-        "final_mean=", float(hybrid_final.mean())
-    )
-    print("\nTOP RECOMMENDATIONS SCORES:")
-    for idx, row in rec_df.iterrows():
-        print(f"Module: {row['name']} | "
-              f"fav_indices: {fav_indices} | "
-              f"Content/Fav: {row['content_sim_scaled']:.3f} | "
-              f"Profile: {row['profile_sim_scaled']:.3f} | "
-              f"Pop: {row['popularity_norm']:.3f} | "
-              f"CF: {row['cf_score_scaled']:.3f} | "
-              f"Final: {row['final_score']:.3f}")
 
+def recommend_from_model(
+    model_bundle: Dict[str, Any],
+    user_row: Dict[str, Any],
+    top_n: int = 5,
+    w_content: float = 0.45,
+    w_pop: float = 0.05,
+    w_cf: float = 0.0,
+    w_profile: float = 0.5,
+    candidate_k: Optional[int] = None,
+    filters: Optional[Dict[str, Any]] = None,
+    use_cache: bool = True,
+    head_n: Optional[int] = None,
+):
+    """(fav_table, top `top_n` recommendations). `head_n` (default `top_n`) is how many
+    of them the caller shows right away; pagination ranks deeper than one page.
+    """
+    df = model_bundle["df"]
+    head_n = min(head_n or top_n, top_n)
+
+    scorer = _sharded_scorer
+    if scorer is not None and scorer.serves(model_bundle):
+        result = scorer.recommend(user_row, top_n, w_content, w_pop, w_cf, w_profile, filters)
+        if result is not None:
+            return result
+
+    key = _signal_key(model_bundle, user_row, candidate_k, filters, head_n) if use_cache else None
+    signals = _signal_cache.get(key) if use_cache else None
+    if signals is None:
+        signals = compute_signals(model_bundle, user_row, top_n=head_n, candidate_k=candidate_k, filters=filters)
+        if use_cache:
+            _signal_cache.put(key, signals)
+
+    fav_table = df.iloc[signals["fav_indices"]][["_id", "name", "shortdescription", "tags_list"]]
+
+    # Geen favorites en geen profieltekst → cold start: vooraf gesorteerde populariteit
+    if "positions" not in signals:
+        if w_pop <= 0 or "popularity_score" not in df.columns:
+            return fav_table, pd.DataFrame()
+        return fav_table, _cold_start(model_bundle, top_n, filters, signals["allowed"])
+
+    rec_df = rank_signals(
+        model_bundle, signals, top_n=top_n,
+        w_content=w_content, w_pop=w_pop, w_cf=w_cf, w_profile=w_profile, head_n=head_n,
+    )
     return fav_table, rec_df
 
 
+WARMUP_PROFILES = ["data analyse en software ontwikkeling", "marketing and business management"]
+
+
+def warm_up_model(model_bundle: Dict[str, Any]) -> Dict[str, Any]:
+    """Prepare a freshly activated bundle for traffic: load both spaCy pipelines,
+    page in every array and run favourite-only, profile-only and mixed queries
+    (spins up the BLAS pools and the lazy per-bundle caches). Returns timings.
+    """
+    start = time.perf_counter()
+    try:
+        _get_spacy_models()
+    except Exception as e:
+        # Zonder spaCy werkt alleen de profieltekst niet; het model kan wel serveren
+        print(f"[WARMUP] spaCy models not available: {e}")
+
+    touched = 0
+    for value in model_bundle.values():
+        if isinstance(value, np.ndarray) and value.size and value.dtype.kind in "biuf":
+            # één element per geheugenpagina lezen
+            step = max(1, 4096 // value.itemsize)
+            np.sum(value.reshape(-1)[::step], dtype=np.float64)
+            touched += value.nbytes
+
+    df = model_bundle["df"]
+    ranking = model_bundle.get("popularity_ranking")
+    positions = ranking["all"][:3] if ranking is not None else np.arange(min(3, len(df)))
+    fav_ids = df["_id"].to_numpy()[positions].tolist()
+    queries = [
+        {"user_id": None, "favorite_id": fav_ids, "profile_text": ""},
+    ] + [
+        {"user_id": None, "favorite_id": [], "profile_text": text} for text in WARMUP_PROFILES
+    ] + [
+        {"user_id": None, "favorite_id": fav_ids[:1], "profile_text": WARMUP_PROFILES[0]},
+    ]
+    for user in queries:
+        recommend_from_model(model_bundle, user, top_n=5, use_cache=False)
+
+    seconds = time.perf_counter() - start
+    return {"seconds": seconds, "queries": len(queries), "bytes_touched": touched}
+
+
+SEARCH_BLEND_CANDIDATES = int(os.getenv("SEARCH_BLEND_CANDIDATES", "100"))
+
 
+def _hybrid_at(model_bundle: Dict[str, Any], user_row: Dict[str, Any], positions: np.ndarray, filters, weights) -> np.ndarray:
+    """Hybrid score (as in recommend_from_model) of the modules at `positions`."""
+    df = model_bundle["df"]
+    key = _signal_key(model_bundle, user_row, None, filters, len(positions))
+    signals = _signal_cache.get(key)
+    if signals is None:
+        signals = compute_signals(model_bundle, user_row, top_n=len(positions), filters=filters)
+        _signal_cache.put(key, signals)
+    popularity = model_bundle.get("popularity_norm")
+    if popularity is None:
+        popularity = model_bundle["popularity_norm"] = _popularity_norm(df, np.dtype(model_bundle.get("dtype", "float64")))
+    if "positions" not in signals:
+        # Cold start: alleen populariteit
+        return popularity[positions]
+    active, weight_sum = active_weights(
+        df, signals["fav_indices"], signals["has_profile"],
+        weights.get("w_content", 0.45), weights.get("w_pop", 0.05), weights.get("w_cf", 0.0), weights.get("w_profile", 0.5),
+    )
+    final = combine_signals(active, weight_sum, signals["content"], signals["profile"], signals["popularity"], signals["cf"])
+    lookup = np.zeros(len(df), dtype=final.dtype)
+    lookup[signals["positions"]] = final
+    return lookup[positions]
+
+
+def search_from_model(
+    model_bundle: Dict[str, Any],
+    query: str,
+    top_n: int = 10,
+    filters: Optional[Dict[str, Any]] = None,
+    user_row: Optional[Dict[str, Any]] = None,
+    blend: float = 0.0,
+    **weights,
+) -> pd.DataFrame:
+    """Modules matching a free-text query, best first.
+    The query goes through the same preprocessing and TF-IDF vectorizer as module_text
+    and is scored on the inverted index (cosine similarity). With `blend` > 0 and a
+    user, the best SEARCH_BLEND_CANDIDATES text matches are re-ranked on
+    (1 - blend) * text score + blend * hybrid score.
+    """
+    df = model_bundle["df"]
+    if not 0.0 <= blend <= 1.0:
+        raise ValueError("blend must be between 0 and 1")
+    nlp_nl, nlp_en = _get_spacy_models()
+    q = model_bundle["vectorizer"].transform([preprocess_text(query, nlp_nl, nlp_en)])
+
+    allowed = filter_mask(model_bundle.get("attribute_index"), filters, len(df))
+    blended = blend > 0 and user_row is not None
+    k = max(top_n, SEARCH_BLEND_CANDIDATES) if blended else top_n
+    positions, text = _search_index(model_bundle).search(q.indices, q.data, k, allowed)
+
+    hybrid = np.zeros(len(positions), dtype=np.float32)
+    final = text
+    if blended and len(positions):
+        hybrid = _hybrid_at(model_bundle, user_row, positions, filters, weights)
+        final = (1.0 - blend) * text + blend * hybrid
+        order = np.argsort(-final, kind="stable")[:top_n]
+        positions, text, hybrid, final = positions[order], text[order], hybrid[order], final[order]
+
+    return pd.DataFrame({
+        "_id": df["_id"].to_numpy()[positions],
+        "name": df["name"].to_numpy()[positions] if "name" in df.columns else "",
+        "shortdescription": df["shortdescription"].to_numpy()[positions] if "shortdescription" in df.columns else "",
+        "text_score": text,
+        "hybrid_score": hybrid,
+        "final_score": final,
+    }, index=positions)
+
+
+def pca_overlay_from_model(model_bundle: Dict[str, Any], fav_ids, rec_ids) -> Dict[str, Any]:
+    """2D coordinates of all modules plus the favourites/recommendations overlay.
+    Uses the layout stored in the bundle at train time; older bundles fall back to
+    slicing `module_vectors_pca`, which gives the same projection.
+    """
+    df = model_bundle["df"]
+    layout = model_bundle.get("module_vectors_2d")
+    if layout is None:
+        layout = _projection_2d(model_bundle["module_vectors_pca"])
+        model_bundle["module_vectors_2d"] = layout
+
+    id_index = pd.Index(df["_id"])
+
+    def _points(ids):
+        ids = list(ids)
+        pos = id_index.get_indexer(ids) if ids else np.array([], dtype=int)
+        return [
+            {"_id": mid, "x": float(layout[p, 0]), "y": float(layout[p, 1])}
+            for mid, p in zip(ids, pos) if p >= 0
+        ]
 
-def evaluate_user_from_model(model_bundle: Dict[str, Any], user_id: int, k: int =5, sim_threshold: float =0.35):
+    popularity = df["popularity_score"].to_numpy(dtype=float) if "popularity_score" in df.columns else np.zeros(len(df))
+    return {
+        "ids": df["_id"].to_numpy(),
+        "layout": layout,
+        "popularity": popularity,
+        "favorites": _points(fav_ids),
+        "recommendations": _points(rec_ids),
+    }
+
+
+def evaluate_user_from_model(model_bundle: Dict[str, Any], user_id: int, k: int =5, sim_threshold: float =0.35, weights: Optional[Dict[str, float]] = None):
     users_demo = model_bundle.get("users_demo")
     df = model_bundle.get("df")
     module_vectors_pca = model_bundle.get("module_vectors_pca")
@@ -449,12 +1164,12 @@ def evaluate_user_from_model(model_bundle: Dict[str, Any], user_id: int, k: int
 
     user_row = users_demo[users_demo["user_id"]==user_id].iloc[0]
     fav_ids = user_row["favorite_id"] or []
-    fav_ids = [fid for fid in fav_ids if fid in df["id"].values]
-    fav_indices = df[df["id"].isin(fav_ids)].index.tolist()
+    fav_ids = [fid for fid in fav_ids if fid in df["_id"].values]
+    fav_indices = df[df["_id"].isin(fav_ids)].index.tolist()
 
     sim_profile_threshold = 0.05
 
-    fav_table, rec_df = recommend_from_model(model_bundle, user_row, top_n=k)
+    fav_table, rec_df = recommend_from_model(model_bundle, user_row, top_n=k, **weight_kwargs(weights))
     recommended_ids = rec_df["_id"].tolist()
 
     sims_fav = None
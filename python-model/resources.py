@@ -0,0 +1,183 @@
+"""CPU budgets per activity.
+
+Serving: every request thread does its BLAS work on SERVING_BLAS_THREADS threads
+(default 1; the request threads are the parallelism) and at most REQUEST_THREADS
+sync endpoints run at once (Starlette's threadpool).
+
+Training: `run_training` builds the model in a separate process with a raised
+nice value (TRAIN_NICE) and BLAS/OpenMP/ALS limited to TRAIN_THREADS, so a /train
+run cannot take the cores the requests need. The offline process pools
+(precompute, sweep) use one thread per worker and the same nice value.
+
+Import this module before numpy (main.py does): the BLAS environment variables
+are only read when the libraries load.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+import multiprocessing as mp
+import os
+import threading
+
+
+def available_cpus() -> int:
+    """CPUs this process may use: affinity mask, capped by a cgroup v2/v1 CPU quota."""
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = None
+    try:
+        limit, period = open("/sys/fs/cgroup/cpu.max").read().split()
+        if limit != "max":
+            quota = int(limit) / int(period)
+    except (OSError, ValueError):
+        try:
+            limit = int(open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us").read())
+            period = int(open("/sys/fs/cgroup/cpu/cpu.cfs_period_us").read())
+            if limit > 0:
+                quota = limit / period
+        except (OSError, ValueError):
+            pass
+    if quota:
+        cpus = min(cpus, max(1, int(quota)))
+    return max(1, cpus)
+
+
+CPU_COUNT = available_cpus()
+SERVING_BLAS_THREADS = int(os.getenv("SERVING_BLAS_THREADS", "1"))
+REQUEST_THREADS = int(os.getenv("REQUEST_THREADS", str(max(4, CPU_COUNT * 2))))
+TRAIN_THREADS = int(os.getenv("TRAIN_THREADS", str(max(1, CPU_COUNT // 2))))
+TRAIN_NICE = int(os.getenv("TRAIN_NICE", "10"))
+# "process" (default) of "thread": in-process training deelt de BLAS-limieten met serving
+TRAIN_ISOLATION = os.getenv("TRAIN_ISOLATION", "process")
+TRAIN_START_METHOD = os.getenv("TRAIN_START_METHOD", "spawn")
+
+_BLAS_ENV = ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS", "BLIS_NUM_THREADS", "NUMEXPR_NUM_THREADS")
+for _name in _BLAS_ENV:
+    os.environ.setdefault(_name, str(SERVING_BLAS_THREADS))
+
+# Gezet door init_batch_worker in trainings-/batchprocessen
+_process_threads: Optional[int] = None
+
+
+def apply_serving_limits():
+    """Pin the process-wide BLAS/OpenMP pools to the serving budget."""
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(SERVING_BLAS_THREADS)
+
+
+async def limit_request_threads(total: int = REQUEST_THREADS):
+    """Size of the threadpool that runs sync endpoints (anyio's default limiter).
+    Has to run inside the event loop, e.g. from an async startup handler.
+    """
+    from anyio.to_thread import current_default_thread_limiter
+    current_default_thread_limiter().total_tokens = total
+
+
+def lower_priority(nice: int = TRAIN_NICE, thread_only: bool = False):
+    """Raise the nice value of this process (or only the calling thread; Linux
+    schedules threads individually). Lowering it again needs privileges, so this is one-way.
+    """
+    if nice <= 0 or not hasattr(os, "setpriority"):
+        return
+    who = threading.get_native_id() if thread_only else 0
+    try:
+        current = os.getpriority(os.PRIO_PROCESS, who)
+        os.setpriority(os.PRIO_PROCESS, who, min(19, current + nice))
+    except OSError:
+        pass
+
+
+def init_batch_worker(threads: int = 1, nice: int = TRAIN_NICE):
+    """Initializer for offline process pools: low priority, `threads` BLAS threads."""
+    from threadpoolctl import threadpool_limits
+    global _process_threads
+    _process_threads = threads
+    # Eigen proces: ook bibliotheken die hierna pas laden krijgen dit budget
+    for name in _BLAS_ENV:
+        os.environ[name] = str(threads)
+    lower_priority(nice)
+    threadpool_limits(threads)
+
+
+def training_threads() -> int:
+    """Thread count for libraries that take it as a parameter (implicit's ALS)."""
+    return _process_threads or TRAIN_THREADS
+
+
+@contextmanager
+def training_budget(threads: int = TRAIN_THREADS, nice: int = TRAIN_NICE):
+    """In-process fallback (TRAIN_ISOLATION=thread): lowers the calling thread's priority
+    for good and limits BLAS/OpenMP for the duration. The limit is process-wide, so
+    requests served meanwhile also get `threads` BLAS threads. Only enter this on a
+    thread that exits afterwards (see `run_training`), never on a pooled request thread.
+    """
+    from threadpoolctl import threadpool_limits
+    lower_priority(nice, thread_only=True)
+    with threadpool_limits(threads):
+        yield
+
+
+def _run_in_training_thread(fn: Callable, *args, **kwargs):
+    # Eigen thread die na afloop stopt: de verhoogde nice-waarde kan niet terug en mag
+    # niet blijven hangen op een threadpool-thread die daarna weer requests bedient
+    outcome: Dict[str, Any] = {}
+
+    def target():
+        try:
+            with training_budget():
+                outcome["result"] = fn(*args, **kwargs)
+        except BaseException as e:
+            outcome["error"] = e
+
+    thread = threading.Thread(target=target, name="training", daemon=True)
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["result"]
+
+
+def worker_context():
+    """multiprocessing context for process pools started from the server (TRAIN_START_METHOD,
+    spawn by default): forking a process with request threads can inherit a held lock.
+    """
+    method = TRAIN_START_METHOD if TRAIN_START_METHOD in mp.get_all_start_methods() else "spawn"
+    return mp.get_context(method)
+
+
+def run_training(fn: Callable, *args, **kwargs):
+    """Run a training function (e.g. recommender.build_model_from_dataframe) within the
+    training budget and return its result. `fn` and its arguments must be picklable.
+    A profiling session for the "train" target is taken inside the training thread or
+    process, so it shows the pipeline rather than the wait.
+    """
+    from profiling import run_profiled_in
+    return run_profiled_in("train", _dispatch_training, fn, *args, **kwargs)
+
+
+def _dispatch_training(fn: Callable, *args, **kwargs):
+    if TRAIN_ISOLATION != "process":
+        return _run_in_training_thread(fn, *args, **kwargs)
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=worker_context(),
+        initializer=init_batch_worker, initargs=(TRAIN_THREADS, TRAIN_NICE),
+    ) as pool:
+        return pool.submit(fn, *args, **kwargs).result()
+
+
+def resource_status() -> Dict[str, Any]:
+    from threadpoolctl import threadpool_info
+    return {
+        "cpus": CPU_COUNT,
+        "serving_blas_threads": SERVING_BLAS_THREADS,
+        "request_threads": REQUEST_THREADS,
+        "train_threads": TRAIN_THREADS,
+        "train_nice": TRAIN_NICE,
+        "train_isolation": TRAIN_ISOLATION,
+        "nice": os.getpriority(os.PRIO_PROCESS, 0) if hasattr(os, "getpriority") else None,
+        "threadpools": [
+            {k: pool.get(k) for k in ("user_api", "internal_api", "num_threads")} for pool in threadpool_info()
+        ],
+    }
@@ -0,0 +1,143 @@
+"""Candidate retrieval for large catalogues.
+An index is built at train time over the PCA module vectors and stored in the
+model bundle. At request time it returns a few hundred candidate positions that
+then go through the normal hybrid weighting in `recommender.recommend_from_model`.
+Small catalogues keep the exact scan (no index).
+"""
+from typing import Optional, Dict, Any
+import os
+import numpy as np
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import normalize
+
+ANN_MIN_MODULES = int(os.getenv("ANN_MIN_MODULES", "5000"))
+ANN_CANDIDATES = int(os.getenv("ANN_CANDIDATES", "300"))
+
+
+class IVFIndex:
+    """Inverted-file index in pure NumPy: k-means lists over the L2-normalised vectors.
+    A query scans only the lists whose centroids are closest (`n_probe`).
+    """
+    kind = "ivf"
+
+    def __init__(self, n_lists: Optional[int] = None, n_probe: int = 8, random_state: int = 42):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.random_state = random_state
+
+    def fit(self, vectors: np.ndarray) -> "IVFIndex":
+        x = normalize(np.asarray(vectors))
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(x))))
+        n_lists = min(n_lists, len(x))
+
+        km = MiniBatchKMeans(n_clusters=n_lists, random_state=self.random_state, n_init=3, batch_size=4096)
+        labels = km.fit_predict(x)
+
+        # Vectoren per lijst aaneengesloten opslaan, zodat een probe één slice is
+        order = np.argsort(labels, kind="stable")
+        counts = np.bincount(labels, minlength=n_lists)
+        self.centroids = normalize(km.cluster_centers_)
+        self.list_ids = order
+        self.list_vectors = x[order]
+        self.list_sizes = counts
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.n_lists = n_lists
+        return self
+
+    def upsert(self, positions: np.ndarray, vectors: np.ndarray) -> "IVFIndex":
+        """Insert or move module `positions` into the list of their nearest centroid (no re-clustering)."""
+        x = normalize(np.asarray(vectors))
+        labels = np.argmax(x @ self.centroids.T, axis=1)
+        keep = ~np.isin(self.list_ids, positions)
+        old_labels = np.repeat(np.arange(self.n_lists), self.list_sizes)[keep]
+
+        all_labels = np.concatenate([old_labels, labels])
+        order = np.argsort(all_labels, kind="stable")
+        self.list_ids = np.concatenate([self.list_ids[keep], positions])[order]
+        self.list_vectors = np.concatenate([self.list_vectors[keep], x.astype(self.list_vectors.dtype)])[order]
+        self.list_sizes = np.bincount(all_labels, minlength=self.n_lists)
+        self.offsets = np.concatenate([[0], np.cumsum(self.list_sizes)])
+        return self
+
+    def search(self, query: np.ndarray, k: int, n_probe: Optional[int] = None) -> np.ndarray:
+        q = np.asarray(query).ravel()
+        q = q / max(1e-9, float(np.linalg.norm(q)))
+
+        # Dichtstbijzijnde lijsten eerst; probe door tot er minstens k kandidaten zijn
+        list_order = np.argsort(-(self.centroids @ q))
+        probe = min(n_probe or self.n_probe, self.n_lists)
+        enough = int(np.searchsorted(np.cumsum(self.list_sizes[list_order]), k)) + 1
+        lists = list_order[:max(probe, min(enough, self.n_lists))]
+
+        idx = np.concatenate([np.arange(self.offsets[l], self.offsets[l + 1]) for l in lists])
+        if len(idx) > k:
+            scores = self.list_vectors[idx] @ q
+            idx = idx[np.argpartition(-scores, k - 1)[:k]]
+        return self.list_ids[idx]
+
+
+class HNSWIndex:
+    """Graph index backed by the optional local `hnswlib` package."""
+    kind = "hnsw"
+
+    def __init__(self, m: int = 16, ef_construction: int = 200, ef: int = 400):
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef = ef
+
+    def fit(self, vectors: np.ndarray) -> "HNSWIndex":
+        try:
+            import hnswlib
+        except ImportError as e:
+            raise RuntimeError("hnswlib is not installed; use the 'ivf' retrieval index instead") from e
+
+        x = np.asarray(vectors, dtype=np.float32)
+        self.index = hnswlib.Index(space="cosine", dim=x.shape[1])
+        self.index.init_index(max_elements=len(x), ef_construction=self.ef_construction, M=self.m)
+        self.index.add_items(x, np.arange(len(x)))
+        self.index.set_ef(self.ef)
+        self.size = len(x)
+        return self
+
+    def upsert(self, positions: np.ndarray, vectors: np.ndarray) -> "HNSWIndex":
+        """Add new positions or replace the vectors of existing ones."""
+        needed = int(np.max(positions)) + 1
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(needed)
+        self.index.add_items(np.asarray(vectors, dtype=np.float32), np.asarray(positions))
+        self.size = max(self.size, needed)
+        return self
+
+    def search(self, query: np.ndarray, k: int, n_probe: Optional[int] = None) -> np.ndarray:
+        labels, _ = self.index.knn_query(np.asarray(query, dtype=np.float32).reshape(1, -1), k=min(k, self.size))
+        return labels[0].astype(np.int64)
+
+
+RETRIEVAL_INDEXES = {
+    "ivf": IVFIndex,
+    "hnsw": HNSWIndex,
+}
+
+
+def build_retrieval_index(vectors: np.ndarray, kind: Optional[str] = None, **params: Dict[str, Any]):
+    """Build the index named by `kind` ("ivf", "hnsw", "exact" or "auto").
+    "auto" (default, or RETRIEVAL_INDEX) only builds an IVF index for catalogues of
+    at least ANN_MIN_MODULES modules; below that the exact scan is cheaper.
+    Returns None for the exact path.
+    """
+    kind = kind or os.getenv("RETRIEVAL_INDEX", "auto")
+    if kind == "auto":
+        kind = "ivf" if len(vectors) >= ANN_MIN_MODULES else "exact"
+    if kind == "exact":
+        return None
+    if kind not in RETRIEVAL_INDEXES:
+        raise ValueError(f"Unknown retrieval index '{kind}'")
+    return RETRIEVAL_INDEXES[kind](**params).fit(vectors)
+
+
+def retrieve_candidates(index, queries, k: int) -> np.ndarray:
+    """Union of the top-k candidates of every query vector, as sorted module positions."""
+    found = [index.search(q, k) for q in queries]
+    if not found:
+        return np.array([], dtype=np.int64)
+    return np.unique(np.concatenate(found))
@@ -0,0 +1,107 @@
+"""Inverted index over the module TF-IDF rows for free-text search.
+Built at train time next to the dense matrix: per vocabulary term a posting list of
+(module position, TF-IDF weight), sorted by position, plus the term's highest weight.
+A query is scored term-at-a-time with MaxScore pruning (the top-k sibling of WAND):
+terms are visited by their score upper bound, and once the remaining terms can no
+longer lift an unseen module above the current k-th score, only the surviving
+candidates are looked up in the rest of the lists. Query cost follows the posting
+lists of the query terms, not the catalogue size.
+"""
+from typing import Optional, Tuple
+import numpy as np
+from scipy.sparse import csr_matrix, vstack
+
+
+class InvertedIndex:
+    """Term -> posting list in CSC layout (`indptr`, `docs`, `weights`), float32 weights."""
+
+    def __init__(self, block: int = 4096):
+        self.block = block
+
+    def fit(self, tfidf_rows: np.ndarray) -> "InvertedIndex":
+        # Per blok naar sparse, zodat memory-mapped matrices (streaming) niet in één keer geladen worden
+        n = tfidf_rows.shape[0]
+        parts = [csr_matrix(np.asarray(tfidf_rows[i:i + self.block], dtype=np.float32)) for i in range(0, n, self.block)]
+        matrix = vstack(parts, format="csc") if parts else csr_matrix((0, tfidf_rows.shape[1]), dtype=np.float32).tocsc()
+        self._set(matrix)
+        return self
+
+    def _set(self, matrix):
+        matrix.sort_indices()
+        self.n_docs, self.n_terms = matrix.shape
+        self.indptr = matrix.indptr.astype(np.int64)
+        self.docs = matrix.indices.astype(np.int32)
+        self.weights = matrix.data.astype(np.float32)
+        lengths = np.diff(self.indptr)
+        self.max_weight = np.zeros(self.n_terms, dtype=np.float32)
+        nonempty = lengths > 0
+        self.max_weight[nonempty] = np.maximum.reduceat(self.weights, self.indptr[:-1][nonempty])
+
+    def upsert(self, positions: np.ndarray, tfidf_rows: np.ndarray) -> "InvertedIndex":
+        """Replace the postings of module `positions` (new positions may extend the index)."""
+        positions = np.asarray(positions)
+        terms = np.repeat(np.arange(self.n_terms), np.diff(self.indptr))
+        keep = ~np.isin(self.docs, positions)
+        new = csr_matrix(np.asarray(tfidf_rows, dtype=np.float32)).tocoo()
+        n_docs = max(self.n_docs, int(positions.max()) + 1 if len(positions) else 0)
+        matrix = csr_matrix(
+            (np.concatenate([self.weights[keep], new.data]),
+             (np.concatenate([self.docs[keep], positions[new.row]]), np.concatenate([terms[keep], new.col]))),
+            shape=(n_docs, self.n_terms),
+        ).tocsc()
+        self._set(matrix)
+        return self
+
+    def search(self, term_ids: np.ndarray, term_weights: np.ndarray, k: int,
+               allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-k (positions, scores) of the dot product with a sparse query, highest first.
+        `allowed` is an optional boolean mask over module positions (filters).
+        """
+        empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32))
+        term_ids = np.asarray(term_ids)
+        if k <= 0 or not len(term_ids):
+            return empty
+        term_weights = np.asarray(term_weights, dtype=np.float32)
+        bounds = term_weights * self.max_weight[term_ids]
+        order = np.argsort(-bounds, kind="stable")
+        term_ids, term_weights, bounds = term_ids[order], term_weights[order], bounds[order]
+        # Bovengrens van alle termen ná term i
+        rest = np.concatenate([np.cumsum(bounds[::-1])[::-1][1:], [0.0]])
+
+        cand = np.empty(0, dtype=np.int32)
+        acc = np.empty(0, dtype=np.float32)
+        threshold = 0.0
+        open_set = True
+        for i, t in enumerate(term_ids):
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            if lo == hi:
+                continue
+            docs, weights = self.docs[lo:hi], self.weights[lo:hi] * term_weights[i]
+            if open_set:
+                if allowed is not None:
+                    ok = allowed[docs]
+                    docs, weights = docs[ok], weights[ok]
+                cand, inverse = np.unique(np.concatenate([cand, docs]), return_inverse=True)
+                acc = np.bincount(inverse, weights=np.concatenate([acc, weights]), minlength=len(cand)).astype(np.float32)
+            else:
+                # Alleen kandidaten die de drempel nog kunnen halen; opzoeken in de gesorteerde lijst
+                alive = acc + bounds[i] + rest[i] >= threshold
+                cand, acc = cand[alive], acc[alive]
+                pos = np.minimum(np.searchsorted(docs, cand), len(docs) - 1)
+                hit = docs[pos] == cand
+                acc[hit] += weights[pos[hit]]
+            if len(cand) >= k:
+                threshold = float(np.partition(acc, len(acc) - k)[len(acc) - k])
+                # Een nog ongeziene module haalt hooguit `rest[i]`
+                if open_set and rest[i] < threshold:
+                    open_set = False
+
+        if not len(cand):
+            return empty
+        top = np.argpartition(-acc, min(k, len(acc)) - 1)[:k] if len(acc) > k else np.arange(len(acc))
+        top = top[np.argsort(-acc[top], kind="stable")]
+        return cand[top].astype(np.int64), acc[top]
+
+
+def build_search_index(tfidf_rows: np.ndarray) -> InvertedIndex:
+    return InvertedIndex().fit(tfidf_rows)
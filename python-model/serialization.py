@@ -0,0 +1,115 @@
+"""Response encoding for the recommendation endpoints.
+JSON goes through orjson (FastJSONResponse, the app's default response class).
+Internal bulk clients can ask for MessagePack or an Arrow IPC stream with the
+Accept header; see `negotiate` and `encode_recommendations`.
+"""
+from typing import Any, Dict, List, Optional
+import io
+import pandas as pd
+import pyarrow as pa
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with orjson (numpy scalars/arrays included); stdlib json if orjson is missing."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is None:
+            return super().render(content)
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """"json", "msgpack" or "arrow" for an Accept header; JSON unless a binary type is asked for."""
+    for part in (accept or "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in MSGPACK_MEDIA_TYPES:
+            if msgpack is None:
+                raise HTTPException(status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="msgpack is not installed on this server")
+            return "msgpack"
+        if media_type == ARROW_MEDIA_TYPE:
+            return "arrow"
+    return "json"
+
+
+def recommendation_records(rec_df: pd.DataFrame) -> List[Dict[str, Any]]:
+    """[{"_id", "score"}] straight from the columns, without DataFrame.to_dict."""
+    if not len(rec_df):
+        return []
+    return [
+        {"_id": mid, "score": score}
+        for mid, score in zip(rec_df["_id"].tolist(), rec_df["final_score"].tolist())
+    ]
+
+
+def _id_array(ids: List[Any]) -> pa.Array:
+    # Int-catalogus blijft int64; anders (strings of gemengd) worden ids strings
+    if ids and all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+        return pa.array(ids, type=pa.int64())
+    return pa.array([str(i) for i in ids], type=pa.string())
+
+
+def _arrow_stream(rec_dfs: List[pd.DataFrame], version: Optional[str], next_cursor: Optional[str] = None) -> bytes:
+    # Eén platte tabel voor de hele batch: request-index + rang per rij
+    request, rank, ids, scores = [], [], [], []
+    for i, rec_df in enumerate(rec_dfs):
+        n = len(rec_df)
+        request.extend([i] * n)
+        rank.extend(range(n))
+        if n:
+            ids.extend(rec_df["_id"].tolist())
+            scores.extend(rec_df["final_score"].tolist())
+    table = pa.table({
+        "request": pa.array(request, type=pa.int32()),
+        "rank": pa.array(rank, type=pa.int16()),
+        "_id": _id_array(ids),
+        "score": pa.array(scores, type=pa.float32()),
+    })
+    metadata = {}
+    if version:
+        metadata[b"model_version"] = version.encode()
+    if next_cursor:
+        metadata[b"next_cursor"] = next_cursor.encode()
+    if metadata:
+        table = table.replace_schema_metadata(metadata)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+
+def encode_recommendations(rec_dfs: List[pd.DataFrame], fmt: str, version: Optional[str] = None, batch: bool = False,
+                           next_cursor: Optional[str] = None) -> Response:
+    """Response for one (`batch=False`) or several ranked frames in the negotiated format.
+    JSON/MessagePack bodies: {"recommendations": [...]} or {"version", "results": [{"recommendations": [...]}]},
+    plus "next_cursor" when there is a next page.
+    Arrow: a single table with columns request, rank, _id, score; next_cursor in the schema metadata.
+    Arrow `_id` is int64 when every id is an int, otherwise string (ints become strings).
+    """
+    if fmt == "arrow":
+        return Response(content=_arrow_stream(rec_dfs, version, next_cursor), media_type=ARROW_MEDIA_TYPE)
+
+    if batch:
+        body = {"version": version, "results": [{"recommendations": recommendation_records(df)} for df in rec_dfs]}
+    else:
+        body = {"recommendations": recommendation_records(rec_dfs[0])}
+    if next_cursor:
+        body["next_cursor"] = next_cursor
+    if fmt == "msgpack":
+        return Response(content=msgpack.packb(body, use_bin_type=True), media_type=MSGPACK_MEDIA_TYPES[0])
+    return FastJSONResponse(content=body)
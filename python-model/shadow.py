@@ -0,0 +1,169 @@
+"""Shadow evaluation of a candidate model version.
+A candidate bundle is kept resident next to the active model. A fraction
+(SHADOW_FRACTION) of /recommend requests is scored again against the candidate
+in a background pool, off the request path; ranking overlap and latency are
+aggregated per candidate. Promotion is an explicit call that checks those stats.
+"""
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, BoundedSemaphore
+from typing import Dict, Any, List, Optional
+import os
+import random
+import time
+import logging
+import numpy as np
+from modelstore import load_version, activate_version
+from pagination import rank
+from recommender import weight_kwargs
+
+SHADOW_FRACTION = float(os.getenv("SHADOW_FRACTION", "0.1"))
+SHADOW_WORKERS = int(os.getenv("SHADOW_WORKERS", "1"))
+SHADOW_QUEUE = int(os.getenv("SHADOW_QUEUE", str(SHADOW_WORKERS * 8)))
+SHADOW_WINDOW = int(os.getenv("SHADOW_WINDOW", "1000"))
+SHADOW_MIN_REQUESTS = int(os.getenv("SHADOW_MIN_REQUESTS", "100"))
+SHADOW_MIN_OVERLAP = float(os.getenv("SHADOW_MIN_OVERLAP", "0.5"))
+SHADOW_MAX_LATENCY_RATIO = float(os.getenv("SHADOW_MAX_LATENCY_RATIO", "1.5"))
+
+logger = logging.getLogger(__name__)
+
+_pool = ThreadPoolExecutor(max_workers=SHADOW_WORKERS, thread_name_prefix="shadow")
+_slots = BoundedSemaphore(SHADOW_QUEUE)
+_lock = Lock()
+_candidate: Optional[Dict[str, Any]] = None
+_samples: deque = deque(maxlen=SHADOW_WINDOW)
+_counters = {"sampled": 0, "dropped": 0, "errors": 0}
+
+
+def set_candidate(version: str, model_bundle: Optional[Dict[str, Any]] = None) -> str:
+    """Keep `version` resident as the shadow candidate and reset its stats."""
+    global _candidate
+    bundle = model_bundle if model_bundle is not None else load_version(version)
+    with _lock:
+        _candidate = bundle
+        _samples.clear()
+        _counters.update(sampled=0, dropped=0, errors=0)
+    print(f"[SHADOW] Candidate set to version {version}")
+    return version
+
+
+def clear_candidate():
+    global _candidate
+    with _lock:
+        _candidate = None
+        _samples.clear()
+
+
+def candidate_version() -> Optional[str]:
+    return _candidate.get("version") if _candidate is not None else None
+
+
+def _score(candidate: Dict[str, Any], payload: Dict[str, Any], top_n: int, live_ids: List[str], live_ms: float):
+    try:
+        # Zelfde werk als de live eerste pagina (RANKING_DEPTH ranken), anders is de
+        # latency-ratio scheef in het voordeel van de kandidaat
+        start = time.perf_counter()
+        _, ranked = rank(
+            candidate, payload.get("user", {}), top_n,
+            filters=payload.get("filters"), **weight_kwargs(payload.get("weights"))
+        )
+        shadow_ms = (time.perf_counter() - start) * 1000
+        shadow_ids = ranked["_id"].tolist()[:top_n] if len(ranked) else []
+    except Exception:
+        logger.exception("Shadow scoring failed")
+        with _lock:
+            _counters["errors"] += 1
+        return
+
+    k = max(len(live_ids), len(shadow_ids), 1)
+    sample = {
+        "overlap": len(set(live_ids) & set(shadow_ids)) / k,
+        "top1_match": bool(live_ids and shadow_ids and live_ids[0] == shadow_ids[0]),
+        "live_ms": live_ms,
+        "shadow_ms": shadow_ms,
+    }
+    with _lock:
+        # Kandidaat kan intussen vervangen zijn
+        if _candidate is candidate:
+            _samples.append(sample)
+
+
+def _release(_future):
+    _slots.release()
+
+
+def observe(payload: Dict[str, Any], top_n: int, live_ids: List[str], live_ms: float):
+    """Called after a live /recommend; schedules a shadow score for a sampled fraction."""
+    candidate = _candidate
+    if candidate is None or random.random() >= SHADOW_FRACTION:
+        return
+    # Nooit wachten: als de pool vol zit slaan we deze request over
+    if not _slots.acquire(blocking=False):
+        with _lock:
+            _counters["dropped"] += 1
+        return
+    with _lock:
+        _counters["sampled"] += 1
+    _pool.submit(_score, candidate, payload, top_n, list(live_ids), live_ms).add_done_callback(_release)
+
+
+def shadow_stats() -> Dict[str, Any]:
+    with _lock:
+        samples = list(_samples)
+        counters = dict(_counters)
+        version = candidate_version()
+
+    stats = {"candidate": version, "fraction": SHADOW_FRACTION, "requests": len(samples), **counters}
+    if not samples:
+        return stats
+    live = np.array([s["live_ms"] for s in samples])
+    shadow = np.array([s["shadow_ms"] for s in samples])
+    stats.update({
+        "mean_overlap": float(np.mean([s["overlap"] for s in samples])),
+        "top1_agreement": float(np.mean([s["top1_match"] for s in samples])),
+        "live_ms_p50": float(np.percentile(live, 50)),
+        "live_ms_p95": float(np.percentile(live, 95)),
+        "shadow_ms_p50": float(np.percentile(shadow, 50)),
+        "shadow_ms_p95": float(np.percentile(shadow, 95)),
+        "latency_ratio_p95": float(np.percentile(shadow, 95) / max(1e-9, np.percentile(live, 95))),
+    })
+    return stats
+
+
+def promotion_check(
+    min_requests: int = SHADOW_MIN_REQUESTS,
+    min_overlap: float = SHADOW_MIN_OVERLAP,
+    max_latency_ratio: float = SHADOW_MAX_LATENCY_RATIO,
+) -> Dict[str, Any]:
+    """Stats plus the list of reasons (if any) why the candidate may not be promoted yet."""
+    stats = shadow_stats()
+    reasons = []
+    if stats["candidate"] is None:
+        reasons.append("no shadow candidate")
+    elif stats["requests"] < min_requests:
+        reasons.append(f"only {stats['requests']} shadow requests (need {min_requests})")
+    else:
+        if stats["mean_overlap"] < min_overlap:
+            reasons.append(f"mean overlap {stats['mean_overlap']:.2f} below {min_overlap}")
+        if stats["latency_ratio_p95"] > max_latency_ratio:
+            reasons.append(f"p95 latency ratio {stats['latency_ratio_p95']:.2f} above {max_latency_ratio}")
+    return {"stats": stats, "reasons": reasons}
+
+
+def promote(force: bool = False, **thresholds) -> Dict[str, Any]:
+    """Activate the candidate if it passes promotion_check (or force=True).
+    Raises ValueError with the failed checks otherwise.
+    """
+    global _candidate
+    check = promotion_check(**thresholds)
+    if check["stats"]["candidate"] is None:
+        raise ValueError("no shadow candidate")
+    if check["reasons"] and not force:
+        raise ValueError("; ".join(check["reasons"]))
+
+    with _lock:
+        candidate = _candidate
+        _candidate = None
+        _samples.clear()
+    activate_version(candidate["version"], candidate)
+    return {"promoted": candidate["version"], "stats": check["stats"]}
@@ -0,0 +1,237 @@
+"""Sharded scatter-gather scoring for very large catalogues.
+The module matrices of the active bundle are split row-wise over SERVING_SHARDS
+local worker processes. A request runs in two rounds:
+
+1. scan: every shard computes the raw content / profile similarities of its rows
+   and returns their min and max;
+2. top-k: the coordinator sends the global min/range, so every shard applies the
+   same min-max normalisation as the single-process path, combines the signals
+   and returns its local top-k. The coordinator merges those.
+
+Only the exact path is sharded (no ANN index, no int8 embedding); cold-start
+users, other bundles and catalogues changed since the split (module upserts)
+score in-process.
+Every message carries a request id and the shards answer on one result queue, which
+a collector thread routes back to the waiting request; concurrent requests interleave
+on the shards instead of queueing behind a lock. Workers are started with
+forkserver (spawn where unavailable), never forked from the threaded server.
+"""
+from itertools import count
+from threading import Lock, Thread
+from typing import Any, Dict, List, Optional
+import multiprocessing as mp
+import os
+import queue
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import normalize
+import recommender
+from filters import filter_mask
+
+SERVING_SHARDS = int(os.getenv("SERVING_SHARDS", "0"))
+SHARD_START_METHOD = os.getenv("SHARD_START_METHOD", "forkserver" if "forkserver" in mp.get_all_start_methods() else "spawn")
+# Antwoordt een shard niet op tijd, dan scoort de request in-process
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", "10"))
+
+
+def _shard_worker(inbox, outbox, shard, pca, inv_norm, tfidf, popularity):
+    from threadpoolctl import threadpool_limits
+    # Eén BLAS-thread per shard; de shards zelf zijn de parallelliteit
+    with threadpool_limits(1):
+        # Ruwe similarities per lopende request tussen ronde 1 en 2
+        raw = {}
+        while True:
+            msg = inbox.get()
+            op = msg[0]
+            if op == "close":
+                break
+            req = msg[1]
+            if op == "scan":
+                _, _, user_unit, profile_dense = msg
+                content = (pca @ user_unit) * inv_norm if user_unit is not None else None
+                profile = tfidf @ profile_dense if profile_dense is not None else None
+                raw[req] = (content, profile)
+                outbox.put((req, shard, [(x.min(), x.max()) if x is not None and len(x) else None for x in raw[req]]))
+            elif op == "topk":
+                _, _, ranges, cf_scaled, weights, weight_sum, selectable, k = msg
+                n = len(popularity)
+                scaled = [
+                    (x - lo) / span if x is not None else np.zeros(n, dtype=popularity.dtype)
+                    for x, (lo, span) in zip(raw.pop(req), ranges)
+                ]
+                cf = cf_scaled if cf_scaled is not None else np.zeros(n, dtype=popularity.dtype)
+                final = recommender.combine_signals(weights, weight_sum, scaled[0], scaled[1], popularity, cf)
+                keep = np.flatnonzero(selectable)
+                order = keep[recommender._top_k(final[keep], k)]
+                outbox.put((req, shard, (order, scaled[0][order], scaled[1][order], popularity[order], cf[order], final[order])))
+            elif op == "drop":
+                raw.pop(req, None)
+
+
+class ShardedScorer:
+    def __init__(self, model_bundle: Dict[str, Any], n_shards: int):
+        self.model_bundle = model_bundle
+        self.n = len(model_bundle["df"])
+        self.catalog_revision = model_bundle.get("catalog_revision", 0)
+        self._ids = count()
+        self._waiting = {}
+        self._waiting_lock = Lock()
+
+        inv_norm = model_bundle.get("module_pca_inv_norm")
+        if inv_norm is None:
+            inv_norm = model_bundle["module_pca_inv_norm"] = recommender._inv_norms(model_bundle["module_vectors_pca"])
+        popularity = model_bundle.get("popularity_norm")
+        if popularity is None:
+            popularity = recommender._popularity_norm(model_bundle["df"], np.dtype(model_bundle.get("dtype", "float64")))
+
+        bounds = np.linspace(0, self.n, max(1, n_shards) + 1).astype(int)
+        self.offsets = bounds[:-1]
+        self.bounds = bounds
+        ctx = mp.get_context(SHARD_START_METHOD)
+        self._results = ctx.Queue()
+        self._inboxes = []
+        self._procs = []
+        for shard, (lo, hi) in enumerate(zip(bounds[:-1], bounds[1:])):
+            inbox = ctx.Queue()
+            proc = ctx.Process(
+                target=_shard_worker,
+                args=(inbox, self._results, shard, np.ascontiguousarray(model_bundle["module_vectors_pca"][lo:hi]),
+                      inv_norm[lo:hi], np.ascontiguousarray(model_bundle["module_tfidf_dense"][lo:hi]), popularity[lo:hi]),
+                daemon=True,
+            )
+            proc.start()
+            self._inboxes.append(inbox)
+            self._procs.append(proc)
+        self._collector = Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        print(f"[SHARDING] {len(self._procs)} shards over {self.n} modules")
+
+    def serves(self, model_bundle: Dict[str, Any]) -> bool:
+        return (
+            model_bundle is self.model_bundle
+            and len(model_bundle["df"]) == self.n
+            and model_bundle.get("catalog_revision", 0) == self.catalog_revision
+            and model_bundle.get("ann_index") is None
+            and model_bundle.get("module_vectors_pca_q") is None
+        )
+
+    def _collect(self):
+        # Eén lezer van de resultaatqueue; antwoorden gaan naar de wachtende request
+        while True:
+            item = self._results.get()
+            if item is None:
+                break
+            req, shard, payload = item
+            with self._waiting_lock:
+                box = self._waiting.get(req)
+            if box is not None:
+                box.put((shard, payload))
+
+    def _scatter(self, box: "queue.Queue", messages: List[tuple]) -> List[Any]:
+        for inbox, msg in zip(self._inboxes, messages):
+            inbox.put(msg)
+        replies = [None] * len(messages)
+        for _ in messages:
+            shard, payload = box.get(timeout=SHARD_TIMEOUT)
+            replies[shard] = payload
+        return replies
+
+    def recommend(self, user_row: Dict[str, Any], top_n: int, w_content: float, w_pop: float, w_cf: float,
+                  w_profile: float, filters: Optional[Dict[str, Any]] = None):
+        """Same (fav_table, rec_df) as recommend_from_model; None for cold-start users
+        or when a shard does not answer within SHARD_TIMEOUT (the caller then scores in-process).
+        """
+        bundle = self.model_bundle
+        df = bundle["df"]
+        dtype = np.dtype(bundle.get("dtype", "float64"))
+
+        fav_mask = np.isin(df["_id"].to_numpy(), list(user_row.get("favorite_id", [])))
+        fav_indices = np.flatnonzero(fav_mask).tolist()
+        has_profile = bool(user_row.get("profile_text", "").strip())
+        if not fav_indices and not has_profile:
+            return None
+        allowed = filter_mask(bundle.get("attribute_index"), filters, self.n)
+
+        user_unit = None
+        if fav_indices:
+            user_vec = bundle["module_vectors_pca"][fav_indices].mean(axis=0).reshape(1, -1)
+            user_unit = normalize(user_vec)[0].astype(dtype, copy=False)
+        profile_dense = None
+        if has_profile:
+            profile_dense = recommender._profile_vector(bundle, user_row["profile_text"]).toarray()[0].astype(dtype, copy=False)
+
+        weights, weight_sum = recommender.active_weights(df, fav_indices, has_profile, w_content, w_pop, w_cf, w_profile)
+        cf_scaled = None
+        if weights["collaborative"] and user_row.get("user_id") in bundle.get("user_map", {}):
+            cf_scaled = recommender._min_max(recommender._cf_raw(bundle, user_row, fav_indices, None, self.n, dtype))
+
+        selectable = ~fav_mask if allowed is None else allowed & ~fav_mask
+
+        req = next(self._ids)
+        box = queue.Queue()
+        with self._waiting_lock:
+            self._waiting[req] = box
+        try:
+            # Ronde 1: ruwe similarities per shard, globale min/max
+            extremes = self._scatter(box, [("scan", req, user_unit, profile_dense)] * len(self._inboxes))
+            ranges = []
+            for i in range(2):
+                found = [e[i] for e in extremes if e[i] is not None]
+                if not found:
+                    ranges.append((0.0, 1.0))
+                    continue
+                lo = min(f[0] for f in found)
+                hi = max(f[1] for f in found)
+                ranges.append((lo, max(1e-9, hi - lo)))
+
+            # Ronde 2: zelfde normalisatie overal, lokale top-k
+            parts = self._scatter(box, [
+                ("topk", req, ranges, None if cf_scaled is None else cf_scaled[lo:hi], weights, weight_sum, selectable[lo:hi], top_n)
+                for lo, hi in zip(self.bounds[:-1], self.bounds[1:])
+            ])
+        except queue.Empty:
+            print(f"[SHARDING] No answer from every shard within {SHARD_TIMEOUT}s; scoring in-process")
+            for inbox in self._inboxes:
+                inbox.put(("drop", req))
+            return None
+        finally:
+            with self._waiting_lock:
+                self._waiting.pop(req, None)
+
+        order = np.concatenate([part[0] + offset for part, offset in zip(parts, self.offsets)])
+        columns = [np.concatenate([part[i] for part in parts]) for i in range(1, 6)]
+        best = recommender._top_k(columns[4], top_n)
+        sel = order[best]
+
+        fav_table = df.iloc[fav_indices][["_id", "name", "shortdescription", "tags_list"]]
+        rec_df = recommender._rec_frame(
+            df, sel, *(c[best] for c in columns),
+            {k: v / weight_sum for k, v in weights.items()},
+        )
+        return fav_table, rec_df
+
+    def close(self):
+        for inbox in self._inboxes:
+            try:
+                inbox.put(("close",))
+            except (ValueError, OSError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=5)
+        self._results.put(None)
+        self._collector.join(timeout=5)
+        self._inboxes, self._procs = [], []
+
+
+def activate_sharding(model_bundle: Dict[str, Any], n_shards: int = SERVING_SHARDS) -> Optional[ShardedScorer]:
+    """Split the active bundle over `n_shards` workers (replacing the previous split).
+    n_shards <= 1 turns sharding off.
+    """
+    previous = recommender.get_sharded_scorer()
+    scorer = None
+    if n_shards > 1 and model_bundle.get("ann_index") is None and model_bundle.get("module_vectors_pca_q") is None:
+        scorer = ShardedScorer(model_bundle, n_shards)
+    recommender.set_sharded_scorer(scorer)
+    if previous is not None:
+        previous.close()
+    return scorer
@@ -0,0 +1,285 @@
+"""Out-of-core training for catalogues that do not fit in memory.
+
+Same model as `recommender.build_model_from_dataframe`, but the catalogue is read
+in chunks (API pages or MODULES_LOCAL_CSV) and never densified as a whole:
+
+1. text pass: every chunk goes through `preprocess_modules` once; its text is spilled
+   for pass 2 and its raw columns to the raw-frame artifact, and only the columns
+   serving needs stay in memory. Term/document frequencies and the numeric scaler
+   are accumulated; the term counters are pruned (terms seen in one document so
+   far, then the rarest) whenever they exceed STREAMING_VOCAB_LIMIT entries;
+2. the TF-IDF vocabulary (top tfidf_max_features terms with min_df=2, as
+   TfidfVectorizer picks them) and idf are fixed; every chunk's dense TF-IDF rows are
+   written to a memory-mapped .npy while the column sums and the features x features
+   Gram matrix are accumulated;
+3. PCA comes from a randomized eigen-decomposition of that covariance (the leading
+   components of a full PCA fit, sign convention included) and the PCA vectors go to
+   a second memory-mapped .npy.
+
+Peak memory is one chunk of dense rows, the Gram matrix (features^2 float64, about
+200 MB at 5000 terms) and the term counters (at most STREAMING_VOCAB_LIMIT terms),
+plus the serving metadata (ids, names, short descriptions, tags, filter and numeric
+columns) that the model keeps anyway. Descriptions, module_text and raw API columns
+never sit in memory for more than one chunk.
+"""
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import os
+import shutil
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.decomposition import PCA
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
+from sklearn.preprocessing import StandardScaler
+from sklearn.utils.extmath import randomized_svd
+import recommender
+from filters import CATEGORICAL_FILTER_COLUMNS, NUMERIC_FILTER_COLUMNS
+from modelstore import MODELS_DIR, save_model
+
+STREAMING_CHUNK_SIZE = int(os.getenv("STREAMING_CHUNK_SIZE", "2000"))
+STREAMING_WORK_DIR = Path(os.getenv("STREAMING_WORK_DIR", str(MODELS_DIR / "streaming")))
+STREAMING_VOCAB_LIMIT = int(os.getenv("STREAMING_VOCAB_LIMIT", "500000"))
+
+NUM_COLS = ["studycredit", "estimated_difficulty", "interests_match_score", "popularity_score"]
+# Alleen nodig voor het vectoriseren; niet bewaard in het trainingsframe
+_TEXT_ONLY_COLUMNS = ["module_text", "tags_list_nlp"]
+# Blijven in het geheugen: serving-tabel, filters, populariteitsranking en CF-dummy's
+_META_COLUMNS = list(dict.fromkeys(
+    ["_id", "name", "shortdescription", "tags_list", *CATEGORICAL_FILTER_COLUMNS, *NUMERIC_FILTER_COLUMNS, *NUM_COLS]
+))
+
+
+def iter_module_chunks(chunk_size: int = STREAMING_CHUNK_SIZE) -> Iterator[pd.DataFrame]:
+    """Module chunks from MODULES_API_URL (page/limit query parameters, until meta.total
+    or an empty page) or else from MODULES_LOCAL_CSV.
+    """
+    modules_url = os.getenv("MODULES_API_URL")
+    if modules_url:
+        from security.http import AuthenticatedSession
+        session = AuthenticatedSession()
+        page, seen = 1, 0
+        while True:
+            r = session.get(modules_url, params={"page": page, "limit": chunk_size}, timeout=60)
+            r.raise_for_status()
+            body = r.json()
+            rows = body.get("vkms") or []
+            # Een pagina kan groter zijn dan gevraagd (service-tokens krijgen alles)
+            for start in range(0, len(rows), chunk_size):
+                yield pd.DataFrame(rows[start:start + chunk_size])
+            seen += len(rows)
+            total = (body.get("meta") or {}).get("total")
+            if not rows or (total is not None and seen >= total):
+                return
+            page += 1
+
+    local = os.path.join(os.path.dirname(__file__), os.getenv("MODULES_LOCAL_CSV", "Uitgebreide_VKM_dataset_cleaned.csv"))
+    if not os.path.exists(local):
+        raise RuntimeError("No module source available")
+    yield from pd.read_csv(local, chunksize=chunk_size)
+
+
+def _select_vocabulary(term_tf: Dict[str, int], term_df: Dict[str, int], max_features: int, min_df: int = 2) -> Dict[str, int]:
+    """TfidfVectorizer's choice: drop terms below min_df, keep the max_features most
+    frequent, index them alphabetically."""
+    terms = sorted(t for t, d in term_df.items() if d >= min_df)
+    if not terms:
+        raise ValueError("After pruning, no terms remain. Try a lower min_df or a larger catalogue.")
+    if max_features and len(terms) > max_features:
+        tfs = np.array([term_tf[t] for t in terms])
+        keep = np.sort((-tfs).argsort(kind="stable")[:max_features])
+        terms = [terms[i] for i in keep]
+    return {t: i for i, t in enumerate(terms)}
+
+
+def _prune_counts(term_tf: Dict[str, int], term_df: Dict[str, int], limit: int):
+    """Shrink the pass-1 counters to at most limit / 2 terms: first the terms seen in a
+    single document so far, then the least frequent. Only terms far below the
+    max_features cut lose counts, so the selected vocabulary stays the same in practice.
+    """
+    for term in [t for t, d in term_df.items() if d < 2]:
+        del term_tf[term], term_df[term]
+    excess = len(term_tf) - limit // 2
+    if excess > 0:
+        for term in sorted(term_tf, key=term_tf.get)[:excess]:
+            del term_tf[term], term_df[term]
+
+
+def _fixed_vectorizer(vocabulary: Dict[str, int], term_df: Dict[str, int], n_docs: int, dtype) -> TfidfVectorizer:
+    """A TfidfVectorizer equivalent to fitting on the full catalogue (smooth idf)."""
+    vectorizer = TfidfVectorizer(vocabulary=vocabulary, ngram_range=(1, 2), min_df=2, dtype=dtype)
+    vectorizer.fit([""])
+    df = np.array([term_df[t] for t in sorted(vocabulary, key=vocabulary.get)], dtype=np.float64)
+    vectorizer.idf_ = np.log((1 + n_docs) / (1 + df)) + 1
+    return vectorizer
+
+
+def _pca_from_moments(col_sum: np.ndarray, gram: np.ndarray, n: int, n_components: int) -> PCA:
+    """Fitted sklearn PCA from the column sums and X^T X of n rows.
+    The covariance is symmetric PSD, so its randomized SVD gives the leading eigenpairs
+    (a full eigh of 5000 x 5000 takes 10x longer).
+    """
+    mean = col_sum / n
+    cov = (gram - n * np.outer(mean, mean)) / max(1, n - 1)
+    d = cov.shape[0]
+    _, values, components = randomized_svd(cov, n_components, n_iter=7, random_state=42)
+    # Zelfde tekenconventie als sklearn (svd_flip op de componenten)
+    signs = np.sign(components[np.arange(n_components), np.abs(components).argmax(axis=1)])
+    components *= np.where(signs == 0, 1, signs)[:, None]
+
+    total_var = np.trace(cov)
+    pca = PCA(n_components=n_components)
+    pca.n_features_in_ = d
+    pca.n_samples_ = n
+    pca.n_components_ = n_components
+    pca.mean_ = mean
+    pca.components_ = components
+    pca.explained_variance_ = values
+    pca.explained_variance_ratio_ = values / total_var if total_var > 0 else np.zeros_like(values)
+    pca.singular_values_ = np.sqrt(values * max(1, n - 1))
+    pca.noise_variance_ = (total_var - values.sum()) / (d - n_components) if d > n_components else 0.0
+    return pca
+
+
+def build_model_streaming(
+    chunks=None,
+    users_demo: Optional[pd.DataFrame] = None,
+    num_dummy_users: int = 50,
+    tfidf_max_features: int = 5000,
+    pca_components: int = 50,
+    als_params: Optional[Dict[str, Any]] = None,
+    retrieval_index: Optional[str] = None,
+    compute_dtype: str = "float32",
+    quantize_pca: bool = False,
+    chunk_size: int = STREAMING_CHUNK_SIZE,
+    work_dir: Optional[Path] = None,
+    vocab_limit: int = STREAMING_VOCAB_LIMIT,
+) -> Dict[str, Any]:
+    """Model bundle built chunk by chunk. `chunks` is an iterable of module DataFrames
+    (default: `iter_module_chunks`); module_tfidf_dense and module_vectors_pca are
+    read-only memory maps in `work_dir`, and the raw training frame stays on disk as
+    chunk files (`raw_df_parts`, moved next to the model by save_model).
+    """
+    dtype = np.dtype(compute_dtype)
+    if users_demo is None:
+        users_demo = recommender._empty_users()
+    if chunks is None:
+        chunks = iter_module_chunks(chunk_size)
+    work_dir = Path(work_dir or STREAMING_WORK_DIR / datetime.utcnow().strftime("%Y%m%dT%H%M%S"))
+    spill_dir = work_dir / "chunks"
+    spill_dir.mkdir(parents=True, exist_ok=True)
+    raw_dir = work_dir / "raw"
+    raw_dir.mkdir(parents=True, exist_ok=True)
+
+    # --- Pass 1: tekst, termfrequenties, scaler ---
+    counter = CountVectorizer(ngram_range=(1, 2))
+    term_tf: Dict[str, int] = {}
+    term_df: Dict[str, int] = {}
+    scaler = StandardScaler()
+    num_cols: Optional[List[str]] = None
+    meta_parts, spill_paths, raw_paths = [], [], []
+    n = 0
+    for i, chunk in enumerate(chunks):
+        if not len(chunk):
+            continue
+        chunk = recommender.preprocess_modules(chunk.reset_index(drop=True))
+        if num_cols is None:
+            num_cols = [c for c in NUM_COLS if c in chunk.columns]
+        if num_cols:
+            scaler.partial_fit(chunk[num_cols])
+        try:
+            counts = counter.fit_transform(chunk["module_text"])
+        except ValueError:
+            counts = None  # chunk zonder termen
+        if counts is not None:
+            tf = np.asarray(counts.sum(axis=0)).ravel()
+            dfs = np.asarray((counts > 0).sum(axis=0)).ravel()
+            for term, j in counter.vocabulary_.items():
+                term_tf[term] = term_tf.get(term, 0) + int(tf[j])
+                term_df[term] = term_df.get(term, 0) + int(dfs[j])
+            if len(term_tf) > vocab_limit:
+                _prune_counts(term_tf, term_df, vocab_limit)
+        path = spill_dir / f"chunk_{i:06d}.joblib"
+        joblib.dump(chunk[["module_text"] + num_cols], path)
+        spill_paths.append(path)
+        raw_path = raw_dir / f"part_{i:06d}.joblib"
+        joblib.dump(chunk.drop(columns=_TEXT_ONLY_COLUMNS), raw_path)
+        raw_paths.append(raw_path)
+        meta_parts.append(chunk[[c for c in _META_COLUMNS if c in chunk.columns]])
+        n += len(chunk)
+    if not n:
+        raise ValueError("No modules to train on")
+
+    df = pd.concat(meta_parts, ignore_index=True)
+    del meta_parts
+    if df["_id"].duplicated().any():
+        raise ValueError("Duplicate module '_id' values across chunks")
+
+    # --- Pass 2: TF-IDF naar memmap, PCA-momenten ---
+    vocabulary = _select_vocabulary(term_tf, term_df, tfidf_max_features)
+    vectorizer = _fixed_vectorizer(vocabulary, term_df, n, dtype)
+    term_df = {t: term_df[t] for t in vocabulary}
+    del term_tf, counter
+    n_features = len(vocabulary) + len(num_cols)
+    n_components = min(pca_components, n_features, n)
+
+    tfidf_path = work_dir / "module_tfidf_dense.npy"
+    module_tfidf_dense = np.lib.format.open_memmap(tfidf_path, mode="w+", dtype=dtype, shape=(n, len(vocabulary)))
+    numeric_scaled = np.zeros((n, len(num_cols)), dtype=dtype)
+    col_sum = np.zeros(n_features)
+    gram = np.zeros((n_features, n_features))
+    row = 0
+    for path in spill_paths:
+        part = joblib.load(path)
+        rows = slice(row, row + len(part))
+        module_tfidf_dense[rows] = vectorizer.transform(part["module_text"]).toarray()
+        if num_cols:
+            numeric_scaled[rows] = scaler.transform(part[num_cols])
+        block = np.hstack([module_tfidf_dense[rows], numeric_scaled[rows]])
+        col_sum += block.sum(axis=0, dtype=np.float64)
+        # Product in compute_dtype (BLAS), accumulated in float64 over chunks
+        gram += block.T @ block
+        row += len(part)
+    module_tfidf_dense.flush()
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    pca = _pca_from_moments(col_sum, gram, n, n_components)
+    del gram
+
+    # --- Pass 3: projecties naar memmap ---
+    pca_path = work_dir / "module_vectors_pca.npy"
+    module_vectors_pca = np.lib.format.open_memmap(pca_path, mode="w+", dtype=dtype, shape=(n, n_components))
+    for lo in range(0, n, chunk_size):
+        hi = min(n, lo + chunk_size)
+        module_vectors_pca[lo:hi] = pca.transform(np.hstack([module_tfidf_dense[lo:hi], numeric_scaled[lo:hi]]))
+    module_vectors_pca.flush()
+    del module_tfidf_dense, module_vectors_pca
+
+    profiles = users_demo["profile_text"].fillna("").tolist() if len(users_demo) else []
+    user_profile_tfidf = (
+        vectorizer.transform(profiles).toarray() if profiles else np.zeros((0, len(vocabulary)), dtype=dtype)
+    )
+    vectorized = (vectorizer, np.load(tfidf_path, mmap_mode="r"), user_profile_tfidf)
+    reduced = (scaler, pca, np.load(pca_path, mmap_mode="r"))
+    collaborative = recommender.fit_collaborative(df, num_dummy_users, als_params)
+    print(f"[STREAMING] {n} modules in {len(spill_paths)} chunks, {len(vocabulary)} terms, {n_components} components")
+    model_bundle = recommender.assemble_model_bundle(
+        df, users_demo, vectorized, reduced, collaborative, retrieval_index, dtype.name, quantize_pca
+    )
+    # df is alleen de metadata; het volledige frame staat in de raw-chunks
+    model_bundle.pop("df_raw", None)
+    model_bundle["raw_df_parts"] = [str(p) for p in raw_paths]
+    return model_bundle
+
+
+def train_streaming_and_save(users_demo: Optional[pd.DataFrame] = None, activate: bool = False,
+                             tenant: Optional[str] = None, **params) -> str:
+    """Build out-of-core and save; returns the version. Meant for `resources.run_training`,
+    so the bundle is written from the training process instead of being sent back whole.
+    """
+    work_dir = Path(params.pop("work_dir", None) or STREAMING_WORK_DIR / datetime.utcnow().strftime("%Y%m%dT%H%M%S"))
+    model_bundle = build_model_streaming(users_demo=users_demo, work_dir=work_dir, **params)
+    save_model(model_bundle, activate=activate, tenant=tenant)
+    # De memmaps zitten nu in het opgeslagen model
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return model_bundle["version"]
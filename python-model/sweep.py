@@ -0,0 +1,191 @@
+"""Hyperparameter sweep over the training pipeline.
+Every pipeline stage (text preprocessing, vectorizing, reducing, CF) is cached on
+disk with joblib.Memory, keyed by a hash of its inputs and parameters, so a grid
+that only varies ALS settings or weights reuses the spaCy/TF-IDF/PCA work.
+Stages run in waves across a process pool; every candidate is scored with
+`recommender.evaluate_user_from_model` over the known users.
+
+    python sweep.py --grid sweep_grid.json --processes 4 --k 5
+
+Grid file (every key optional, defaults of build_model_from_dataframe otherwise):
+    {"tfidf_max_features": [2000, 5000],
+     "pca_components": [20, 50],
+     "als_params": [{"factors": 16}, {"factors": 32, "regularization": 0.1}],
+     "weights": [{"content": 0.45, "profile": 0.5, "popularity": 0.05},
+                 {"content": 0.4, "profile": 0.4, "popularity": 0.05, "collaborative": 0.15}]}
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import product
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+import argparse
+import json
+import os
+import numpy as np
+import pandas as pd
+from joblib import Memory
+import recommender
+from modelstore import MODELS_DIR
+from resources import init_batch_worker, TRAIN_THREADS
+
+SWEEP_CACHE_DIR = Path(os.getenv("SWEEP_CACHE_DIR", str(MODELS_DIR / "stage_cache")))
+SWEEP_PROCESSES = int(os.getenv("SWEEP_PROCESSES", "0")) or TRAIN_THREADS
+SWEEP_METRICS = ["precision_at_k", "recall_at_k", "hit_rate_at_k"]
+
+_memory = Memory(str(SWEEP_CACHE_DIR), verbose=0)
+cached_preprocess = _memory.cache(recommender.preprocess_modules)
+cached_vectorize = _memory.cache(recommender.vectorize_modules)
+cached_reduce = _memory.cache(recommender.reduce_modules)
+cached_collaborative = _memory.cache(recommender.fit_collaborative)
+
+DEFAULT_GRID = {
+    "tfidf_max_features": [5000],
+    "pca_components": [50],
+    "als_params": [None],
+    "weights": [None],
+}
+
+# Wordt per worker gezet door _init_worker
+_ctx: Dict[str, Any] = {}
+
+
+def _init_worker(df: pd.DataFrame, users_demo: pd.DataFrame, num_dummy_users: int, compute_dtype: str, k: int):
+    init_batch_worker()
+    recommender.DEBUG_SCORES = False
+    _ctx.update(
+        df=df, users_demo=users_demo, num_dummy_users=num_dummy_users, compute_dtype=compute_dtype, k=k,
+        profiles=users_demo["profile_text"].fillna("").tolist() if len(users_demo) else [],
+    )
+
+
+def _vectorized(tfidf_max_features):
+    return cached_vectorize(_ctx["df"]["module_text"], _ctx["profiles"], tfidf_max_features, _ctx["compute_dtype"])
+
+
+def _reduced(tfidf_max_features, pca_components):
+    module_tfidf_dense = _vectorized(tfidf_max_features)[1]
+    return cached_reduce(_ctx["df"], module_tfidf_dense, pca_components, _ctx["compute_dtype"])
+
+
+def _collaborative(als_params):
+    return cached_collaborative(_ctx["df"], _ctx["num_dummy_users"], als_params)
+
+
+def _stage_task(task: tuple):
+    """Fill one stage cache entry; the result itself stays on disk."""
+    stage, params = task[0], task[1:]
+    if stage == "vectorize":
+        _vectorized(*params)
+    elif stage == "reduce":
+        _reduced(*params)
+    elif stage == "cf":
+        _collaborative(*params)
+    return task
+
+
+def _evaluate_task(task: tuple) -> List[Dict[str, Any]]:
+    tfidf_max_features, pca_components, als_params, weight_grid = task
+    bundle = recommender.assemble_model_bundle(
+        _ctx["df"], _ctx["users_demo"],
+        _vectorized(tfidf_max_features),
+        _reduced(tfidf_max_features, pca_components),
+        _collaborative(als_params),
+        retrieval_index="exact",
+        compute_dtype=_ctx["compute_dtype"],
+    )
+    user_ids = _ctx["users_demo"]["user_id"].tolist()
+
+    rows = []
+    for weights in weight_grid:
+        scores = [recommender.evaluate_user_from_model(bundle, uid, k=_ctx["k"], weights=weights) for uid in user_ids]
+        row = {
+            "tfidf_max_features": tfidf_max_features,
+            "pca_components": pca_components,
+            "als_params": json.dumps(als_params, sort_keys=True) if als_params else "",
+            "weights": json.dumps(weights, sort_keys=True) if weights else "",
+            "n_users": len(scores),
+        }
+        for metric in SWEEP_METRICS:
+            row[metric] = float(np.mean([s[metric] for s in scores]))
+        rows.append(row)
+    return rows
+
+
+def run_sweep(
+    modules_df: pd.DataFrame,
+    users_demo: pd.DataFrame,
+    grid: Dict[str, List[Any]],
+    k: int = 5,
+    rank_by: str = "precision_at_k",
+    processes: Optional[int] = SWEEP_PROCESSES,
+    num_dummy_users: int = 50,
+    compute_dtype: str = "float32",
+) -> pd.DataFrame:
+    """Evaluate every grid combination and return the report, best candidate first."""
+    if users_demo is None or not len(users_demo):
+        raise ValueError("No user profiles available for evaluation")
+    if rank_by not in SWEEP_METRICS:
+        raise ValueError(f"rank_by must be one of {SWEEP_METRICS}")
+    unknown = set(grid) - set(DEFAULT_GRID)
+    if unknown:
+        raise ValueError(f"Unknown grid key(s): {sorted(unknown)}")
+    grid = {**DEFAULT_GRID, **grid}
+    for weights in grid["weights"]:
+        recommender.weight_kwargs(weights)
+
+    # Tekststap eenmalig in het hoofdproces (spaCy); de rest verdeeld over de pool
+    df = cached_preprocess(modules_df)
+    builds = list(product(grid["tfidf_max_features"], grid["pca_components"], grid["als_params"]))
+
+    waves = [
+        [("vectorize", t) for t in grid["tfidf_max_features"]]
+        + [("cf", a) for a in _unique(grid["als_params"])],
+        [("reduce", t, p) for t, p in product(grid["tfidf_max_features"], grid["pca_components"])],
+    ]
+
+    rows = []
+    initargs = (df, users_demo, num_dummy_users, compute_dtype, k)
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker, initargs=initargs) as pool:
+        for wave in waves:
+            list(pool.map(_stage_task, wave))
+        for build_rows in pool.map(_evaluate_task, [(*b, grid["weights"]) for b in builds]):
+            rows.extend(build_rows)
+
+    report = pd.DataFrame(rows).sort_values(rank_by, ascending=False, kind="stable").reset_index(drop=True)
+    report.insert(0, "rank", np.arange(1, len(report) + 1))
+    return report
+
+
+def _unique(values: List[Any]) -> List[Any]:
+    seen, out = set(), []
+    for v in values:
+        key = json.dumps(v, sort_keys=True)
+        if key not in seen:
+            seen.add(key)
+            out.append(v)
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hyperparameter sweep with cached pipeline stages")
+    parser.add_argument("--grid", help="JSON file with the parameter grid")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rank-by", default="precision_at_k", choices=SWEEP_METRICS)
+    parser.add_argument("--processes", type=int, default=SWEEP_PROCESSES)
+    parser.add_argument("--num-dummy-users", type=int, default=50)
+    parser.add_argument("--out", help="CSV path for the report (default models/sweep_<timestamp>.csv)")
+    args = parser.parse_args()
+
+    grid = {}
+    if args.grid:
+        with open(args.grid) as f:
+            grid = json.load(f)
+    modules_df, users_df = recommender.fetch_remote_modules_users()
+    report = run_sweep(modules_df, users_df, grid, k=args.k, rank_by=args.rank_by,
+                       processes=args.processes, num_dummy_users=args.num_dummy_users)
+
+    out = args.out or MODELS_DIR / f"sweep_{datetime.utcnow().isoformat(timespec='seconds').replace(':', '-')}.csv"
+    report.to_csv(out, index=False)
+    print(report.to_string(index=False))
+    print(f"[SWEEP] {len(report)} candidates -> {out}")
@@ -0,0 +1,78 @@
+"""Shared fixtures: a synthetic VKM-like catalogue and a whitespace stand-in for the
+spaCy pipelines, so the tests need neither the module API nor downloaded models.
+"""
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+os.environ.setdefault("RECOMMENDER_DEBUG", "0")
+# modelstore maakt ./models aan bij import; niet in de repo
+os.chdir(tempfile.mkdtemp(prefix="vkm-tests-"))
+
+import numpy as np
+import pandas as pd
+import pytest
+import recommender
+
+TOPICS = {
+    "zorg": "zorg verpleegkunde patient gezondheid psychologie welzijn ziekenhuis begeleiding",
+    "data": "data analyse visualisatie statistiek python database dashboard machine learning",
+    "business": "marketing management strategie ondernemen financien sales organisatie klant",
+    "techniek": "techniek elektrotechniek werktuigbouw constructie energie duurzaam ontwerp productie",
+    "onderwijs": "onderwijs didactiek leerling pedagogiek lesgeven klas ontwikkeling coaching",
+}
+
+
+class _Token:
+    def __init__(self, text):
+        self.text = text
+        self.lemma_ = text
+
+
+class WhitespaceNLP:
+    def __call__(self, text):
+        return [_Token(t) for t in text.split()]
+
+    def pipe(self, texts, **kwargs):
+        for text in texts:
+            yield self(text)
+
+
+@pytest.fixture(autouse=True)
+def whitespace_nlp(monkeypatch):
+    monkeypatch.setattr(recommender, "_nlp_nl", WhitespaceNLP())
+    monkeypatch.setattr(recommender, "_nlp_en", WhitespaceNLP())
+
+
+def make_modules(n: int = 120, int_ids: bool = False, seed: int = 7) -> pd.DataFrame:
+    """Modules spread over a few topics; every description mixes words of one topic
+    with a few of another, so TF-IDF and PCA have structure to find."""
+    rng = np.random.default_rng(seed)
+    names = list(TOPICS)
+    rows = []
+    for i in range(n):
+        topic = names[i % len(names)]
+        other = names[(i + 1 + rng.integers(len(names) - 1)) % len(names)]
+        words = list(rng.choice(TOPICS[topic].split(), 6)) + list(rng.choice(TOPICS[other].split(), 2))
+        rows.append({
+            "_id": 1000 + i if int_ids else str(1000 + i),
+            "name": f"Module {topic} {i}",
+            "shortdescription": " ".join(words[:4]),
+            "description": " ".join(words),
+            "module_tags_str": ", ".join(words[:3]),
+            "studycredit": int(rng.choice([15, 30])),
+            "location": str(rng.choice(["Breda", "Tilburg", "Den Bosch"])),
+            "level": str(rng.choice(["NLQF5", "NLQF6"])),
+            "popularity_score": int(rng.integers(0, 100)),
+            "estimated_difficulty": int(rng.integers(1, 6)),
+            "interests_match_score": float(rng.random()),
+            "available_spots": int(rng.integers(0, 80)),
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture
+def modules():
+    return make_modules()
@@ -0,0 +1,27 @@
+import gc
+import pytest
+import pagination
+from recommender import build_model_from_dataframe, bundle_token, _signal_key
+
+
+def test_every_bundle_has_its_own_token(modules):
+    a = build_model_from_dataframe(modules, num_dummy_users=10)
+    b = build_model_from_dataframe(modules, num_dummy_users=10)
+    assert bundle_token(a) != bundle_token(b)
+    user = {"user_id": 1, "favorite_id": modules["_id"].tolist()[:2], "profile_text": ""}
+    assert _signal_key(a, user, None, None, 5) != _signal_key(b, user, None, None, 5)
+
+
+def test_unversioned_bundle_does_not_inherit_cursor(modules):
+    user = {"user_id": 1, "favorite_id": modules["_id"].tolist()[:2], "profile_text": ""}
+    bundle = build_model_from_dataframe(modules, num_dummy_users=10)
+    bundle.pop("bundle_token")
+    _, _, cursor = pagination.first_page(bundle, user, 5)
+    assert cursor is not None
+    del bundle
+    gc.collect()
+    # Een nieuwe bundle op hetzelfde geheugenadres mag de ranking niet erven
+    other = build_model_from_dataframe(modules.iloc[::-1].reset_index(drop=True), num_dummy_users=10)
+    other.pop("bundle_token")
+    with pytest.raises(RuntimeError):
+        pagination.next_page(other, cursor, 5)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+from recommender import build_model_from_dataframe, recommend_from_model
+
+TOP_N = 10
+PROFILES = ["", "data analyse en visualisatie", "zorg en psychologie", "marketing strategie"]
+
+
+@pytest.mark.parametrize("candidate", [
+    {"compute_dtype": "float32"},
+    # int8-kandidaten met float-rerank van de kopgroep
+    {"compute_dtype": "float32", "quantize_pca": True},
+], ids=["float32", "int8"])
+def test_top_n_agrees_with_float64(modules, candidate):
+    reference = build_model_from_dataframe(modules, num_dummy_users=20, compute_dtype="float64")
+    bundle = build_model_from_dataframe(modules, num_dummy_users=20, **candidate)
+    assert bundle["module_vectors_pca"].dtype == np.float32
+    if candidate.get("quantize_pca"):
+        assert bundle["module_vectors_pca_q"].dtype == np.int8
+
+    rng = np.random.default_rng(42)
+    ids = modules["_id"].tolist()
+    overlaps = []
+    for i in range(40):
+        user = {
+            "user_id": -1,
+            "favorite_id": list(rng.choice(ids, size=rng.integers(1, 4), replace=False)),
+            "profile_text": PROFILES[i % len(PROFILES)],
+        }
+        expected = recommend_from_model(reference, user, TOP_N, use_cache=False)[1]["_id"].tolist()
+        ranked = recommend_from_model(bundle, user, TOP_N, use_cache=False)[1]["_id"].tolist()
+        overlaps.append(len(set(expected) & set(ranked)) / TOP_N)
+
+    assert np.mean(overlaps) >= 0.95
+    assert min(overlaps) >= 0.8
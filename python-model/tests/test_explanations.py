@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+from recommender import build_explanations
+
+
+def _baseline(content, profile, popularity):
+    # Zinnen en drempels van de oorspronkelijke per-rij build_explanation
+    reasons, signals = [], {}
+    if content >= 0.7:
+        reasons.append("Deze module lijkt sterk op jouw favoriete modules.")
+        signals["content_match"] = content
+    elif content >= 0.4:
+        reasons.append("Deze module vertoont duidelijke overeenkomsten met jouw favoriete modules.")
+        signals["content_match"] = content
+    elif content >= 0.01:
+        reasons.append("Deze module heeft enkele inhoudelijke overeenkomsten met jouw favoriete modules.")
+        signals["content_match"] = content
+    elif content > 0:
+        reasons.append("Op basis van je favorieten is er weinig inhoudelijke overeenkomst.")
+    if profile >= 0.65:
+        reasons.append("Deze module sluit zeer goed aan bij de interesses die je in je profiel hebt opgegeven.")
+        signals["profile_match"] = profile
+    elif profile >= 0.40:
+        reasons.append("Deze module sluit redelijk aan bij je profielinteresses.")
+        signals["profile_match"] = profile
+    elif profile >= 0.01:
+        reasons.append("Deze module sluit beperkt aan bij je profielinteresses.")
+        signals["profile_match"] = profile
+    if popularity > 0.6:
+        reasons.append("Deze module wordt vaak gekozen door andere gebruikers.")
+        signals["popularity"] = popularity
+    elif popularity > 0.3:
+        reasons.append("Deze module heeft een gemiddelde populariteit onder gebruikers.")
+    else:
+        reasons.append("Deze module wordt minder vaak gekozen, maar kan inhoudelijk alsnog goed passen.")
+    return " • ".join(reasons), signals
+
+
+CONTENT = [0.0, 0.005, 0.0099, 0.01, 0.3999, 0.4, 0.6999, 0.7, 1.0]
+PROFILE = [0.0, 0.01, 0.3999, 0.4, 0.6499, 0.65, 1.0]
+POPULARITY = [0.0, 0.3, 0.3001, 0.6, 0.6001, 1.0]
+
+
+@pytest.mark.parametrize("content", CONTENT)
+def test_summaries_match_baseline_at_bucket_boundaries(content):
+    rows = [(content, p, pop) for p in PROFILE for pop in POPULARITY]
+    rec_df = pd.DataFrame(rows, columns=["content_sim_scaled", "profile_sim_scaled", "popularity_norm"])
+    rec_df["cf_score_scaled"] = 0.0
+    rec_df["final_score"] = 0.5
+
+    for explanation, row in zip(build_explanations(rec_df, {}), rows):
+        summary, signals = _baseline(*row)
+        assert explanation["summary"] == summary
+        assert explanation["signals"] == signals
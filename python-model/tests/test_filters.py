@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+from filters import build_attribute_index, filter_mask
+
+
+@pytest.fixture
+def index(modules):
+    return build_attribute_index(modules)
+
+
+def test_numeric_string_bound_is_coerced(modules, index):
+    expected = (modules["studycredit"] == 15).to_numpy()
+    assert expected.any()
+    assert np.array_equal(filter_mask(index, {"studycredit": "15"}, len(modules)), expected)
+    assert np.array_equal(filter_mask(index, {"studycredit": 15}, len(modules)), expected)
+
+
+def test_range_bounds(modules, index):
+    mask = filter_mask(index, {"available_spots": {"gt": "10", "lte": 40}}, len(modules))
+    spots = modules["available_spots"]
+    assert np.array_equal(mask, ((spots > 10) & (spots <= 40)).to_numpy())
+
+
+@pytest.mark.parametrize("condition", [{"gt": None}, {"gt": "veel"}, {"lt": [1, 2]}, {"eq": True}, "abc", None])
+def test_bad_bound_raises_value_error(modules, index, condition):
+    with pytest.raises(ValueError):
+        filter_mask(index, {"available_spots": condition}, len(modules))
+
+
+def test_bad_bound_is_400(modules, monkeypatch):
+    from fastapi.testclient import TestClient
+    import main
+    from recommender import build_model_from_dataframe
+
+    bundle = build_model_from_dataframe(modules, num_dummy_users=10)
+    monkeypatch.setattr("api.recommend.load_model", lambda tenant=None: bundle)
+    monkeypatch.setenv("PYTHON_API_KEY", "k")
+    client = TestClient(main.app)
+    user = {"favorite_id": modules["_id"].tolist()[:2]}
+    for condition in ({"gt": None}, "vijftien"):
+        response = client.post("/recommend/recommend", json={"user": user, "filters": {"available_spots": condition}}, headers={"x-api-key": "k"})
+        assert response.status_code == 400
+    response = client.post("/recommend/recommend", json={"user": user, "filters": {"studycredit": "15"}}, headers={"x-api-key": "k"})
+    assert response.status_code == 200
+    assert response.json()["recommendations"]
@@ -0,0 +1,14 @@
+from conftest import make_modules
+from modelstore import save_model, load_raw_frame
+from recommender import build_model_from_dataframe
+
+
+def test_raw_frame_is_not_kept_on_the_bundle():
+    modules = make_modules()
+    bundle = build_model_from_dataframe(modules, num_dummy_users=10)
+    save_model(bundle, activate=False)
+    assert "df_raw" not in bundle
+
+    raw = load_raw_frame(bundle)
+    assert len(raw) == len(modules) and "description" in raw.columns
+    assert "df_raw" not in bundle
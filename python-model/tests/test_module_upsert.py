@@ -0,0 +1,47 @@
+import numpy as np
+from conftest import make_modules
+from modelstore import load_raw_frame
+from module_upsert import upsert_modules
+from recommender import build_model_from_dataframe, recommend_from_model
+
+
+def _module(**extra):
+    return {
+        "_id": "new-1", "name": "Nieuwe module", "shortdescription": "data analyse",
+        "description": "data analyse met python", "module_tags_str": "data python",
+        "studycredit": 15, "location": "Breda", "level": "NLQF5", **extra,
+    }
+
+
+def test_upsert_without_popularity_keeps_scores_finite():
+    bundle = build_model_from_dataframe(make_modules(), num_dummy_users=10)
+    upsert_modules(bundle, [_module()])
+
+    assert np.isfinite(bundle["popularity_norm"]).all()
+    assert bundle["popularity_norm"][-1] == 0
+    _, recs = recommend_from_model(bundle, {"interests": "data analyse"}, top_n=10)
+    assert np.isfinite(recs["final_score"]).all()
+
+
+def test_upsert_swaps_search_index_copy():
+    bundle = build_model_from_dataframe(make_modules(), num_dummy_users=10)
+    live = bundle["search_index"]
+    n_docs = live.n_docs
+    upsert_modules(bundle, [_module(popularity_score=3.0)])
+
+    # De oude index blijft ongewijzigd voor requests die hem nog vasthouden
+    assert live.n_docs == n_docs
+    assert bundle["search_index"] is not live
+    assert bundle["search_index"].n_docs == n_docs + 1
+
+
+def test_upsert_keeps_raw_frame_off_the_bundle():
+    modules = make_modules()
+    bundle = build_model_from_dataframe(modules, num_dummy_users=10)
+    upsert_modules(bundle, [_module()])
+    upsert_modules(bundle, [_module(name="Tweede versie")])
+
+    assert "df_raw" not in bundle
+    raw = load_raw_frame(bundle)
+    assert len(raw) == len(modules) + 1
+    assert raw["name"].iloc[-1] == "Tweede versie"
@@ -0,0 +1,25 @@
+import pytest
+from conftest import make_modules
+from online_cf import update_user_favourites
+from recommender import build_model_from_dataframe
+
+
+@pytest.mark.parametrize("int_ids", [True, False])
+def test_added_favourites_match_catalogue_ids(int_ids):
+    modules = make_modules(int_ids=int_ids)
+    bundle = build_model_from_dataframe(modules, num_dummy_users=10)
+    ids = modules["_id"].tolist()
+
+    # De API levert strings, ook als de catalogus int-ids heeft
+    result = update_user_favourites(bundle, "student-1", add=[str(ids[0]), ids[1]])
+    assert set(result["favorites"]) == {ids[0], ids[1]}
+    assert all(type(m) is type(ids[0]) for m in result["favorites"])
+
+    result = update_user_favourites(bundle, "student-1", remove=[str(ids[0])])
+    assert result["favorites"] == [ids[1]]
+
+
+def test_unknown_module_is_rejected():
+    bundle = build_model_from_dataframe(make_modules(int_ids=True), num_dummy_users=10)
+    with pytest.raises(ValueError):
+        update_user_favourites(bundle, "student-1", add=["999999"])
@@ -0,0 +1,29 @@
+import recommender
+from conftest import make_modules
+from pagination import first_page
+from recommender import build_model_from_dataframe, recommend_from_model
+
+USER = {"user_id": "student-1", "profile_text": "data analyse"}
+
+
+def _bundle():
+    modules = make_modules()
+    bundle = build_model_from_dataframe(modules, num_dummy_users=10, retrieval_index="ivf", quantize_pca=True)
+    return bundle, {**USER, "favorite_id": modules["_id"].tolist()[:2]}
+
+
+def test_first_page_matches_single_page_ranking():
+    bundle, user = _bundle()
+    _, page, cursor = first_page(bundle, user, page_size=5)
+    _, single = recommend_from_model(bundle, user, top_n=5, use_cache=False)
+
+    assert cursor is not None
+    assert page["_id"].tolist() == single["_id"].tolist()
+    assert page["final_score"].tolist() == single["final_score"].tolist()
+
+
+def test_debug_output_is_limited_to_the_page(monkeypatch, capsys):
+    bundle, user = _bundle()
+    monkeypatch.setattr(recommender, "DEBUG_SCORES", True)
+    first_page(bundle, user, page_size=5)
+    assert capsys.readouterr().out.count("Module:") == 5
@@ -0,0 +1,47 @@
+import pandas as pd
+import precompute
+from precompute import load_precomputed, precomputed_path
+
+
+def _write(version, user_id):
+    frame = pd.DataFrame({"user_id": [user_id], "signature": ["s"], "rank": [0], "_id": ["m1"], "score": [0.5]})
+    frame.to_parquet(precomputed_path(version), index=False)
+
+
+def test_lookups_of_recent_versions_stay_cached(monkeypatch):
+    monkeypatch.setattr(precompute, "PRECOMPUTE_CACHE_VERSIONS", 2)
+    for v in ("v1", "v2", "v3"):
+        _write(v, f"user-{v}")
+
+    first = load_precomputed("v1")
+    second = load_precomputed("v2")
+    # Terugwisselen naar v1 leest het bestand niet opnieuw
+    assert load_precomputed("v1") is first
+    load_precomputed("v3")
+    assert load_precomputed("v1") is first
+    assert load_precomputed("v2") is not second
+
+
+def test_missing_export_is_not_cached():
+    assert load_precomputed("v-later") == {}
+    _write("v-later", "student-1")
+    assert "student-1" in load_precomputed("v-later")
+
+
+def test_export_keeps_integer_module_ids():
+    from conftest import make_modules
+    from modelstore import save_model
+    from recommender import build_model_from_dataframe
+
+    modules = make_modules(int_ids=True)
+    bundle = build_model_from_dataframe(modules, num_dummy_users=10)
+    ids = modules["_id"].tolist()
+    bundle["users_demo"] = pd.DataFrame({"user_id": ["u1", "u2"], "favorite_id": [ids[:2], ids[5:7]], "profile_text": ["", ""]})
+    save_model(bundle, activate=False)
+    precompute.export_precomputed(bundle, top_n=3, processes=1)
+
+    lookup = load_precomputed(bundle["version"])
+    assert lookup
+    assert set(lookup) == {"u1", "u2"}
+    ids = [r["_id"] for entry in lookup.values() for r in entry["recommendations"]]
+    assert all(type(i) is int for i in ids)
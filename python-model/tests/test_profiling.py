@@ -0,0 +1,41 @@
+import threading
+import numpy as np
+import pytest
+import profiling
+import resources
+from profiling import bundle_sizes
+
+
+class _Model:
+    def __init__(self):
+        self.factors = np.zeros((100, 8), dtype=np.float32)
+        self.lock = threading.Lock()  # niet te pickelen
+
+
+def test_bundle_sizes_without_pickling():
+    vectors = np.zeros((50, 10))
+    sizes = bundle_sizes({"model": _Model(), "vectors": vectors, "alias": vectors, "meta": {"n": 1}})
+
+    assert sizes["keys"]["model"] >= 100 * 8 * 4
+    assert sizes["keys"]["vectors"] == vectors.nbytes
+    # Gedeelde arrays tellen één keer mee
+    assert sizes["keys"]["alias"] == 0
+    assert sizes["total_bytes"] == sum(sizes["keys"].values())
+
+
+def _training_step(n):
+    return sum(i * i for i in range(n))
+
+
+@pytest.mark.parametrize("isolation", ["thread", "process"])
+@pytest.mark.parametrize("mode", ["cprofile", "sampling"])
+def test_train_profile_covers_the_training_itself(monkeypatch, isolation, mode):
+    monkeypatch.setattr(resources, "TRAIN_ISOLATION", isolation)
+    profiling.start_session("train", requests=1, mode=mode)
+    try:
+        assert resources.run_training(_training_step, 1_000_000) == _training_step(1_000_000)
+        assert profiling.session_status()["finished"]
+        body, _ = profiling.session_result("text" if mode == "cprofile" else "collapsed")
+        assert "_training_step" in body
+    finally:
+        profiling.cancel_session()
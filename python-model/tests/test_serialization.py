@@ -0,0 +1,32 @@
+import json
+import pandas as pd
+import pyarrow as pa
+import pytest
+from serialization import encode_recommendations
+
+
+def _frame(ids):
+    return pd.DataFrame({"_id": ids, "final_score": [0.9, 0.5][:len(ids)]})
+
+
+def _arrow_table(response):
+    return pa.ipc.open_stream(response.body).read_all()
+
+
+def test_arrow_keeps_integer_ids():
+    table = _arrow_table(encode_recommendations([_frame([101, 202])], "arrow", "v1"))
+    assert table.schema.field("_id").type == pa.int64()
+    assert table.column("_id").to_pylist() == [101, 202]
+    assert table.schema.metadata[b"model_version"] == b"v1"
+
+
+def test_arrow_string_and_mixed_ids_become_strings():
+    table = _arrow_table(encode_recommendations([_frame(["a1", "b2"]), _frame([7])], "arrow", batch=True))
+    assert table.schema.field("_id").type == pa.string()
+    assert table.column("_id").to_pylist() == ["a1", "b2", "7"]
+    assert table.column("request").to_pylist() == [0, 0, 1]
+
+
+def test_json_keeps_integer_ids():
+    body = json.loads(encode_recommendations([_frame([101, 202])], "json").body)
+    assert [r["_id"] for r in body["recommendations"]] == [101, 202]
@@ -0,0 +1,23 @@
+import pagination
+import shadow
+from conftest import make_modules
+from pagination import first_page
+from recommender import build_model_from_dataframe
+
+
+def test_shadow_scores_the_same_ranking_as_the_live_first_page(monkeypatch):
+    modules = make_modules()
+    bundle = build_model_from_dataframe(modules, num_dummy_users=10)
+    payload = {"user": {"user_id": "student-1", "favorite_id": modules["_id"].tolist()[:2], "profile_text": "data analyse"}}
+    _, page, _ = first_page(bundle, payload["user"], 5)
+
+    page_sizes = []
+    monkeypatch.setattr(shadow, "rank", lambda *a, **kw: page_sizes.append(a[2]) or pagination.rank(*a, **kw))
+    shadow.set_candidate("candidate", bundle)
+    shadow._score(bundle, payload, 5, page["_id"].tolist(), 1.0)
+
+    # Dezelfde paginagrootte als de live request, dus dezelfde rankingdiepte
+    assert page_sizes == [5]
+    sample = shadow._samples[-1]
+    assert sample["overlap"] == 1.0 and sample["top1_match"]
+    shadow.clear_candidate()
@@ -0,0 +1,39 @@
+from pathlib import Path
+from conftest import make_modules
+from modelstore import save_model, load_raw_frame
+from streaming_train import build_model_streaming
+
+
+def _chunks(modules, size=25):
+    return [modules.iloc[i:i + size] for i in range(0, len(modules), size)]
+
+
+def test_raw_columns_stay_on_disk(tmp_path):
+    modules = make_modules()
+    bundle = build_model_streaming(_chunks(modules), num_dummy_users=10, chunk_size=25, work_dir=tmp_path / "work")
+
+    assert "df_raw" not in bundle
+    assert len(bundle["raw_df_parts"]) == 5
+    save_model(bundle, activate=False)
+    assert Path(bundle["raw_df_path"]).is_dir()
+
+    raw = load_raw_frame(bundle)
+    assert raw["_id"].tolist() == modules["_id"].tolist()
+    assert raw["description"].tolist() == modules["description"].tolist()
+    assert "module_text" not in raw.columns
+
+
+def test_pruned_counters_select_the_same_vocabulary(tmp_path, monkeypatch):
+    import streaming_train
+    prunes = []
+    prune = streaming_train._prune_counts
+    monkeypatch.setattr(streaming_train, "_prune_counts", lambda *a: prunes.append(len(a[0])) or prune(*a))
+
+    modules = make_modules()
+    params = {"num_dummy_users": 10, "chunk_size": 25, "tfidf_max_features": 20}
+    full = build_model_streaming(_chunks(modules), work_dir=tmp_path / "a", **params)
+    assert not prunes
+    pruned = build_model_streaming(_chunks(modules), work_dir=tmp_path / "b", vocab_limit=100, **params)
+
+    assert prunes
+    assert pruned["vectorizer"].vocabulary_ == full["vectorizer"].vocabulary_